@@ -0,0 +1,383 @@
+"""
+End-to-end benchmark of the backend API under concurrent authors.
+
+Each simulated author types into their own project of --doc-size characters
+and drives the editor's request mix: a full-content autosave after every
+typing burst, an autocomplete request when they pause, a look at the recent
+edits every few saves and a memory generation every few more. By default the
+FastAPI app runs in this process, in a temporary data directory, with LLM
+calls answered by the deterministic stand-in (benchmarks/llm_standin.py).
+Run from the backend directory:
+
+    python -m benchmarks.bench_api [--authors 8] [--steps 40] [--doc-size 100000] [--output results.json]
+
+Per route it reports p50/p95/p99 latency, throughput and request/response
+bytes, plus the bytes written through the storage layer (the SQLite backend
+writes through its own connection, so only its size on disk is meaningful)
+and the size of the data directory afterwards. --output writes the results as
+JSON; --compare prints latency changes against an earlier results file.
+
+To benchmark a running server instead, pass --url; the server then needs its
+own ``llm.base_url`` pointing at a stand-in started with
+``python -m benchmarks.llm_standin``.
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+from collections import defaultdict
+from typing import Dict, Any, List, Optional
+
+import httpx
+
+from benchmarks.bench_diff import WORDS, make_document
+
+ROUTES = (
+    "POST /content/save",
+    "POST /autocomplete",
+    "GET /history/edits/{project_name}",
+    "POST /memory/generate",
+)
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of sorted samples"""
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class RouteStats:
+    """Latencies, statuses and bytes of the requests sent to one route"""
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = defaultdict(int)
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+    def record(self, seconds: float, status: int, request_bytes: int, response_bytes: int):
+        self.latencies.append(seconds)
+        self.statuses[status] += 1
+        self.request_bytes += request_bytes
+        self.response_bytes += response_bytes
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        ordered = sorted(self.latencies)
+        count = len(ordered)
+        result = {
+            "count": count,
+            "errors": sum(n for status, n in self.statuses.items() if status >= 500),
+            "statuses": {str(status): n for status, n in sorted(self.statuses.items())},
+            "throughput_rps": round(count / elapsed, 2) if elapsed else 0.0,
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+        }
+        if ordered:
+            result.update({
+                "mean_ms": round(1000 * sum(ordered) / count, 2),
+                "p50_ms": round(1000 * percentile(ordered, 0.50), 2),
+                "p95_ms": round(1000 * percentile(ordered, 0.95), 2),
+                "p99_ms": round(1000 * percentile(ordered, 0.99), 2),
+                "max_ms": round(1000 * ordered[-1], 2),
+            })
+        return result
+
+
+class Author:
+    """One writer typing into a project and triggering the editor's requests"""
+
+    def __init__(self, index: int, client: httpx.AsyncClient, stats: Dict[str, RouteStats], args, rng: random.Random):
+        self.index = index
+        self.project = f"bench-{index:03d}"
+        self.client = client
+        self.stats = stats
+        self.args = args
+        self.rng = rng
+        self.text = make_document(args.doc_size, rng)
+        self.cursor = len(self.text)
+        self.sequence = 0
+        self.memories: List[str] = []
+        self.recent_edits: List[Dict[str, Any]] = []
+
+    async def request(self, route: str, method: str, path: str, body: Optional[Dict[str, Any]] = None):
+        payload = json.dumps(body).encode("utf-8") if body is not None else b""
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        started = time.perf_counter()
+        response = await self.client.request(method, path, content=payload or None, headers=headers)
+        self.stats[route].record(time.perf_counter() - started, response.status_code, len(payload), len(response.content))
+        return response
+
+    async def setup(self):
+        await self.client.post("/projects", json={"project_name": self.project})
+        await self.client.post("/content/save", json={"project_name": self.project, "content": self.text})
+
+    def type_burst(self):
+        """Insert a few words at the cursor, now and then moving it or deleting a phrase"""
+        roll = self.rng.random()
+        if roll < 0.1:
+            self.cursor = self.rng.randrange(len(self.text) + 1)
+        elif roll < 0.2 and self.cursor > 40:
+            cut = self.rng.randint(5, 40)
+            self.text = self.text[:self.cursor - cut] + self.text[self.cursor:]
+            self.cursor -= cut
+            return
+
+        words = self.rng.choices(WORDS, k=self.rng.randint(2, self.args.burst_words))
+        burst = " " + " ".join(words)
+        if self.rng.random() < 0.3:
+            burst += "."
+        self.text = self.text[:self.cursor] + burst + self.text[self.cursor:]
+        self.cursor += len(burst)
+
+    async def run(self):
+        for step in range(self.args.steps):
+            self.type_burst()
+            await self.request("POST /content/save", "POST", "/content/save", {
+                "project_name": self.project,
+                "content": self.text,
+                "cursor_position": self.cursor
+            })
+
+            if self.rng.random() < self.args.autocomplete_rate:
+                before = self.text[:self.cursor]
+                sentence_start = max(before.rfind(". "), before.rfind("\n")) + 1
+                self.sequence += 1
+                await self.request("POST /autocomplete", "POST", "/autocomplete", {
+                    "memory": "\n".join(self.memories),
+                    "recent_edits": self.recent_edits,
+                    "previous_context": before[max(0, sentence_start - 2000):sentence_start],
+                    "current_snippet": before[sentence_start:].lstrip(),
+                    "project_name": self.project,
+                    "session_id": f"author-{self.index}",
+                    "sequence": self.sequence
+                })
+
+            if step % self.args.history_every == self.args.history_every - 1:
+                response = await self.request(
+                    "GET /history/edits/{project_name}", "GET", f"/history/edits/{self.project}?count=10"
+                )
+                if response.status_code == 200:
+                    self.recent_edits = response.json().get("edits", [])
+
+            if step % self.args.memory_every == self.args.memory_every - 1:
+                response = await self.request("POST /memory/generate", "POST", "/memory/generate", {
+                    "project_name": self.project,
+                    "text_chunk": self.text[max(0, self.cursor - 1000):self.cursor],
+                    "past_memory": self.memories[-5:]
+                })
+                if response.status_code == 200 and response.json().get("generated"):
+                    self.memories.append(response.json()["memory"])
+
+            if self.args.think_ms:
+                await asyncio.sleep(self.rng.uniform(0.5, 1.5) * self.args.think_ms / 1000)
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextlib.asynccontextmanager
+async def in_process_client(args):
+    """The app in a temporary data directory, with the LLM stand-in behind the shared client"""
+    import openai
+    from benchmarks.llm_standin import StandInModel, create_app
+
+    data_dir = tempfile.mkdtemp(prefix="vibe-bench-")
+    previous_dir = os.getcwd()
+    os.chdir(data_dir)
+    with open("config.json", "w") as f:
+        json.dump({
+            "storage": {"backend": args.backend, "fsync": args.fsync},
+            "llm": {"base_url": "http://llm-standin/v1", "api_key": "standin"}
+        }, f)
+
+    try:
+        # The app reads its configuration when it is imported
+        with contextlib.redirect_stdout(io.StringIO()):
+            import main
+        from utils.llm import llm_client
+
+        model = StandInModel(
+            latency=args.llm_latency,
+            tokens_per_second=args.tokens_per_second,
+            error_rate=args.llm_error_rate,
+            seed=args.seed
+        )
+        llm_client._client = openai.AsyncOpenAI(
+            base_url="http://llm-standin/v1",
+            api_key="standin",
+            max_retries=0,
+            http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(model)))
+        )
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            yield client, data_dir
+        await main.shutdown()
+    finally:
+        os.chdir(previous_dir)
+        if not args.keep_data:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+
+@contextlib.asynccontextmanager
+async def remote_client(args):
+    async with httpx.AsyncClient(base_url=args.url, timeout=None) as client:
+        yield client, None
+
+
+async def benchmark(args) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    stats = {route: RouteStats() for route in ROUTES}
+    connect = remote_client if args.url else in_process_client
+
+    async with connect(args) as (client, data_dir):
+        authors = [Author(i, client, stats, args, random.Random(rng.random())) for i in range(args.authors)]
+        # Setup and the app's own prints are not part of the measurement
+        with contextlib.redirect_stdout(io.StringIO()):
+            await asyncio.gather(*(author.setup() for author in authors))
+            storage_before = (await client.get("/storage/stats")).json()
+
+            started = time.perf_counter()
+            await asyncio.gather(*(author.run() for author in authors))
+            elapsed = time.perf_counter() - started
+
+        storage_after = (await client.get("/storage/stats")).json()
+        llm_stats = (await client.get("/llm/stats")).json()
+        cache_stats = (await client.get("/cache/stats")).json()
+        disk_bytes = directory_size(data_dir) if data_dir else None
+
+    writes_before, writes_after = storage_before.get("writes", {}), storage_after.get("writes", {})
+    io_before, io_after = storage_before.get("io", {}), storage_after.get("io", {})
+    saves = stats["POST /content/save"].summary(elapsed)["count"]
+    bytes_written = io_after.get("bytes_written", 0) - io_before.get("bytes_written", 0)
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "target": args.url or "in-process",
+        "params": {
+            "authors": args.authors,
+            "steps": args.steps,
+            "doc_size": args.doc_size,
+            "burst_words": args.burst_words,
+            "think_ms": args.think_ms,
+            "autocomplete_rate": args.autocomplete_rate,
+            "history_every": args.history_every,
+            "memory_every": args.memory_every,
+            "backend": args.backend,
+            "fsync": args.fsync,
+            "llm_latency": args.llm_latency,
+            "tokens_per_second": args.tokens_per_second,
+            "llm_error_rate": args.llm_error_rate,
+            "seed": args.seed
+        },
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(sum(len(s.latencies) for s in stats.values()) / elapsed, 2),
+        "routes": {route: stats[route].summary(elapsed) for route in ROUTES},
+        "storage": {
+            "files_written": io_after.get("files_written", 0) - io_before.get("files_written", 0),
+            "bytes_written": bytes_written,
+            "bytes_written_per_save": round(bytes_written / saves) if saves else 0,
+            "commits": writes_after.get("commits", 0) - writes_before.get("commits", 0),
+            "saves_per_commit": writes_after.get("saves_per_commit"),
+            "disk_bytes": disk_bytes
+        },
+        "llm": llm_stats.get("llm"),
+        "completion_cache": llm_stats.get("completion_cache"),
+        "project_cache": cache_stats.get("cache")
+    }
+
+
+def print_report(results: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    print(f"{results['params']['authors']} authors x {results['params']['steps']} steps, "
+          f"{results['params']['doc_size']} chars each, {results['elapsed_seconds']} s, "
+          f"{results['throughput_rps']} req/s")
+    print(f"{'route':<34} {'count':>6} {'err':>4} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'sent':>11} {'received':>11}")
+    for route, summary in results["routes"].items():
+        if not summary["count"]:
+            continue
+        line = (f"{route:<34} {summary['count']:>6} {summary['errors']:>4} {summary['throughput_rps']:>8} "
+                f"{summary['p50_ms']:>9} {summary['p95_ms']:>9} {summary['p99_ms']:>9} "
+                f"{summary['request_bytes']:>11} {summary['response_bytes']:>11}")
+        old = (baseline or {}).get("routes", {}).get(route)
+        if old and old.get("p95_ms"):
+            line += f"  p95 {100 * (summary['p95_ms'] / old['p95_ms'] - 1):+.0f}%"
+        print(line)
+
+    storage = results["storage"]
+    print(f"storage: {storage['bytes_written']} bytes in {storage['files_written']} files "
+          f"({storage['bytes_written_per_save']} per save, {storage['commits']} commits)"
+          + (f", {storage['disk_bytes']} bytes on disk" if storage["disk_bytes"] is not None else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--authors", type=int, default=8, help="Concurrent authors, one project each")
+    parser.add_argument("--steps", type=int, default=40, help="Typing bursts (and autosaves) per author")
+    parser.add_argument("--doc-size", type=int, default=100_000, help="Initial characters per project")
+    parser.add_argument("--burst-words", type=int, default=6, help="Most words typed between autosaves")
+    parser.add_argument("--think-ms", type=float, default=50, help="Mean pause between typing bursts")
+    parser.add_argument("--autocomplete-rate", type=float, default=0.5,
+                        help="Share of bursts followed by an idle pause that triggers autocomplete")
+    parser.add_argument("--history-every", type=int, default=5, help="Fetch recent edits every N bursts")
+    parser.add_argument("--memory-every", type=int, default=10, help="Generate a memory every N bursts")
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--fsync", choices=("none", "always", "batch"), default="none")
+    parser.add_argument("--llm-latency", default="lognormal:300:0.5", help="Stand-in time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--url", help="Benchmark a running server instead of the app in this process")
+    parser.add_argument("--keep-data", action="store_true", help="Keep the temporary data directory")
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--compare", help="Earlier results file to compare p95 latencies with")
+    args = parser.parse_args()
+
+    # The in-process app must import from the backend directory after moving to the data directory
+    sys.path.insert(0, os.getcwd())
+
+    results = asyncio.run(benchmark(args))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
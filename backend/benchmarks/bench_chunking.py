@@ -0,0 +1,84 @@
+"""
+Count the chunks an edit sends back to the LLM under fixed-size chunks
+(the first memory pipeline) and content-defined chunks (utils/chunking.py).
+
+A chunk is re-summarized when its id was not summarized before: under fixed
+chunks the id is the index, so any change of a chunk's text counts; under
+content-defined chunks the id is a hash of the text, wherever it sits.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_chunking [--sizes 100000 1000000] [--chunk-size 1000]
+"""
+import argparse
+import random
+import time
+
+from utils.chunking import content_defined_chunks, fixed_chunks
+from benchmarks.bench_diff import WORDS, make_document
+
+
+def make_paragraph(rng):
+    sentences = []
+    for _ in range(rng.randint(3, 7)):
+        sentences.append(" ".join(rng.choices(WORDS, k=rng.randint(6, 18))).capitalize() + ".")
+    return " ".join(sentences)
+
+
+def make_edits(text, rng):
+    """Edits an author makes between two memory refreshes, early and late in the manuscript"""
+    early = text.find("\n\n", len(text) // 20) + 2
+    middle = text.find("\n\n", len(text) // 2) + 2
+    next_paragraph = text.find("\n\n", early) + 2
+    sentence = text.find(". ", middle) + 2
+    return {
+        "insert_paragraph_early": text[:early] + make_paragraph(rng) + "\n\n" + text[early:],
+        "delete_paragraph_early": text[:early] + text[next_paragraph:],
+        "type_sentence_middle": text[:sentence] + "Then the lantern went out. " + text[sentence:],
+        "append_paragraph": text + "\n\n" + make_paragraph(rng),
+    }
+
+
+def resummarized(old_text, new_text, chunker, by_index):
+    """(chunks needing a summary after the edit, chunks in total)"""
+    def key(text, chunk):
+        # An index id is only summarized for the text it had then
+        return (chunk["id"], text[chunk["start"]:chunk["end"]]) if by_index else chunk["id"]
+
+    summarized = {key(old_text, chunk) for chunk in chunker(old_text)}
+    chunks = chunker(new_text)
+    return sum(1 for chunk in chunks if key(new_text, chunk) not in summarized), len(chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    fixed = lambda text: fixed_chunks(text, args.chunk_size)
+    defined = lambda text: content_defined_chunks(text, args.chunk_size)
+
+    for size in args.sizes:
+        old_text = make_document(size, rng)
+        start = time.perf_counter()
+        chunks = defined(old_text)
+        elapsed = time.perf_counter() - start
+        lengths = [chunk["end"] - chunk["start"] for chunk in chunks]
+        print(
+            f"{size} characters: {len(chunks)} content-defined chunks "
+            f"(mean {sum(lengths) / len(lengths):.0f}, min {min(lengths)}, max {max(lengths)} characters), "
+            f"chunked in {elapsed * 1000:.1f} ms"
+        )
+        print(f"  {'edit':<24} {'fixed':>14} {'content-defined':>16}")
+        for name, new_text in make_edits(old_text, rng).items():
+            fixed_dirty, fixed_total = resummarized(old_text, new_text, fixed, True)
+            defined_dirty, defined_total = resummarized(old_text, new_text, defined, False)
+            print(f"  {name:<24} {fixed_dirty:>6} / {fixed_total:<6} {defined_dirty:>7} / {defined_total:<7}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Compare the windowed diff engine with the full-document SequenceMatcher
+previously used by EditHistory._calculate_diff.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_diff [--sizes 10000 100000 1000000] [--repeat 3]
+
+SequenceMatcher needs minutes per call at 1M characters; pass
+--baseline-max-size to skip the baseline above a given size.
+"""
+import argparse
+import random
+import time
+from difflib import SequenceMatcher
+
+from utils.diff import compute_diff, diff_stats
+
+WORDS = (
+    "the a of and to in she he was had that it her his with on for at as "
+    "ship harbor night lantern storm letter captain river garden silence "
+    "whispered walked remembered opened turned looked never always again"
+).split()
+
+
+def make_document(size, rng):
+    """Generate a manuscript-like document of roughly size characters"""
+    paragraphs = []
+    length = 0
+    while length < size:
+        sentences = []
+        for _ in range(rng.randint(3, 7)):
+            words = rng.choices(WORDS, k=rng.randint(6, 18))
+            sentences.append(" ".join(words).capitalize() + ".")
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+    return "\n\n".join(paragraphs)[:size]
+
+
+def make_edits(text, rng):
+    """Typical autosave-sized edits: typing, a deleted sentence and a rewritten phrase"""
+    middle = len(text) // 2
+    typed = text[:middle] + " and then the lantern went out" + text[middle:]
+    cut_start = text.find(". ", middle) + 2
+    cut_end = text.find(". ", cut_start) + 2
+    deleted = text[:cut_start] + text[cut_end:]
+    spot = rng.randrange(len(text) - 200)
+    rewritten = text[:spot] + text[spot:spot + 40].upper() + text[spot + 40:]
+    return {"typing": typed, "delete_sentence": deleted, "rewrite_phrase": rewritten}
+
+
+def time_call(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline-max-size", type=int, default=None,
+                        help="Skip SequenceMatcher for documents larger than this")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'size':>9}  {'edit':<16} {'SequenceMatcher':>16} {'windowed diff':>14} {'speedup':>9}  ops")
+
+    for size in args.sizes:
+        old_text = make_document(size, rng)
+        for name, new_text in make_edits(old_text, rng).items():
+            windowed = time_call(lambda: diff_stats(old_text, new_text, compute_diff(old_text, new_text)), args.repeat)
+            ops = compute_diff(old_text, new_text)
+            if args.baseline_max_size is not None and size > args.baseline_max_size:
+                print(f"{size:>9}  {name:<16} {'skipped':>16} {windowed * 1000:>11.3f} ms {'-':>9}  {len(ops)}")
+                continue
+            baseline = time_call(lambda: SequenceMatcher(None, old_text, new_text).ratio(), args.repeat)
+            print(
+                f"{size:>9}  {name:<16} {baseline * 1000:>13.2f} ms {windowed * 1000:>11.3f} ms "
+                f"{baseline / windowed:>8.0f}x  {len(ops)}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Time BM25 retrieval of memories for autocomplete (utils/retrieval.py):
+building the index, a query with the current snippet and previous context,
+and a query right after a batch of memories changed.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_retrieval [--memories 1000 10000 50000] [--queries 200]
+"""
+import argparse
+import random
+import statistics
+import time
+
+from utils.memory_manager import MemoryManager
+from utils.retrieval import MemoryRetriever
+from benchmarks.bench_diff import WORDS, make_document
+
+# Character and place names give the memories the rare terms retrieval keys on
+NAMES = [f"{first}{last}" for first in ("al", "bel", "cor", "dar", "el", "fen", "gal", "hal") for last in
+         ("ric", "wyn", "dor", "mere", "ston", "vale", "ford", "wick", "ton", "by")]
+
+
+class InMemoryStore:
+    """Store stub keeping memories in a dict, so the benchmark measures retrieval only"""
+
+    def load_memories(self, project_name):
+        return None
+
+    def save_memories(self, project_name, memories, changed=None, deleted=None):
+        pass
+
+
+def make_memory(rng):
+    words = rng.choices(WORDS, k=rng.randint(8, 14)) + rng.sample(NAMES, 2)
+    rng.shuffle(words)
+    return " ".join(words).capitalize() + "."
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--memories", type=int, nargs="+", default=[1000, 10_000, 50_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--changed", type=int, default=20, help="Memories changed between queries")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'memories':>9} {'build':>10} {'query p50':>10} {'query p95':>10} {'after update':>13}")
+    for count in args.memories:
+        memories = MemoryManager("bench", InMemoryStore())
+        chunks = [{"id": f"c{i}", "start": i * 1000, "end": (i + 1) * 1000} for i in range(count)]
+        memories.sync_chunk_memories(chunks, {chunk["id"]: make_memory(rng) for chunk in chunks})
+        retriever = MemoryRetriever(memories)
+
+        started = time.perf_counter()
+        retriever.search("", "warm up", k=3)
+        build = time.perf_counter() - started
+
+        timings = []
+        for _ in range(args.queries):
+            context = make_document(1000, rng) + " " + " ".join(rng.sample(NAMES, 2))
+            started = time.perf_counter()
+            retriever.search(context[-60:], context, k=3)
+            timings.append(time.perf_counter() - started)
+
+        updates = []
+        for _ in range(max(1, args.queries // 10)):
+            for memory in rng.sample(memories.get_all_memories(), args.changed):
+                memories.edit_memory(memory["id"], make_memory(rng))
+            context = make_document(1000, rng)
+            started = time.perf_counter()
+            retriever.search(context[-60:], context, k=3)
+            updates.append(time.perf_counter() - started)
+
+        print(
+            f"{count:>9} {build * 1000:>7.1f} ms {statistics.median(timings) * 1000:>7.2f} ms "
+            f"{percentile(timings, 0.95) * 1000:>7.2f} ms {statistics.median(updates) * 1000:>10.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Local stand-in for an OpenAI-compatible chat completions endpoint.
+
+Responses are deterministic: the reply to a conversation depends only on its
+messages and the seed. Latency, token rate and injected errors follow
+configurable distributions, drawn in a sequence fixed by the seed, so the
+backend can be load- and regression-tested offline. Run from the backend directory:
+
+    python -m benchmarks.llm_standin --port 8100 --latency lognormal:300:0.5 --tokens-per-second 50
+
+and point the backend at it with the ``llm`` config section:
+
+    {"llm": {"base_url": "http://localhost:8100/v1", "api_key": "standin"}}
+
+Latency specs are ``fixed:MS``, ``uniform:MIN_MS:MAX_MS``, ``normal:MEAN_MS:STD_MS``
+or ``lognormal:MEDIAN_MS:SIGMA``; the latency is the time to the first token.
+"""
+import re
+import json
+import time
+import math
+import random
+import asyncio
+import hashlib
+import argparse
+from typing import Dict, Any, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DEFAULT_COMPLETIONS = [
+    "walked slowly toward the harbor as the lanterns flickered in the wind.",
+    "had never seen the river so still, not even in the deepest winter.",
+    "opened the letter and read it twice before folding it away.",
+    "turned back to the garden, where the silence felt almost alive.",
+    "remembered the captain's warning and kept the door firmly shut.",
+]
+DEFAULT_MEMORY = "The travelers reached the harbor town and hid the letter from the captain."
+
+# Prompts of /memory/generate end with this instruction
+MEMORY_PROMPT_MARKER = "Memory (keep under"
+
+
+class Latency:
+    """Random delay drawn from a distribution described by a spec string"""
+
+    def __init__(self, spec: str):
+        kind, *params = spec.split(":")
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unsupported latency distribution: {kind}")
+
+    def sample(self, rng: random.Random) -> float:
+        """Draw a delay in seconds"""
+        if self.kind == "fixed":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            ms = rng.uniform(self.params[0], self.params[1])
+        elif self.kind == "normal":
+            ms = rng.gauss(self.params[0], self.params[1])
+        else:
+            ms = self.params[0] * math.exp(rng.gauss(0, self.params[1]))
+        return max(0.0, ms) / 1000
+
+
+class StandInModel:
+    """Deterministic replies with simulated latency and failures"""
+
+    def __init__(self, latency="fixed:200", tokens_per_second=50.0, error_rate=0.0, rate_limit_rate=0.0,
+                 hang_rate=0.0, seed=0, completions: Optional[List[str]] = None, memory: str = DEFAULT_MEMORY):
+        """
+        Initialize the model.
+
+        Args:
+            latency (str): Distribution of the time to first token
+            tokens_per_second (float): Streaming speed after the first token (0 sends everything at once)
+            error_rate (float): Share of requests answered with a 500
+            rate_limit_rate (float): Share of requests answered with a 429
+            hang_rate (float): Share of requests that never answer (to exercise client deadlines)
+            seed (int): Seed of every random draw
+            completions (list, optional): Canned autocomplete replies
+            memory (str): Canned reply to memory generation prompts
+        """
+        self.latency = Latency(latency)
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.hang_rate = hang_rate
+        self.seed = seed
+        self.completions = completions or DEFAULT_COMPLETIONS
+        self.memory = memory
+        self.requests = 0
+
+    def _rng(self, messages: List[Dict[str, Any]]) -> random.Random:
+        digest = hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "big") ^ self.seed)
+
+    def reply(self, messages: List[Dict[str, Any]], max_tokens: int) -> List[str]:
+        """The reply to a conversation, split into tokens"""
+        prompt = messages[-1].get("content", "") if messages else ""
+        if MEMORY_PROMPT_MARKER in prompt:
+            text = self.memory
+        else:
+            text = self.completions[self._rng(messages).randrange(len(self.completions))]
+        return re.findall(r"\s*\S+", text)[:max_tokens]
+
+    def request_rng(self) -> random.Random:
+        """
+        Random source of the next request.
+
+        Latency and failures are drawn per request, not per conversation, so
+        repeated prompts see the whole distribution and retries can succeed;
+        the sequence of draws is still fixed by the seed.
+        """
+        rng = random.Random(self.seed * 1_000_003 + self.requests)
+        self.requests += 1
+        return rng
+
+    def outcome(self, rng: random.Random) -> str:
+        """Decide whether a request succeeds, fails or hangs"""
+        draw = rng.random()
+        if draw < self.hang_rate:
+            return "hang"
+        if draw < self.hang_rate + self.error_rate:
+            return "error"
+        if draw < self.hang_rate + self.error_rate + self.rate_limit_rate:
+            return "rate_limit"
+        return "ok"
+
+
+def estimate_tokens(text: str) -> int:
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+
+def create_app(model: StandInModel) -> FastAPI:
+    app = FastAPI(title="LLM stand-in")
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "standin", "object": "model", "owned_by": "local"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        max_tokens = body.get("max_tokens") or 256
+        model_name = body.get("model", "standin")
+        rng = model.request_rng()
+
+        outcome = model.outcome(rng)
+        if outcome == "hang":
+            await asyncio.sleep(3600)
+        if outcome in ("error", "rate_limit"):
+            await asyncio.sleep(model.latency.sample(rng))
+            status = 500 if outcome == "error" else 429
+            return JSONResponse(
+                status_code=status,
+                content={"error": {"message": f"Injected {outcome}", "type": outcome, "code": status}}
+            )
+
+        tokens = model.reply(messages, max_tokens)
+        completion_id = f"chatcmpl-{hashlib.sha1(''.join(tokens).encode('utf-8')).hexdigest()[:12]}"
+        created = int(time.time())
+        usage = {
+            "prompt_tokens": sum(estimate_tokens(m.get("content", "")) for m in messages),
+            "completion_tokens": len(tokens),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        finish_reason = "length" if len(tokens) >= max_tokens else "stop"
+
+        await asyncio.sleep(model.latency.sample(rng))
+
+        if not body.get("stream"):
+            if model.tokens_per_second > 0:
+                await asyncio.sleep(max(0, len(tokens) - 1) / model.tokens_per_second)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model_name,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": finish_reason
+                }],
+                "usage": usage
+            }
+
+        def chunk(delta, finish=None):
+            return "data: " + json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model_name,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]
+            }) + "\n\n"
+
+        async def events():
+            yield chunk({"role": "assistant", "content": ""})
+            for i, token in enumerate(tokens):
+                if i and model.tokens_per_second > 0:
+                    await asyncio.sleep(1 / model.tokens_per_second)
+                yield chunk({"content": token})
+            yield chunk({}, finish_reason)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a deterministic OpenAI-compatible LLM stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", default="fixed:200", help="Time to first token, e.g. lognormal:300:0.5")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--completions", help="JSON file with a list of canned autocomplete replies")
+    args = parser.parse_args()
+
+    completions = None
+    if args.completions:
+        with open(args.completions, 'r') as f:
+            completions = json.load(f)
+
+    model = StandInModel(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        hang_rate=args.hang_rate,
+        seed=args.seed,
+        completions=completions
+    )
+
+    import uvicorn
+    uvicorn.run(create_app(model), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
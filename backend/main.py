@@ -1,23 +1,64 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from pydantic import BaseModel
 from typing import List, Dict, Optional, Any
 import os
 import json
+import time
+import asyncio
 from datetime import datetime
 from pathlib import Path
-import openai
 from dotenv import load_dotenv
 
 from utils.edit_history import EditHistory
-from utils.config import load_config
-from utils.llm import request_llm
+from utils.document import Document, StaleVersionError
+from utils.project_cache import ProjectCache, ProjectState, ProjectLeaseMiddleware
+from utils.storage import storage
+from utils.project_store import create_store, set_default_store
+from utils.write_coalescer import WriteCoalescer
+from utils.config import load_config, redact_secrets
+from utils.llm import llm_client, LatencyWindow
+from utils.autocomplete import sentence_end, CompletionRegistry, CompletionCache
+from utils.context_assembler import ContextAssembler
+from utils.metrics import registry, MetricsMiddleware, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from utils.profiler import RequestProfiler, ProfilingMiddleware
+from utils.memory_pipeline import MemoryPipeline
+from utils.summary_tree import TOPICS
+from utils.admission import AdmissionController, AdmissionRejected, INTERACTIVE, BACKGROUND, PRIORITY_NAMES, retry_after_header
 app = FastAPI(title="Vibe Writer API", description="Backend API for Vibe Writer application")
 
 # Load environment variables
 load_dotenv()
 
+# File I/O runs in a bounded thread pool, off the event loop
+storage_config = load_config().get("storage", {})
+storage.configure(
+    max_workers=storage_config.get("io_threads", 4),
+    fsync=storage_config.get("fsync", "none"),
+    fsync_interval=storage_config.get("fsync_interval_ms", 50) / 1000
+)
+
+# Projects are persisted through the configured backend (JSON files or SQLite)
+project_store = create_store(storage_config)
+set_default_store(project_store)
+
+# LLM calls share a pooled async client with bounded concurrency
+llm_config = load_config().get("llm", {})
+llm_client.configure(
+    max_concurrency=llm_config.get("max_concurrency", 8),
+    timeout=llm_config.get("timeout_ms", 15000) / 1000,
+    max_retries=llm_config.get("max_retries", 2),
+    retry_backoff=llm_config.get("retry_backoff_ms", 250) / 1000,
+    max_backoff=llm_config.get("max_backoff_ms", 2000) / 1000,
+    base_url=llm_config.get("base_url"),
+    api_key=llm_config.get("api_key")
+)
+
+# Parsed project state shared by all requests in this process
+cache_config = load_config().get("cache", {})
+project_cache = ProjectCache(max_bytes=cache_config.get("max_bytes", 64 * 1024 * 1024))
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -27,16 +68,52 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latency, status and concurrency of every request, exposed on /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Projects a request fetched are not evicted before it finishes
+app.add_middleware(ProjectLeaseMiddleware, cache=project_cache)
+
+# Sampled stack profiles of requests that ask for one (X-Profile header or
+# ?profile=1) or run longer than the threshold, served on /profiles
+profiling_config = load_config().get("profiling", {})
+request_profiler = RequestProfiler(
+    enabled=profiling_config.get("enabled", False),
+    allow_requests=profiling_config.get("allow_requests", True),
+    token=profiling_config.get("token"),
+    slow_request_ms=profiling_config.get("slow_request_ms"),
+    interval_ms=profiling_config.get("interval_ms", 10),
+    window_seconds=profiling_config.get("window_seconds", 60),
+    max_profiles=profiling_config.get("max_profiles", 20)
+)
+app.add_middleware(ProfilingMiddleware, profiler=request_profiler)
+
 # Models
 class TextContent(BaseModel):
     content: str
     project_name: str
     cursor_position: Optional[int] = None
 
+class EditOperation(BaseModel):
+    offset: int
+    delete_len: int = 0
+    insert_text: str = ""
+
+class DeltaContent(BaseModel):
+    project_name: str
+    base_version: int
+    ops: List[EditOperation]
+    cursor_position: Optional[int] = None
+
 class EditResponse(BaseModel):
     success: bool
     message: str
     content: Optional[str] = None
+    version: Optional[int] = None
+
+class VersionRestoreRequest(BaseModel):
+    project_name: str
+    version: int
 
 class ProjectInfo(BaseModel):
     project_name: str
@@ -52,6 +129,11 @@ class AutocompleteRequest(BaseModel):
     previous_context: str
     current_snippet: str
     project_name: str
+    # Identify the editor and order its requests, so newer ones supersede older ones
+    session_id: Optional[str] = None
+    sequence: Optional[int] = None
+    # Character offset of the cursor, used to attach the memories around it
+    cursor_position: Optional[int] = None
 
 class AutocompleteResponse(BaseModel):
     completion: str
@@ -60,90 +142,477 @@ class MemoryRequest(BaseModel):
     project_name: str
     text_chunk: str
     past_memory: List[str]
+
+class SummaryFreezeRequest(BaseModel):
+    project_name: str
+    topic: str
+    frozen: bool = True
 # Helper functions
-def get_edit_history(project_name: str) -> EditHistory:
-    return EditHistory(project_name)
+async def get_project(project_name: str) -> ProjectState:
+    # Within a request (or a memory refresh) the state stays cached until it is done
+    held = project_cache.held()
+    state = project_cache.peek(project_name, held)
+    if state is None:
+        # Loading a cold project reads from disk
+        state = await storage.run(project_cache.get, project_name, held)
+    return state
+
+async def get_edit_history(project_name: str) -> EditHistory:
+    state = await get_project(project_name)
+    return await storage.run(lambda: state.history)
+
+async def get_document(project_name: str) -> Document:
+    return (await get_project(project_name)).document
+
+async def project_exists(state: ProjectState) -> bool:
+    # A new project's first save may still be waiting for its commit
+    return state.dirty or await storage.run(state.document.exists)
+
+async def commit_project(state: ProjectState, base_text: str, base_version: int, location: Dict[str, Any],
+                         save_count: int):
+    """
+    Persist a project's latest state and fold the coalesced saves into one history edit.
+
+    Called by the write coalescer while holding ``state.lock``.
+    """
+    document = state.document
+    await storage.run(document.save)
+    
+    history = await storage.run(lambda: state.history)
+    await storage.run(
+        history.record_edit,
+        base_text,
+        document.text,
+        location=location,
+        save_count=save_count
+    )
+    await storage.run(
+        lambda: state.versions.record(
+            base_text, document.text, document.version, base_version,
+            timestamp=document.last_updated
+        )
+    )
+    state.dirty = False
+    memory_pipeline.mark_changed(state.project_name, base_text, document.text)
+    project_cache.update_size(state.project_name)
+
+# Rapid saves of a project are committed together
+write_coalescer = WriteCoalescer(
+    commit_project,
+    window=storage_config.get("commit_window_ms", 1000) / 1000
+)
+
+# Estimated size of autocomplete prompts, as sent and with every candidate before trimming
+PROMPT_TOKENS = registry.histogram(
+    "autocomplete_prompt_tokens", "Estimated tokens of autocomplete prompts", ("stage",),
+    buckets=(100, 250, 500, 1000, 1500, 2500, 5000, 10000, 25000)
+)
+
+def build_autocomplete_prompt(request: AutocompleteRequest):
+    """Build the (system prompt, user prompt) pair of an autocomplete request within the token budget"""
+    prompt, current_text, report = context_assembler.assemble(
+        request.memory, request.recent_edits, request.previous_context, request.current_snippet
+    )
+    PROMPT_TOKENS.labels("assembled").observe(report["tokens_after"])
+    PROMPT_TOKENS.labels("unbounded").observe(report["tokens_before"])
+    return prompt, current_text
+
+async def attach_memories(request: AutocompleteRequest) -> AutocompleteRequest:
+    """
+    Fill in the memories and story elements most relevant to the text being written when the editor sent none.
+
+    They are ranked with BM25 against the current snippet and the previous
+    context; the memory covering the cursor is added when it did not rank.
+    """
+    limit = autocomplete_config.get("memories", 3)
+    if request.memory.strip() or limit <= 0:
+        return request
+    state = await get_project(request.project_name)
+    if not await project_exists(state):
+        return request
+
+    def retrieve():
+        results = state.retriever.search(request.current_snippet, request.previous_context, k=limit)
+        position = request.cursor_position if request.cursor_position is not None else len(state.document.text)
+        ranked = {id(result.get("memory")) for result in results}
+        covering = [memory for memory in state.memories.memories_near(position, limit=1) if id(memory) not in ranked]
+        return [result["text"] for result in results] + [memory["text"] for memory in covering]
+
+    texts = await storage.run(retrieve)
+    if not texts:
+        return request
+    return request.model_copy(update={"memory": "\n".join(texts)})
+
+# At most one autocomplete request runs per editor session
+in_flight_completions = CompletionRegistry()
+
+def completion_session(request: AutocompleteRequest) -> str:
+    """Key of the session an autocomplete request belongs to (the project if no session id was sent)"""
+    if request.session_id:
+        return f"{request.project_name}:{request.session_id}"
+    return request.project_name
+
+# Autocomplete prompts are assembled within a token budget
+autocomplete_config = load_config().get("autocomplete", {})
+context_assembler = ContextAssembler(
+    budget_tokens=autocomplete_config.get("context_budget_tokens", 1200),
+    max_edits=autocomplete_config.get("max_edits", 10)
+)
+
+# Completions already paid for, served again for repeats and typed-through suggestions
+completion_cache = CompletionCache(
+    max_entries=autocomplete_config.get("cache_entries", 1000),
+    ttl=autocomplete_config.get("cache_ttl_seconds", 300)
+)
+
+# Requests per project and overall are rate limited before they reach the provider
+admission_config = load_config().get("admission", {})
+admission = AdmissionController(
+    global_rate=admission_config.get("global_rate", 10),
+    global_burst=admission_config.get("global_burst", 20),
+    project_rate=admission_config.get("project_rate", 1),
+    project_burst=admission_config.get("project_burst", 5),
+    max_queue=admission_config.get("max_queue", 64),
+    max_wait=admission_config.get("max_wait_ms", 2000) / 1000
+)
+
+MEMORY_SYSTEM_PROMPT = """
+    Read the following segment of a story. Create a brief memory (about 100 characters) 
+    that captures the most important information from this segment.
+    If nothing significant happened, respond with "NO MEMORY".
+        
+    Story segment:
+    """
+
+async def summarize_chunk(project_name: str, text_chunk: str) -> Optional[str]:
+    """Ask the model for a memory of a story segment; None if nothing significant happened"""
+    # Background work: queued behind interactive autocomplete
+    await admission.acquire(project_name, BACKGROUND)
+    user_prompt = f"{text_chunk}\n\nMemory (keep under 100 characters):"
+    memory = await llm_client.complete(
+        user_prompt=user_prompt, 
+        system_prompt=MEMORY_SYSTEM_PROMPT, 
+        max_tokens=100, 
+        temperature=0.7, 
+        model="llama-3.3-70b-versatile"
+    )
+    # Strip and check if it's a "NO MEMORY" response
+    memory_text = memory.strip()
+    if memory_text.upper() == "NO MEMORY":
+        return None
+    return memory_text
+
+SUMMARY_SYSTEM_PROMPT = """
+    You maintain a summary of a story's {topic}. Combine the following notes, in story order,
+    into one summary of the {topic} (at most about 400 characters). Keep what matters later
+    in the story; leave out anything unrelated to the {topic}.
+
+    Notes:
+    """
+
+async def summarize_topic(project_name: str, topic: str, texts: List[str]) -> str:
+    """Ask the model for one summary of a topic from the memories or summaries below it"""
+    await admission.acquire(project_name, BACKGROUND)
+    user_prompt = "\n".join(f"- {text}" for text in texts) + f"\n\nSummary of the {topic}:"
+    summary = await llm_client.complete(
+        user_prompt=user_prompt,
+        system_prompt=SUMMARY_SYSTEM_PROMPT.format(topic=topic),
+        max_tokens=150,
+        temperature=0.3,
+        model="llama-3.3-70b-versatile"
+    )
+    return summary.strip()
+
+# Chunks that changed are summarized into memories in the background
+memory_config = load_config().get("memory", {})
+memory_pipeline = MemoryPipeline(
+    get_project,
+    summarize_chunk,
+    chunk_size=memory_config.get("chunk_size", 1000),
+    interval=memory_config.get("interval_seconds", 300),
+    max_concurrency=memory_config.get("max_concurrency", 2),
+    batch_size=memory_config.get("batch_size", 20),
+    summarize_topic=summarize_topic,
+    fanout=memory_config.get("summary_fanout", 8),
+    summary_every_chars=memory_config.get("summary_every_chars", 5000),
+    leases=project_cache.leases
+)
+
+def shed_response(error: AdmissionRejected) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"detail": f"Too many LLM requests ({error.reason}), retry later", "reason": error.reason},
+        headers=retry_after_header(error)
+    )
+
+# Time from receiving a streaming autocomplete request to sending its first text
+time_to_first_suggestion = LatencyWindow()
+TIME_TO_FIRST_SUGGESTION = registry.histogram(
+    "autocomplete_time_to_first_suggestion_seconds",
+    "Time from receiving a streaming autocomplete request to sending its first text"
+)
+
+# Values the components already count, read only when /metrics is scraped
+def _cache_stats():
+    project, completion = project_cache.stats(), completion_cache.stats()
+    return {
+        "project": (project["hits"], project["misses"], project["hit_ratio"]),
+        "completion": (completion["exact_hits"] + completion["typed_through_hits"], completion["misses"],
+                       completion["hit_rate"])
+    }
+
+registry.callback("cache_hits_total", "Cache hits", "counter",
+                  lambda: {(name,): hits for name, (hits, _, _) in _cache_stats().items()}, ("cache",))
+registry.callback("cache_misses_total", "Cache misses", "counter",
+                  lambda: {(name,): misses for name, (_, misses, _) in _cache_stats().items()}, ("cache",))
+registry.callback("cache_hit_ratio", "Share of cache lookups that hit", "gauge",
+                  lambda: {(name,): ratio for name, (_, _, ratio) in _cache_stats().items()}, ("cache",))
+registry.callback("project_cache_bytes", "Estimated size of the cached project state", "gauge",
+                  lambda: project_cache.stats()["current_bytes"])
+registry.callback("storage_bytes_read_total", "Bytes read from project files", "counter",
+                  lambda: storage.stats()["bytes_read"])
+registry.callback("storage_bytes_written_total", "Bytes written to project files", "counter",
+                  lambda: storage.stats()["bytes_written"])
+registry.callback("storage_commits_total", "Coalesced commits of project state", "counter",
+                  lambda: write_coalescer.stats()["commits"])
+registry.callback("storage_pending_commit_groups", "Projects with saves waiting for their commit", "gauge",
+                  lambda: write_coalescer.stats()["pending_groups"])
+registry.callback("admission_queue_depth", "LLM requests waiting for admission", "gauge",
+                  lambda: {(name,): admission.queue_depth(priority) for priority, name in PRIORITY_NAMES.items()},
+                  ("priority",))
+registry.callback("memory_dirty_chunks", "Chunks waiting for their memory as of the last refresh", "gauge",
+                  lambda: memory_pipeline.stats()["dirty_chunks"])
+registry.callback("memory_oldest_dirty_seconds", "Age of the oldest edit not summarized yet (current memory freshness lag)",
+                  "gauge", lambda: memory_pipeline.oldest_dirty_seconds())
+registry.callback("memory_llm_calls_last_hour", "Memory and summary requests sent to the LLM in the last hour", "gauge",
+                  lambda: memory_pipeline.calls_last_hour())
+registry.callback("autocomplete_superseded_total", "Autocomplete requests cancelled by a newer one", "counter",
+                  lambda: in_flight_completions.stats()["superseded"])
+
+def sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """Format a Server-Sent Events message"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
 
 # Routes
+@app.on_event("startup")
+async def startup():
+    memory_pipeline.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await write_coalescer.flush_all()
+    await memory_pipeline.stop()
+    request_profiler.sampler.stop()
+    storage.close()
+    project_store.close()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Vibe Writer API"}
 
 @app.get("/config")
 async def get_config():
-    config = load_config()
-    return config
+    config = await storage.run(load_config)
+    # Keys and tokens set in the config file stay on the server
+    return redact_secrets(config)
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    return {"success": True, "cache": project_cache.stats()}
+
+@app.get("/storage/stats")
+async def get_storage_stats():
+    return {"success": True, "writes": write_coalescer.stats(), "io": storage.stats()}
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(content=registry.exposition(), media_type=METRICS_CONTENT_TYPE)
+
+def check_profile_access(request: Request):
+    """Reject clients that may not read profiles (the token goes in X-Profile-Token or ?token=)"""
+    if not request_profiler.enabled:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    token = request.headers.get("x-profile-token") or request.query_params.get("token")
+    if not request_profiler.can_read(token, request.client.host if request.client else None):
+        raise HTTPException(status_code=403, detail="A valid profiling token is required")
+
+@app.get("/profiles")
+async def list_profiles(request: Request):
+    check_profile_access(request)
+    return {"success": True, "profiles": request_profiler.list_profiles()}
+
+@app.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, request: Request, format: str = "collapsed"):
+    """A request's profile as collapsed stacks (for flamegraph.pl or speedscope), or as JSON with format=json"""
+    check_profile_access(request)
+    profile = request_profiler.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile '{profile_id}' not found")
+    if format == "json":
+        return {"success": True, "profile": profile}
+    return Response(content=profile["collapsed"], media_type="text/plain; charset=utf-8")
+
+@app.get("/llm/stats")
+async def get_llm_stats():
+    return {
+        "success": True,
+        "llm": llm_client.stats(),
+        "time_to_first_suggestion": time_to_first_suggestion.summary(),
+        "autocomplete": in_flight_completions.stats(),
+        "completion_cache": completion_cache.stats(),
+        "admission": admission.stats(),
+        "memory_pipeline": memory_pipeline.stats()
+    }
 
 @app.post("/content/save")
 async def save_content(content_data: TextContent):
     try:
-        # Load existing content
-        project_path = Path(f"data/projects/{content_data.project_name}/content.json")
+        state = await get_project(content_data.project_name)
         
-        old_content = ""
-        if project_path.exists():
-            with open(project_path, "r") as f:
-                data = json.load(f)
-                old_content = data.get("content", "")
-        
-        # Create directory if doesn't exist
-        project_path.parent.mkdir(parents=True, exist_ok=True)
+        async with state.lock:
+            # Replace the whole document in memory
+            document = state.document
+            old_version = document.version
+            old_content = document.replace(content_data.content)
+            version = document.version
+            state.dirty = True
+            committed = write_coalescer.add(
+                content_data.project_name,
+                state,
+                old_content,
+                old_version,
+                location={"cursor_position": content_data.cursor_position}
+            )
         
-        # Save new content
-        with open(project_path, "w") as f:
-            json.dump({
-                "content": content_data.content,
-                "last_updated": datetime.now().isoformat()
-            }, f, indent=2)
+        # Acknowledge once the group this save belongs to is on disk
+        await write_coalescer.wait(content_data.project_name, committed)
         
-        # Record edit in history
-        history = get_edit_history(content_data.project_name)
-        history.record_edit(
-            old_content, 
-            content_data.content, 
-            location={"cursor_position": content_data.cursor_position}
+        return EditResponse(
+            success=True,
+            message="Content saved successfully",
+            content=content_data.content,
+            version=version
         )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error saving content: {str(e)}")
+
+@app.post("/content/save/delta")
+async def save_content_delta(delta: DeltaContent):
+    try:
+        state = await get_project(delta.project_name)
         
+        async with state.lock:
+            document = state.document
+            
+            if not await project_exists(state):
+                return JSONResponse(
+                    status_code=404,
+                    content={"success": False, "message": f"Project '{delta.project_name}' not found"}
+                )
+            
+            old_version = document.version
+            try:
+                old_content = document.apply_ops(delta.base_version, [op.model_dump() for op in delta.ops])
+            except StaleVersionError as e:
+                # The client must resync (or fall back to a full save)
+                return JSONResponse(
+                    status_code=409,
+                    content={"success": False, "message": str(e), "version": e.current_version}
+                )
+            except ValueError as e:
+                return JSONResponse(
+                    status_code=400,
+                    content={"success": False, "message": f"Invalid edit operations: {str(e)}"}
+                )
+            
+            version = document.version
+            state.dirty = True
+            committed = write_coalescer.add(
+                delta.project_name,
+                state,
+                old_content,
+                old_version,
+                location={"cursor_position": delta.cursor_position}
+            )
+        
+        # Acknowledge once the group this save belongs to is on disk
+        await write_coalescer.wait(delta.project_name, committed)
+        
+        # The client already holds the new text, so only the version is returned
         return EditResponse(
             success=True,
             message="Content saved successfully",
-            content=content_data.content
+            version=version
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving content: {str(e)}")
 
 @app.get("/content/{project_name}")
-async def get_content(project_name: str):
+async def get_content(project_name: str, start: Optional[int] = None, end: Optional[int] = None,
+                      chapter: Optional[int] = None):
     try:
-        project_path = Path(f"data/projects/{project_name}/content.json")
+        if start is None and end is None and chapter is None:
+            state = await get_project(project_name)
+            document = state.document
+            
+            if not await project_exists(state):
+                return JSONResponse(
+                    status_code=404,
+                    content={"success": False, "message": f"Project '{project_name}' not found"}
+                )
+            
+            return {
+                "success": True,
+                "content": document.text,
+                "version": document.version,
+                "last_updated": document.last_updated
+            }
         
-        if not project_path.exists():
+        # Serve ranges from the cache when the project is hot; otherwise read
+        # just the range from the store without loading the project
+        state = project_cache.peek(project_name, project_cache.held())
+        try:
+            if state is not None:
+                result = state.document.read_range(start, end, chapter) if await project_exists(state) else None
+            else:
+                result = await storage.run(project_store.read_content_range, project_name, start, end, chapter)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"success": False, "message": str(e)})
+        
+        if result is None:
             return JSONResponse(
                 status_code=404,
                 content={"success": False, "message": f"Project '{project_name}' not found"}
             )
         
-        with open(project_path, "r") as f:
-            data = json.load(f)
-        
-        return {"success": True, "content": data.get("content", ""), "last_updated": data.get("last_updated")}
+        return {"success": True, **result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving content: {str(e)}")
 
 @app.get("/history/edits/{project_name}")
 async def get_edit_history_endpoint(project_name: str, count: int = 10):
     try:
-        history = get_edit_history(project_name)
-        edits = history.get_recent_edits(count)
+        history = await get_edit_history(project_name)
+        edits = await storage.run(history.get_recent_edits, count)
         return {"success": True, "edits": edits}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving edit history: {str(e)}")
 
 @app.get("/history/deletions/{project_name}")
-async def get_deletion_history(project_name: str, count: int = 10):
+async def get_deletion_history(project_name: str, count: int = 10, text: Optional[str] = None,
+                               since: Optional[str] = None, until: Optional[str] = None,
+                               position: Optional[int] = None, radius: int = 200):
     try:
-        history = get_edit_history(project_name)
-        deletions = history.get_recent_deletions(count)
+        history = await get_edit_history(project_name)
+        if text is None and since is None and until is None and position is None:
+            deletions = await storage.run(history.get_recent_deletions, count)
+        else:
+            # Filtered lookups are answered from the in-memory deletion index,
+            # which commits update under the project lock
+            state = await get_project(project_name)
+            async with state.lock:
+                deletions = history.search_deletions(text, since, until, position, radius, count)
         return {"success": True, "deletions": deletions}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving deletion history: {str(e)}")
@@ -151,66 +620,157 @@ async def get_deletion_history(project_name: str, count: int = 10):
 @app.post("/history/restore")
 async def restore_deleted_text(deletion_info: DeletedTextInfo):
     try:
-        # Load existing content
-        project_path = Path(f"data/projects/{deletion_info.project_name}/content.json")
+        state = await get_project(deletion_info.project_name)
+        
+        async with state.lock:
+            # Commit pending saves first so the restore is recorded as its own edit
+            await write_coalescer.flush_locked(deletion_info.project_name)
+            
+            # Load existing content
+            document = state.document
+            
+            if not await project_exists(state):
+                return JSONResponse(
+                    status_code=404,
+                    content={"success": False, "message": f"Project '{deletion_info.project_name}' not found"}
+                )
+            
+            # Append deleted text to the end for now
+            # In a real application, you might want to insert at cursor position
+            current_content = document.text
+            current_version = document.version
+            new_content = current_content + "\n\n" + deletion_info.deleted_text
+            
+            # Save updated content
+            document.replace(new_content)
+            await storage.run(document.save)
+            
+            # Record edit in history
+            history = await get_edit_history(deletion_info.project_name)
+            await storage.run(
+                history.record_edit,
+                current_content, 
+                new_content, 
+                edit_type="restore_deletion"
+            )
+            await storage.run(
+                lambda: state.versions.record(
+                    current_content, new_content, document.version, current_version,
+                    timestamp=document.last_updated
+                )
+            )
+            memory_pipeline.mark_changed(deletion_info.project_name, current_content, new_content)
+        project_cache.update_size(deletion_info.project_name)
         
-        if not project_path.exists():
+        return EditResponse(
+            success=True,
+            message="Deleted text restored successfully",
+            content=new_content,
+            version=document.version
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error restoring deleted text: {str(e)}")
+
+@app.get("/history/versions/{project_name}")
+async def list_versions(project_name: str, count: int = 50):
+    try:
+        state = await get_project(project_name)
+        if not await project_exists(state):
             return JSONResponse(
                 status_code=404,
-                content={"success": False, "message": f"Project '{deletion_info.project_name}' not found"}
+                content={"success": False, "message": f"Project '{project_name}' not found"}
+            )
+        
+        # Saves waiting for a coalesced commit are not versions yet
+        await write_coalescer.flush(project_name)
+        versions = await storage.run(lambda: state.versions.list_versions(count))
+        return {"success": True, "current_version": state.document.version, "versions": versions}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error listing versions: {str(e)}")
+
+@app.get("/history/versions/{project_name}/{version}")
+async def get_version(project_name: str, version: int):
+    try:
+        state = await get_project(project_name)
+        if not await project_exists(state):
+            return JSONResponse(
+                status_code=404,
+                content={"success": False, "message": f"Project '{project_name}' not found"}
             )
-            
-        with open(project_path, "r") as f:
-            data = json.load(f)
-            current_content = data.get("content", "")
         
-        # Append deleted text to the end for now
-        # In a real application, you might want to insert at cursor position
-        new_content = current_content + "\n\n" + deletion_info.deleted_text
+        await write_coalescer.flush(project_name)
+        async with state.lock:
+            document = state.document
+            content = await storage.run(
+                lambda: state.versions.get_version(version, document.text, document.version)
+            )
         
-        # Save updated content
-        with open(project_path, "w") as f:
-            json.dump({
-                "content": new_content,
-                "last_updated": datetime.now().isoformat()
-            }, f, indent=2)
+        if content is None:
+            return JSONResponse(
+                status_code=404,
+                content={"success": False, "message": f"Version {version} of '{project_name}' not found"}
+            )
+        return {"success": True, "version": version, "content": content}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving version: {str(e)}")
+
+@app.post("/history/versions/restore")
+async def restore_version(request: VersionRestoreRequest):
+    try:
+        state = await get_project(request.project_name)
+        if not await project_exists(state):
+            return JSONResponse(
+                status_code=404,
+                content={"success": False, "message": f"Project '{request.project_name}' not found"}
+            )
         
-        # Record edit in history
-        history = get_edit_history(deletion_info.project_name)
-        history.record_edit(
-            current_content, 
-            new_content, 
-            edit_type="restore_deletion"
-        )
+        async with state.lock:
+            await write_coalescer.flush_locked(request.project_name)
+            document = state.document
+            restored = await storage.run(
+                lambda: state.versions.get_version(request.version, document.text, document.version)
+            )
+            if restored is None:
+                return JSONResponse(
+                    status_code=404,
+                    content={"success": False, "message": f"Version {request.version} of '{request.project_name}' not found"}
+                )
+            
+            # Restoring is a new edit on top of the current version
+            current_version = document.version
+            current_content = document.replace(restored)
+            await storage.run(document.save)
+            
+            history = await get_edit_history(request.project_name)
+            await storage.run(
+                history.record_edit,
+                current_content,
+                restored,
+                location={"restored_version": request.version},
+                edit_type="restore_version"
+            )
+            await storage.run(
+                lambda: state.versions.record(
+                    current_content, restored, document.version, current_version,
+                    timestamp=document.last_updated
+                )
+            )
+            memory_pipeline.mark_changed(request.project_name, current_content, restored)
+        project_cache.update_size(request.project_name)
         
         return EditResponse(
             success=True,
-            message="Deleted text restored successfully",
-            content=new_content
+            message=f"Restored version {request.version}",
+            content=restored,
+            version=document.version
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error restoring deleted text: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error restoring version: {str(e)}")
 
 @app.get("/projects")
 async def list_projects():
     try:
-        projects_dir = Path("data/projects")
-        if not projects_dir.exists():
-            return {"success": True, "projects": []}
-            
-        projects = []
-        for project_dir in projects_dir.iterdir():
-            if project_dir.is_dir():
-                info_path = project_dir / "info.json"
-                project_info = {"project_name": project_dir.name}
-                
-                if info_path.exists():
-                    with open(info_path, "r") as f:
-                        info = json.load(f)
-                        project_info.update(info)
-                        
-                projects.append(project_info)
-                
+        projects = await storage.run(project_store.list_projects)
         return {"success": True, "projects": projects}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing projects: {str(e)}")
@@ -218,35 +778,28 @@ async def list_projects():
 @app.post("/projects")
 async def create_project(project_info: ProjectInfo):
     try:
-        project_dir = Path(f"data/projects/{project_info.project_name}")
-        
-        if project_dir.exists():
+        if await storage.run(project_store.project_exists, project_info.project_name):
             return JSONResponse(
                 status_code=400,
                 content={"success": False, "message": f"Project '{project_info.project_name}' already exists"}
             )
             
-        # Create project directory
-        project_dir.mkdir(parents=True, exist_ok=True)
-        
         # Save project info
-        with open(project_dir / "info.json", "w") as f:
-            json.dump({
-                "project_name": project_info.project_name,
-                "description": project_info.description,
-                "created_at": datetime.now().isoformat(),
-                "last_updated": datetime.now().isoformat()
-            }, f, indent=2)
+        await storage.run(project_store.create_project, project_info.project_name, {
+            "project_name": project_info.project_name,
+            "description": project_info.description,
+            "created_at": datetime.now().isoformat(),
+            "last_updated": datetime.now().isoformat()
+        })
             
         # Create empty content file
-        with open(project_dir / "content.json", "w") as f:
-            json.dump({
-                "content": "",
-                "last_updated": datetime.now().isoformat()
-            }, f, indent=2)
+        state = await get_project(project_info.project_name)
+        async with state.lock:
+            state.document.replace("")
+            await storage.run(state.document.save)
             
         # Initialize edit history
-        history = get_edit_history(project_info.project_name)
+        history = await get_edit_history(project_info.project_name)
         
         return {"success": True, "message": f"Project '{project_info.project_name}' created successfully"}
     except Exception as e:
@@ -256,65 +809,244 @@ async def create_project(project_info: ProjectInfo):
 async def autocomplete(request: AutocompleteRequest):
     print(f"Received autocomplete request: {request}")  
     try:
+        session = completion_session(request)
+        # Cached under the memory the editor sent, so retrieval is skipped on a hit
+        client_memory = request.memory
+        cached = completion_cache.get(session, client_memory, request.previous_context, request.current_snippet)
+        if cached is not None:
+            return AutocompleteResponse(completion=cached)
+        request = await attach_memories(request)
+        
         # Create prompt for the model
-        prompt = f"""You are an AI writing assistant helping a user complete their current sentence.
-        USER INFORMATION:
-        {request.memory}
-
-        RECENT EDITING HISTORY:
-        {json.dumps(request.recent_edits, indent=2)}
+        prompt, current_text = build_autocomplete_prompt(request)
 
-        PREVIOUS CONTEXT:
-        {request.previous_context}
+        async def admitted_completion():
+            # Waiting for admission happens inside the task, so a newer request also cancels a queued one
+            await admission.acquire(request.project_name, INTERACTIVE)
+            return await llm_client.complete(user_prompt=current_text, system_prompt=prompt, max_tokens=100, temperature=0.7, model="llama-3.3-70b-versatile")
 
-        TASK:
-        Complete ONLY the current sentence in a way that flows naturally from what has been written. 
-        Do not add any additional sentences, paragraphs, or explanations. 
-        Return ONLY the suggested text completion that would finish the current sentence.
-        """
+        # Call the Llama model, replacing this session's request in flight
+        started = time.monotonic()
+        task = in_flight_completions.start(session, request.sequence, admitted_completion())
+        if task is None:
+            return JSONResponse(status_code=409, content={"detail": "Superseded by a newer autocomplete request"})
         
-        current_text = f"CURRENT TEXT (incomplete sentence, just continue on): {request.current_snippet}"
-
-        # Call the Llama model
-        completion = request_llm(user_prompt=current_text, system_prompt=prompt, max_tokens=100, temperature=0.7, model="llama-3.3-70b-versatile")
+        try:
+            completion = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task.cancelled():
+                # A newer request of the same session took over
+                return JSONResponse(status_code=409, content={"detail": "Superseded by a newer autocomplete request"})
+            # The client went away; stop the upstream call too
+            task.cancel()
+            raise
         
+        completion_cache.put(
+            session, client_memory, request.previous_context, request.current_snippet,
+            completion, time.monotonic() - started
+        )
         return AutocompleteResponse(completion=completion)
     
+    except AdmissionRejected as e:
+        return shed_response(e)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Autocomplete timed out")
     except Exception as e:
         print(f"Error generating autocomplete: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating autocomplete: {str(e)}")
 
-@app.post("/memory/generate")
-async def generate_memory(request: MemoryRequest):
-    system_prompt = """
-    Read the following segment of a story. Create a brief memory (about 100 characters) 
-    that captures the most important information from this segment.
-    If nothing significant happened, respond with "NO MEMORY".
-        
-    Story segment:
+@app.post("/autocomplete/stream")
+async def autocomplete_stream(request: AutocompleteRequest):
     """
-    try:
-        user_prompt = f"{request.text_chunk}\n\nMemory (keep under 100 characters):"
-        
-        memory = request_llm(
-            user_prompt=user_prompt, 
-            system_prompt=system_prompt, 
-            max_tokens=100, 
-            temperature=0.7, 
-            model="llama-3.3-70b-versatile"
+    Stream a completion as Server-Sent Events.
+
+    Each text fragment is sent as a ``data: {"text": ...}`` message as soon as
+    it arrives. The stream stops (and the upstream call is closed) once the
+    completion finishes its sentence, and ends with a ``done`` event carrying
+    the full completion, an ``error`` event, or a ``superseded`` event when a
+    newer request of the same session replaced it. Cached completions are sent
+    as a single message.
+    """
+    received = time.monotonic()
+    session = completion_session(request)
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+    # Cached under the memory the editor sent, so retrieval is skipped on a hit
+    client_memory = request.memory
+    cached = completion_cache.get(session, client_memory, request.previous_context, request.current_snippet)
+    if cached is not None:
+        time_to_first_suggestion.record(time.monotonic() - received)
+        TIME_TO_FIRST_SUGGESTION.observe(time.monotonic() - received)
+        return StreamingResponse(
+            iter([
+                sse_event({"text": cached}),
+                sse_event({"completion": cached, "stopped_early": False, "cached": True}, event="done")
+            ]),
+            media_type="text/event-stream",
+            headers=headers
         )
 
-        # Strip and check if it's a "NO MEMORY" response
-        memory_text = memory.strip()
-        if memory_text.upper() == "NO MEMORY":
+    request = await attach_memories(request)
+    prompt, current_text = build_autocomplete_prompt(request)
+    messages = asyncio.Queue()
+    admitted = asyncio.get_running_loop().create_future()
+
+    async def produce():
+        # Runs as its own task so a newer request can cancel it, even while it waits for admission
+        try:
+            await admission.acquire(request.project_name, INTERACTIVE)
+        except AdmissionRejected as e:
+            admitted.set_exception(e)
+            return
+        admitted.set_result(None)
+
+        completion = ""
+        stopped_early = False
+        fragments = llm_client.stream(user_prompt=current_text, system_prompt=prompt, max_tokens=100, temperature=0.7, model="llama-3.3-70b-versatile")
+        try:
+            async for fragment in fragments:
+                end = sentence_end(completion + fragment)
+                if end is not None:
+                    # Only forward the text up to the end of the sentence
+                    fragment = (completion + fragment)[len(completion):end]
+                    stopped_early = True
+                if fragment:
+                    if not completion:
+                        time_to_first_suggestion.record(time.monotonic() - received)
+                        TIME_TO_FIRST_SUGGESTION.observe(time.monotonic() - received)
+                    completion += fragment
+                    messages.put_nowait(sse_event({"text": fragment}))
+                if stopped_early:
+                    break
+            completion_cache.put(
+                session, client_memory, request.previous_context, request.current_snippet,
+                completion.strip(), time.monotonic() - received
+            )
+            messages.put_nowait(sse_event({"completion": completion.strip(), "stopped_early": stopped_early}, event="done"))
+        except asyncio.CancelledError:
+            messages.put_nowait(sse_event({"detail": "Superseded by a newer autocomplete request"}, event="superseded"))
+            raise
+        except asyncio.TimeoutError:
+            messages.put_nowait(sse_event({"detail": "Autocomplete timed out"}, event="error"))
+        except Exception as e:
+            print(f"Error streaming autocomplete: {str(e)}")
+            messages.put_nowait(sse_event({"detail": f"Error generating autocomplete: {str(e)}"}, event="error"))
+        finally:
+            messages.put_nowait(None)
+            await fragments.aclose()
+
+    task = in_flight_completions.start(session, request.sequence, produce())
+    if task is None:
+        return JSONResponse(status_code=409, content={"detail": "Superseded by a newer autocomplete request"})
+
+    # The status code is only known once the request is admitted, shed or superseded
+    try:
+        await asyncio.wait({admitted, task}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    if not admitted.done():
+        return JSONResponse(status_code=409, content={"detail": "Superseded by a newer autocomplete request"})
+    if admitted.exception() is not None:
+        return shed_response(admitted.exception())
+
+    async def events():
+        try:
+            while (message := await messages.get()) is not None:
+                yield message
+        finally:
+            # Also stops the upstream call when the client disconnects
+            task.cancel()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+@app.post("/memory/generate")
+async def generate_memory(request: MemoryRequest):
+    try:
+        memory_text = await summarize_chunk(request.project_name, request.text_chunk)
+        if memory_text is None:
             return {"generated": False, "memory": None}
         return {"generated": True, "memory": memory_text}
     
+    except AdmissionRejected as e:
+        return shed_response(e)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Memory generation timed out")
     except Exception as e:
         print(f"Error generating memory: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating memory: {str(e)}")
+
+@app.get("/memory/{project_name}")
+async def get_memories(project_name: str):
+    try:
+        state = await get_project(project_name)
+        memories = await storage.run(lambda: state.memories)
+        return {
+            "success": True,
+            "memories": memories.get_all_memories(),
+            "pending_chunks": await memory_pipeline.pending(project_name)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving memories: {str(e)}")
+
+@app.post("/memory/refresh/{project_name}")
+async def refresh_memories(project_name: str):
+    """Summarize every new chunk of a project now instead of at the next scheduled refresh"""
+    try:
+        state = await get_project(project_name)
+        if not await project_exists(state):
+            raise HTTPException(status_code=404, detail=f"Project '{project_name}' not found")
+        # Saves still waiting for their commit are not in the text yet
+        await write_coalescer.flush(project_name)
+        result = await memory_pipeline.refresh(project_name)
+        return {"success": True, **result}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error refreshing memories: {str(e)}")
     
 
+@app.get("/summaries/{project_name}")
+async def get_summaries(project_name: str):
+    """Story-wide character, plot, theme, setting and tone summaries of a project"""
+    try:
+        state = await get_project(project_name)
+        summaries = await storage.run(lambda: state.summaries)
+        return {"success": True, "topics": summaries.get_topics()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving summaries: {str(e)}")
+
+@app.post("/summaries/refresh/{project_name}")
+async def refresh_summaries(project_name: str):
+    """Summarize new chunks, then the sections of the summary tree that changed"""
+    try:
+        state = await get_project(project_name)
+        if not await project_exists(state):
+            raise HTTPException(status_code=404, detail=f"Project '{project_name}' not found")
+        await write_coalescer.flush(project_name)
+        memories = await memory_pipeline.refresh(project_name)
+        if "summaries" not in memories:
+            memories["summaries"] = await memory_pipeline.refresh_summaries(project_name)
+        return {"success": True, **memories}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error refreshing summaries: {str(e)}")
+
+@app.post("/summaries/freeze")
+async def freeze_summary(request: SummaryFreezeRequest):
+    """Lock a topic's summary against refreshes, or unlock it"""
+    if request.topic not in TOPICS:
+        raise HTTPException(status_code=400, detail=f"Unknown topic '{request.topic}', expected one of {', '.join(TOPICS)}")
+    try:
+        state = await get_project(request.project_name)
+        async with state.lock:
+            summaries = await storage.run(lambda: state.summaries)
+            topic = await storage.run(summaries.set_frozen, request.topic, request.frozen)
+        return {"success": True, "topic": request.topic, **topic}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error updating summary: {str(e)}")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("backend.main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
@@ -0,0 +1,184 @@
+"""
+Tests of the diff engine, the version store and deletion search.
+
+Run from the backend directory:
+
+    python -m pytest tests
+"""
+import random
+
+import pytest
+
+from utils.diff import compute_diff, apply_diff, invert_diff
+from utils.edit_history import EditHistory
+from utils.project_store import JsonProjectStore
+from utils.sqlite_store import SqliteProjectStore, migrate_json_to_sqlite
+from utils.version_store import VersionStore
+
+WORDS = ["the", "storm", "walked", "slowly", "harbor", "lantern", "captain", "river", "é", "🌊", "\n\n"]
+
+
+def random_edit(text, rng):
+    """Insert, delete or replace a few words somewhere in the text"""
+    start = rng.randint(0, len(text))
+    end = min(len(text), start + rng.randint(0, 12))
+    inserted = " ".join(rng.choices(WORDS, k=rng.randint(0, 4)))
+    return text[:start] + inserted + text[end:]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JsonProjectStore(str(tmp_path / "projects"))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_diff_round_trip(seed):
+    rng = random.Random(seed)
+    old_text = " ".join(rng.choices(WORDS, k=200))
+    new_text = old_text
+    for _ in range(rng.randint(1, 6)):
+        new_text = random_edit(new_text, rng)
+
+    ops = compute_diff(old_text, new_text)
+    assert apply_diff(old_text, ops) == new_text
+    assert apply_diff(new_text, invert_diff(ops)) == old_text
+
+
+@pytest.mark.parametrize("old_text, new_text", [
+    ("", ""),
+    ("", "new text"),
+    ("old text", ""),
+    ("same", "same"),
+    ("She walked slowly home.", "She talked quickly home through the rain."),
+])
+def test_diff_edge_cases(old_text, new_text):
+    ops = compute_diff(old_text, new_text)
+    assert apply_diff(old_text, ops) == new_text
+    assert apply_diff(new_text, invert_diff(ops)) == old_text
+
+
+def test_diff_over_max_cost_is_one_replacement():
+    rng = random.Random(1)
+    old_text = " ".join(rng.choices(WORDS, k=100))
+    new_text = " ".join(rng.choices(WORDS, k=100))
+    ops = compute_diff(old_text, new_text, max_cost=10)
+    assert apply_diff(old_text, ops) == new_text
+    assert apply_diff(new_text, invert_diff(ops)) == old_text
+
+
+def record_versions(versions, count, rng, start=""):
+    texts = {0: start}
+    for version in range(1, count + 1):
+        texts[version] = random_edit(texts[version - 1], rng)
+        versions.record(texts[version - 1], texts[version], version, version - 1)
+    return texts
+
+
+def test_get_version_across_snapshots(store):
+    versions = VersionStore("p", store=store, max_chain=4)
+    texts = record_versions(versions, 30, random.Random(2), start="The storm rose over the harbor. " * 20)
+    assert any(record["snapshot"] for record in versions.records)
+
+    for version, text in texts.items():
+        assert versions.get_version(version, texts[30], 30) == text
+
+    # The same chain read back from the log
+    reopened = VersionStore("p", store=store, max_chain=4)
+    for version, text in texts.items():
+        assert reopened.get_version(version, texts[30], 30) == text
+
+
+def test_record_ignores_versions_that_are_not_newer(store):
+    versions = VersionStore("p", store=store)
+    versions.record("", "one", 1, 0)
+    versions.record("one", "two", 2, 1)
+
+    assert versions.record("one", "two again", 2, 1) is None
+    assert versions.record("", "older", 1, 0) is None
+    assert [record["version"] for record in versions.records] == [1, 2]
+    assert versions.get_version(1, "two", 2) == "one"
+    assert versions.get_version(0, "two", 2) == ""
+
+
+def test_get_version_stops_at_a_gap(store):
+    versions = VersionStore("p", store=store, max_chain=100)
+    versions.record("", "one", 1, 0)
+    # Version 2 was committed without a record
+    versions.record("two", "three", 3, 2)
+
+    assert versions.get_version(2, "three", 3) == "two"
+    assert versions.get_version(1, "three", 3) is None
+
+
+def test_retention_keeps_the_newest_versions(store):
+    versions = VersionStore("p", store=store, max_chain=5, max_versions=10)
+    texts = record_versions(versions, 40, random.Random(3))
+
+    assert len(versions.records) <= 11
+    oldest = versions.records[0]["base_version"]
+    assert oldest >= 29
+    for version in range(oldest, 41):
+        assert versions.get_version(version, texts[40], 40) == texts[version]
+    assert versions.get_version(oldest - 1, texts[40], 40) is None
+
+
+def test_compaction_keeps_the_snapshots_of_logged_records(store, tmp_path, monkeypatch):
+    # Small segments so the log drops whole segments while versions are recorded
+    monkeypatch.setattr(JsonProjectStore, "VERSION_SEGMENT_SIZE", 10)
+    versions = VersionStore("p", store=store, max_chain=5, max_versions=20)
+    texts = record_versions(versions, 77, random.Random(4))
+
+    logged = list(store.open_versions("p"))
+    assert logged[0]["version"] > 1
+    for record in logged:
+        if record["snapshot"]:
+            assert store.load_version_snapshot("p", record["version"]) is not None
+
+    target = SqliteProjectStore(str(tmp_path / "migrated.db"))
+    assert migrate_json_to_sqlite(store, target) == ["p"]
+    migrated = VersionStore("p", store=target, max_chain=5, max_versions=20)
+    for record in migrated.records:
+        assert migrated.get_version(record["version"], texts[77], 77) == texts[record["version"]]
+
+
+def test_migration_skips_versions_behind_a_missing_snapshot(store, tmp_path):
+    versions = VersionStore("p", store=store, max_chain=5)
+    texts = record_versions(versions, 30, random.Random(5))
+    snapshots = [record["version"] for record in versions.records if record["snapshot"]]
+    lost = snapshots[len(snapshots) // 2]
+    (tmp_path / "projects" / "p" / "versions" / f"snapshot-{lost:08d}.txt").unlink()
+
+    target = SqliteProjectStore(str(tmp_path / "migrated.db"))
+    assert migrate_json_to_sqlite(store, target) == ["p"]
+    migrated = VersionStore("p", store=target, max_chain=5)
+    assert migrated.records[0]["version"] == lost + 1
+    for version in range(lost, 31):
+        assert migrated.get_version(version, texts[30], 30) == texts[version]
+
+
+def test_deletions_are_recorded_as_whole_words(store):
+    history = EditHistory("p", store=store)
+    history.record_edit("She walked slowly home.", "She talked quickly home.")
+    history.record_edit("The old dog barked at the lantern.", "The dog barked.")
+
+    deleted = [deletion["deleted_text"] for deletion in history.get_recent_deletions()]
+    assert "walked" in deleted
+    assert "slowly" in deleted
+    assert "old " in deleted
+    assert not any(text in deleted for text in ("w", "lked", "slow"))
+
+
+def test_search_deletions(store):
+    history = EditHistory("p", store=store)
+    history.record_edit("It was a dark and stormy night.", "It was a night.")
+    history.record_edit("The captain walked to the harbor.", "The captain went to the harbor.")
+
+    assert [d["deleted_text"] for d in history.search_deletions("STORMY")] == ["dark and stormy "]
+    assert [d["deleted_text"] for d in history.search_deletions("walk")] == ["walked"]
+    assert history.search_deletions("lantern") == []
+    near = history.search_deletions(position=12, radius=2)
+    assert [d["deleted_text"] for d in near] == ["walked"]
+
+    # The index is rebuilt from the log when the history is reopened
+    reopened = EditHistory("p", store=store)
+    assert [d["deleted_text"] for d in reopened.search_deletions("stormy")] == ["dark and stormy "]
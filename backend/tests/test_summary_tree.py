@@ -0,0 +1,38 @@
+"""
+Tests of the summary tree levels.
+
+Run from the backend directory:
+
+    python -m pytest tests
+"""
+import pytest
+
+from utils.memory_pipeline import MemoryPipeline
+from utils.summary_tree import build_levels
+
+
+def make_memories(count):
+    return [{"id": f"m{i}", "text": f"Memory {i}", "position": i * 100, "end": i * 100 + 99} for i in range(count)]
+
+
+@pytest.mark.parametrize("fanout", [2, 3, 8])
+def test_build_levels_ends_in_one_root(fanout):
+    levels = build_levels(make_memories(50), fanout)
+    assert len(levels[0]) == 50
+    assert len(levels[-1]) == 1
+    assert levels[-1][0]["start"] == 0
+    assert levels[-1][0]["end"] == 4999
+
+
+@pytest.mark.parametrize("fanout", [1, 0, -3])
+def test_build_levels_rejects_fanout_below_two(fanout):
+    with pytest.raises(ValueError):
+        build_levels(make_memories(5), fanout)
+
+
+def test_pipeline_rejects_fanout_below_two():
+    async def summarize(project_name, text):
+        return None
+
+    with pytest.raises(ValueError):
+        MemoryPipeline(None, summarize, fanout=1)
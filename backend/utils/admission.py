@@ -0,0 +1,275 @@
+import math
+import time
+import asyncio
+import itertools
+from typing import Dict, Any, List, Optional
+
+from .metrics import registry
+
+# Lower values are served first
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+ADMITTED = registry.counter("admission_admitted_total", "LLM requests admitted", ("priority",))
+SHED = registry.counter("admission_shed_total", "LLM requests rejected with a 429", ("priority", "reason"))
+WAIT = registry.histogram(
+    "admission_wait_seconds", "Time admitted LLM requests spent queued", ("priority",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of being sent to the LLM provider"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Request shed ({reason}); retry after {retry_after:.1f} s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Allows ``rate`` requests per second on average and bursts of up to ``burst``"""
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+class _Waiter:
+    def __init__(self, project: str, priority: int, sequence: int, future: asyncio.Future):
+        self.project = project
+        self.priority = priority
+        self.sequence = sequence
+        self.future = future
+        self.queued = time.monotonic()
+
+
+class AdmissionController:
+    """Token buckets per project and globally in front of the LLM provider, with a bounded priority queue"""
+
+    def __init__(self, global_rate=10.0, global_burst=20, project_rate=1.0, project_burst=5,
+                 max_queue=64, max_wait=2.0, max_projects=1024):
+        """
+        Initialize the controller.
+
+        A request takes one token from its project's bucket and one from the
+        global bucket. When either is empty it waits in a queue ordered by
+        priority (interactive autocomplete before background memory
+        generation), then arrival; a waiting request whose project still has
+        tokens is not held up by one whose project has none. Requests are
+        shed at once, rather than left to time out, when the queue is full or
+        the wait they can expect exceeds ``max_wait``; an interactive request
+        arriving at a full queue takes the place of the newest background one.
+
+        Args:
+            global_rate (float): Requests per second across all projects (0 for no limit)
+            global_burst (float): Requests the global bucket allows at once
+            project_rate (float): Requests per second of one project (0 for no limit)
+            project_burst (float): Requests one project may send at once
+            max_queue (int): Maximum number of waiting requests
+            max_wait (float): Longest time in seconds a request may wait for admission
+            max_projects (int): Project buckets kept before idle (full) ones are dropped
+        """
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.project_rate = project_rate
+        self.project_burst = project_burst
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_projects = max_projects
+
+        now = time.monotonic()
+        self._global = TokenBucket(global_rate, global_burst, now) if global_rate > 0 else None
+        self._projects: Dict[str, TokenBucket] = {}
+        self._waiters: List[_Waiter] = []
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._pump_task: Optional[asyncio.Task] = None
+
+        self.admitted = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.shed: Dict[str, int] = {}
+
+    async def acquire(self, project: str, priority: int = INTERACTIVE):
+        """
+        Wait until a request of a project may be sent.
+
+        Args:
+            project (str): Project the request belongs to
+            priority (int): INTERACTIVE or BACKGROUND
+
+        Raises:
+            AdmissionRejected: If the request was shed
+        """
+        now = time.monotonic()
+        bucket = self._project_bucket(project, now)
+
+        if not self._waiters and self._bucket_wait(bucket, now) == 0 and self._bucket_wait(self._global, now) == 0:
+            self._take(bucket, now)
+            self._admit(priority, 0.0)
+            return
+
+        # Expected wait: the tokens owed to requests ahead, of this project and overall
+        ahead = sum(1 for waiter in self._waiters if waiter.priority <= priority)
+        expected = 0.0
+        if bucket is not None:
+            project_ahead = sum(1 for waiter in self._waiters if waiter.project == project)
+            expected = self._bucket_wait(bucket, now) + project_ahead / self.project_rate
+        if self._global is not None:
+            expected = max(expected, self._bucket_wait(self._global, now) + ahead / self.global_rate)
+        if expected > self.max_wait:
+            self._shed(priority, "rate_limited", expected)
+
+        if len(self._waiters) >= self.max_queue:
+            victim = self._newest_waiter_below(priority)
+            if victim is None:
+                self._shed(priority, "queue_full", expected)
+            self._waiters.remove(victim)
+            victim.future.set_exception(self._rejection(victim.priority, "preempted", self.max_wait))
+
+        waiter = _Waiter(project, priority, next(self._sequence), asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        self._waiters.sort(key=lambda w: (w.priority, w.sequence))
+        self._wake()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.max_wait)
+        except asyncio.TimeoutError:
+            if waiter.future.done() and not waiter.future.exception():
+                # Admitted just as the wait ran out
+                self._admit(priority, time.monotonic() - waiter.queued)
+                return
+            self._remove(waiter)
+            self._shed(priority, "timeout", self.max_wait)
+        except asyncio.CancelledError:
+            # Superseded or disconnected while queued; give the place to the next one
+            self._remove(waiter)
+            raise
+        self._admit(priority, time.monotonic() - waiter.queued)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get queue depth and admitted/shed counters"""
+        return {
+            "queue_depth": len(self._waiters),
+            "queued": {name: self.queue_depth(priority) for priority, name in PRIORITY_NAMES.items()},
+            "max_queue": self.max_queue,
+            "admitted": dict(self.admitted),
+            "shed": dict(self.shed),
+            "project_buckets": len(self._projects)
+        }
+
+    def queue_depth(self, priority: int) -> int:
+        return sum(1 for waiter in self._waiters if waiter.priority == priority)
+
+    def _project_bucket(self, project: str, now: float) -> Optional[TokenBucket]:
+        if self.project_rate <= 0:
+            return None
+        bucket = self._projects.get(project)
+        if bucket is None:
+            if len(self._projects) >= self.max_projects:
+                # A full bucket holds no state worth keeping
+                waiting = {waiter.project for waiter in self._waiters}
+                for name in [name for name, b in self._projects.items() if name not in waiting and b.is_full(now)]:
+                    del self._projects[name]
+            bucket = TokenBucket(self.project_rate, self.project_burst, now)
+            self._projects[project] = bucket
+        return bucket
+
+    @staticmethod
+    def _bucket_wait(bucket: Optional[TokenBucket], now: float) -> float:
+        return bucket.wait_time(now) if bucket is not None else 0.0
+
+    def _take(self, bucket: Optional[TokenBucket], now: float):
+        if bucket is not None:
+            bucket.take(now)
+        if self._global is not None:
+            self._global.take(now)
+
+    def _admit(self, priority: int, waited: float):
+        name = PRIORITY_NAMES[priority]
+        self.admitted[name] += 1
+        ADMITTED.labels(name).inc()
+        WAIT.labels(name).observe(waited)
+
+    def _rejection(self, priority: int, reason: str, retry_after: float) -> AdmissionRejected:
+        name = PRIORITY_NAMES[priority]
+        key = f"{name}:{reason}"
+        self.shed[key] = self.shed.get(key, 0) + 1
+        SHED.labels(name, reason).inc()
+        return AdmissionRejected(reason, retry_after)
+
+    def _shed(self, priority: int, reason: str, retry_after: float):
+        raise self._rejection(priority, reason, retry_after)
+
+    def _newest_waiter_below(self, priority: int) -> Optional[_Waiter]:
+        """The most recently queued waiter of a lower priority, if any"""
+        candidates = [waiter for waiter in self._waiters if waiter.priority > priority]
+        return max(candidates, key=lambda w: (w.priority, w.sequence)) if candidates else None
+
+    def _remove(self, waiter: _Waiter):
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+            self._wake()
+
+    def _wake(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.ensure_future(self._pump())
+
+    async def _pump(self):
+        """Hand out tokens to waiters in priority order as the buckets refill"""
+        while self._waiters:
+            now = time.monotonic()
+            sleep = self.max_wait
+            for waiter in list(self._waiters):
+                if waiter.future.done():
+                    self._waiters.remove(waiter)
+                    continue
+                global_wait = self._bucket_wait(self._global, now)
+                if global_wait > 0:
+                    # Nobody can go; the first in line gets the next global token
+                    sleep = min(sleep, global_wait)
+                    break
+                bucket = self._projects.get(waiter.project)
+                project_wait = self._bucket_wait(bucket, now)
+                if project_wait > 0:
+                    sleep = min(sleep, project_wait)
+                    continue
+                self._take(bucket, now)
+                self._waiters.remove(waiter)
+                waiter.future.set_result(None)
+
+            if not self._waiters:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(sleep, 0.001))
+            except asyncio.TimeoutError:
+                pass
+
+
+def retry_after_header(error: AdmissionRejected) -> Dict[str, str]:
+    """Retry-After header of a shed request, in whole seconds"""
+    return {"Retry-After": str(max(1, math.ceil(error.retry_after)))}
@@ -0,0 +1,176 @@
+import os
+import json
+from pathlib import Path
+from typing import Dict, Any, List, Iterator
+
+
+class AppendLog:
+    """Segmented, append-only JSONL log of records"""
+
+    # Bytes read per step when scanning a segment backwards
+    TAIL_BLOCK_SIZE = 8192
+
+    def __init__(self, directory, name, segment_size=50, max_records=None):
+        """
+        Initialize the log.
+
+        Records are appended one JSON document per line to numbered segment
+        files ``{name}-000001.jsonl``, ``{name}-000002.jsonl``... A segment is
+        sealed once it holds ``segment_size`` records. Whole sealed segments are
+        dropped when the newer segments alone hold at least ``max_records``.
+
+        Args:
+            directory (str): Directory holding the segment files
+            name (str): Prefix of the segment files
+            segment_size (int): Number of records per segment
+            max_records (int, optional): Number of most recent records to retain.
+                                         If None, nothing is ever dropped.
+        """
+        self.directory = Path(directory)
+        self.name = name
+        self.segment_size = segment_size
+        self.max_records = max_records
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segments = self._list_segments()
+        if not self.segments:
+            self.segments = [1]
+
+        # Only the active segment is ever partially filled
+        self.active_count, self._needs_newline = self._scan_active()
+
+    def append(self, record: Dict[str, Any]):
+        """
+        Append a record to the log.
+
+        Args:
+            record (dict): The record to append
+        """
+        if self.active_count >= self.segment_size:
+            self._roll_over()
+
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        if self._needs_newline:
+            # Terminate a line left incomplete by an interrupted write
+            line = "\n" + line
+            self._needs_newline = False
+
+        with open(self._segment_path(self.segments[-1]), 'a') as f:
+            f.write(line)
+        self.active_count += 1
+
+    def tail(self, count=10) -> List[Dict[str, Any]]:
+        """
+        Get the most recent records, newest first.
+
+        Only the end of the newest segments is read.
+
+        Args:
+            count (int): Number of records to retrieve
+
+        Returns:
+            list: Recent records
+        """
+        records = []
+        for seq in reversed(self.segments):
+            if len(records) >= count:
+                break
+            for line in self._read_lines_backwards(self._segment_path(seq)):
+                record = self._decode(line)
+                if record is not None:
+                    records.append(record)
+                    if len(records) >= count:
+                        break
+        return records
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over all retained records, oldest first"""
+        for seq in list(self.segments):
+            path = self._segment_path(seq)
+            if not path.exists():
+                continue
+            with open(path, 'r') as f:
+                for line in f:
+                    record = self._decode(line)
+                    if record is not None:
+                        yield record
+
+    def __len__(self):
+        """Number of records on disk (sealed segments are always full)"""
+        return (len(self.segments) - 1) * self.segment_size + self.active_count
+
+    def compact(self):
+        """Drop the oldest sealed segments that are no longer needed for retention"""
+        if self.max_records is None:
+            return
+
+        while len(self.segments) > 1 and len(self) - self.segment_size >= self.max_records:
+            oldest = self.segments.pop(0)
+            try:
+                os.remove(self._segment_path(oldest))
+            except FileNotFoundError:
+                pass
+
+    def _roll_over(self):
+        """Seal the active segment and start a new one"""
+        self.segments.append(self.segments[-1] + 1)
+        self.active_count = 0
+        self._needs_newline = False
+        self.compact()
+
+    def _segment_path(self, seq: int) -> Path:
+        return self.directory / f"{self.name}-{seq:06d}.jsonl"
+
+    def _list_segments(self) -> List[int]:
+        prefix = f"{self.name}-"
+        segments = []
+        for path in self.directory.glob(f"{self.name}-*.jsonl"):
+            try:
+                segments.append(int(path.stem[len(prefix):]))
+            except ValueError:
+                continue
+        return sorted(segments)
+
+    def _scan_active(self):
+        """Count the records in the active segment and check its last byte"""
+        path = self._segment_path(self.segments[-1])
+        if not path.exists():
+            return 0, False
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        count = sum(1 for line in data.split(b"\n") if line.strip())
+        return count, bool(data) and not data.endswith(b"\n")
+
+    def _read_lines_backwards(self, path: Path) -> Iterator[str]:
+        """Yield the lines of a file from last to first, reading it in blocks from the end"""
+        if not path.exists():
+            return
+
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            remainder = b""
+
+            while position > 0:
+                step = min(self.TAIL_BLOCK_SIZE, position)
+                position -= step
+                f.seek(position)
+                block = f.read(step) + remainder
+                lines = block.split(b"\n")
+                # The first piece may be the end of a line that starts in an earlier block
+                remainder = lines.pop(0)
+                for line in reversed(lines):
+                    if line.strip():
+                        yield line.decode("utf-8", errors="replace")
+
+            if remainder.strip():
+                yield remainder.decode("utf-8", errors="replace")
+
+    @staticmethod
+    def _decode(line: str):
+        try:
+            return json.loads(line)
+        except ValueError:
+            # Skip a line torn by an interrupted write
+            return None
@@ -0,0 +1,249 @@
+import re
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Awaitable
+
+# A sentence ends at terminal punctuation (optionally followed by closing
+# quotes or brackets) that is followed by whitespace. Punctuation at the very
+# end of the text is not enough: "Mr." or "3." may still continue.
+SENTENCE_END = re.compile(r"[.!?…]+[\"'”’)\]]*(?=\s)")
+
+
+def sentence_end(text: str) -> Optional[int]:
+    """
+    Find where the first sentence of a completion ends.
+
+    Args:
+        text (str): Completion text streamed so far
+
+    Returns:
+        int: Offset just past the sentence's closing punctuation, or None if no sentence has ended yet
+    """
+    # Leading whitespace belongs to the completion, not to a sentence break
+    start = len(text) - len(text.lstrip())
+    match = SENTENCE_END.search(text, start)
+    return match.end() if match else None
+
+
+class _InFlight:
+    def __init__(self, sequence: Optional[int], task: asyncio.Task):
+        self.sequence = sequence
+        self.task = task
+
+
+class CompletionRegistry:
+    """Tracks the in-flight completion of each editor session and cancels superseded ones"""
+
+    def __init__(self):
+        """
+        Initialize the registry.
+
+        A session (an editor, or a project when the client sends no session
+        id) has at most one completion running. Starting a newer one cancels
+        the previous task, which closes its upstream LLM call and frees its
+        concurrency slot. When requests carry a sequence number, a request
+        older than the running one is rejected instead of replacing it.
+        """
+        self._active: Dict[str, _InFlight] = {}
+        self.started = 0
+        self.superseded = 0
+        self.rejected = 0
+
+    def start(self, session: str, sequence: Optional[int], work: Awaitable[Any]) -> Optional[asyncio.Task]:
+        """
+        Run a completion for a session, superseding the one in flight.
+
+        Args:
+            session (str): Session key
+            sequence (int, optional): Position of the request in the session's request order
+            work (awaitable): The completion to run
+
+        Returns:
+            asyncio.Task: The running completion, or None if a newer request is already running
+        """
+        current = self._active.get(session)
+        if current is not None and not current.task.done():
+            if sequence is not None and current.sequence is not None and sequence <= current.sequence:
+                self.rejected += 1
+                # The caller will not await it
+                if asyncio.iscoroutine(work):
+                    work.close()
+                return None
+            current.task.cancel()
+            self.superseded += 1
+
+        task = asyncio.ensure_future(work)
+        entry = _InFlight(sequence, task)
+        self._active[session] = entry
+        self.started += 1
+        task.add_done_callback(lambda _: self._finish(session, entry))
+        return task
+
+    def _finish(self, session: str, entry: _InFlight):
+        if self._active.get(session) is entry:
+            del self._active[session]
+
+    def stats(self) -> Dict[str, Any]:
+        """Get supersession counters"""
+        return {
+            "in_flight": len(self._active),
+            "started": self.started,
+            "superseded": self.superseded,
+            "rejected": self.rejected
+        }
+
+
+# Characters of the previous context compared when checking that the writer typed through a suggestion
+TYPED_THROUGH_CONTEXT_CHARS = 200
+
+
+def normalize(text: str) -> str:
+    """Collapse runs of whitespace and drop trailing whitespace"""
+    return re.sub(r"\s+", " ", text).rstrip()
+
+
+class _CachedCompletion:
+    def __init__(self, memory_key: str, previous_context: str, current_snippet: str, completion: str, latency: float):
+        self.memory_key = memory_key
+        self.previous_context = previous_context
+        self.current_snippet = current_snippet
+        self.completion = completion
+        self.latency = latency
+        self.created = time.monotonic()
+
+
+class CompletionCache:
+    """Per-session cache of completions, serving exact repeats and typed-through suggestions"""
+
+    def __init__(self, max_entries=1000, ttl=300.0):
+        """
+        Initialize the cache.
+
+        Exact repeats of a request (same session, memory, previous context
+        and snippet, after whitespace normalization) are served from an LRU
+        whose entries expire after ``ttl`` seconds. Separately, the last
+        completion of each session is kept: when the new snippet is the old
+        snippet plus the start of that completion, the writer is typing the
+        suggestion, and the rest of it is served without calling the model.
+
+        Args:
+            max_entries (int): Maximum number of cached requests (and of sessions remembered)
+            ttl (float): Seconds a cached completion stays valid
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._exact: OrderedDict = OrderedDict()
+        self._last: OrderedDict = OrderedDict()
+        self.lookups = 0
+        self.exact_hits = 0
+        self.typed_through_hits = 0
+        self.saved_seconds = 0.0
+
+    def get(self, session: str, memory: str, previous_context: str, current_snippet: str) -> Optional[str]:
+        """
+        Look up a completion.
+
+        Args:
+            session (str): Session key
+            memory (str): Memory text sent with the request
+            previous_context (str): Text before the cursor
+            current_snippet (str): Incomplete sentence before the cursor
+
+        Returns:
+            str: The completion to show, or None on a miss
+        """
+        self.lookups += 1
+        now = time.monotonic()
+        memory_key = self._digest(normalize(memory))
+
+        key = self._exact_key(session, memory_key, previous_context, current_snippet)
+        entry = self._exact.get(key)
+        if entry is not None:
+            if now - entry.created <= self.ttl:
+                self._exact.move_to_end(key)
+                self.exact_hits += 1
+                self.saved_seconds += entry.latency
+                return entry.completion
+            del self._exact[key]
+
+        entry = self._last.get(session)
+        if entry is not None and now - entry.created <= self.ttl and entry.memory_key == memory_key:
+            rest = self._typed_through(entry, previous_context, current_snippet)
+            if rest:
+                self._last.move_to_end(session)
+                self.typed_through_hits += 1
+                self.saved_seconds += entry.latency
+                return rest
+        return None
+
+    def put(self, session: str, memory: str, previous_context: str, current_snippet: str,
+            completion: str, latency: float):
+        """
+        Cache a completion received from the model.
+
+        Args:
+            session (str): Session key
+            memory (str): Memory text sent with the request
+            previous_context (str): Text before the cursor
+            current_snippet (str): Incomplete sentence before the cursor
+            completion (str): The completion
+            latency (float): Seconds the model took, counted as saved on every hit
+        """
+        if not completion:
+            return
+        memory_key = self._digest(normalize(memory))
+        entry = _CachedCompletion(memory_key, previous_context, current_snippet, completion, latency)
+
+        for cache, key in ((self._exact, self._exact_key(session, memory_key, previous_context, current_snippet)),
+                           (self._last, session)):
+            cache[key] = entry
+            cache.move_to_end(key)
+            while len(cache) > self.max_entries:
+                cache.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit counters and the model latency saved by hits"""
+        hits = self.exact_hits + self.typed_through_hits
+        return {
+            "entries": len(self._exact),
+            "lookups": self.lookups,
+            "exact_hits": self.exact_hits,
+            "typed_through_hits": self.typed_through_hits,
+            "misses": self.lookups - hits,
+            "hit_rate": hits / self.lookups if self.lookups else 0.0,
+            "saved_latency_ms": round(1000 * self.saved_seconds, 1)
+        }
+
+    @staticmethod
+    def _typed_through(entry: _CachedCompletion, previous_context: str, current_snippet: str) -> Optional[str]:
+        """Rest of the cached completion if the writer has typed its beginning, else None"""
+        if not current_snippet.startswith(entry.current_snippet):
+            return None
+        typed = current_snippet[len(entry.current_snippet):]
+        if not typed:
+            return None
+
+        completion = entry.completion
+        # Completions are stripped, so the space the writer typed before them may be missing
+        if typed[0].isspace() and not completion[:1].isspace():
+            completion = " " + completion
+        if not completion.startswith(typed):
+            return None
+
+        # The text before the snippet must still be the same
+        context_tail = entry.previous_context[-TYPED_THROUGH_CONTEXT_CHARS:] + typed
+        if not previous_context.endswith(context_tail):
+            return None
+
+        rest = completion[len(typed):]
+        return rest if rest.strip() else None
+
+    @classmethod
+    def _exact_key(cls, session, memory_key, previous_context, current_snippet):
+        return (session, memory_key, cls._digest(normalize(previous_context)), normalize(current_snippet))
+
+    @staticmethod
+    def _digest(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
@@ -0,0 +1,102 @@
+import re
+import zlib
+import hashlib
+from bisect import bisect_left, bisect_right
+from typing import Dict, Any, List
+
+PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n\s*")
+SENTENCE_BREAK = re.compile(r"[.!?…][\"'”’)\]]*\s+")
+
+# Characters before a candidate boundary that decide whether it is one
+WINDOW = 64
+
+
+def _window_hash(text: str, position: int) -> int:
+    """Hash of the characters just before a position (what a rolling hash would read there)"""
+    return zlib.crc32(text[max(0, position - WINDOW):position].encode("utf-8"))
+
+
+def chunk_id(text: str) -> str:
+    """Content hash identifying a chunk"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def content_defined_chunks(text: str, target_size=1000, min_size=None, max_size=None,
+                           divisor=2) -> List[Dict[str, Any]]:
+    """
+    Split a text into chunks whose boundaries depend on the text around them, not on offsets.
+
+    Boundaries are paragraph breaks whose preceding window hashes to a
+    multiple of ``divisor``, at least ``min_size`` characters after the
+    previous boundary. A chunk reaching ``max_size`` without such a break
+    ends at its last paragraph break, else at a selected or last sentence
+    end, else at whitespace. Because each decision only looks at nearby
+    text, an edit moves the boundaries of the chunks around it and the
+    following chunks come out identical, with the same ids.
+
+    Args:
+        text (str): The text to split
+        target_size (int): Typical chunk length in characters
+        min_size (int, optional): Shortest chunk (except the last). If None, half the target.
+        max_size (int, optional): Longest chunk. If None, twice the target.
+        divisor (int): One in ``divisor`` eligible paragraph breaks becomes a boundary
+
+    Returns:
+        list: Dicts with ``id`` (content hash, suffixed for repeated content), ``start`` and ``end``
+    """
+    min_size = min_size if min_size is not None else target_size // 2
+    max_size = max_size if max_size is not None else target_size * 2
+
+    # A boundary sits after the blank lines, at the start of the next paragraph
+    breaks = [match.end() for match in PARAGRAPH_BREAK.finditer(text)]
+    chunks = []
+    seen: Dict[str, int] = {}
+    start = 0
+    while start < len(text):
+        end = _next_boundary(text, breaks, start, min_size, max_size, divisor)
+        digest = chunk_id(text[start:end])
+        # Identical chunks (a repeated paragraph) still need distinct ids
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        chunks.append({
+            "id": digest if occurrence == 0 else f"{digest}-{occurrence}",
+            "start": start,
+            "end": end
+        })
+        start = end
+    return chunks
+
+
+def _next_boundary(text: str, breaks: List[int], start: int, min_size: int, max_size: int, divisor: int) -> int:
+    limit = start + max_size
+    if limit >= len(text) and not breaks:
+        return len(text)
+
+    first = bisect_left(breaks, start + min_size)
+    last = bisect_right(breaks, min(limit, len(text) - 1))
+    candidates = breaks[first:last]
+    for position in candidates:
+        if _window_hash(text, position) % divisor == 0:
+            return position
+    if limit >= len(text):
+        return len(text)
+    if candidates:
+        return candidates[-1]
+
+    # No paragraph break in reach: fall back to sentence ends, then to whitespace
+    sentences = [match.end() for match in SENTENCE_BREAK.finditer(text, start + min_size, limit)]
+    for position in sentences:
+        if _window_hash(text, position) % divisor == 0:
+            return position
+    if sentences:
+        return sentences[-1]
+    space = text.rfind(" ", start + min_size, limit)
+    return space + 1 if space > 0 else limit
+
+
+def fixed_chunks(text: str, size=1000) -> List[Dict[str, Any]]:
+    """Chunks of ``size`` characters, identified by their index (the scheme of the first memory plan)"""
+    return [
+        {"id": str(i // size), "start": i, "end": min(i + size, len(text))}
+        for i in range(0, len(text), size)
+    ]
@@ -37,6 +37,61 @@ def load_config(config_path: str = None) -> Dict[str, Any]:
         "features": {
             "edit_history_enabled": True,
             "ai_suggestions_enabled": True
+        },
+        "cache": {
+            "max_bytes": 64 * 1024 * 1024
+        },
+        "storage": {
+            "backend": "json",
+            "projects_dir": "data/projects",
+            "sqlite_path": "data/vibe_writer.db",
+            "migrate_on_start": True,
+            "io_threads": 4,
+            "fsync": "none",
+            "fsync_interval_ms": 50,
+            "commit_window_ms": 1000
+        },
+        "autocomplete": {
+            "cache_entries": 1000,
+            "cache_ttl_seconds": 300,
+            "context_budget_tokens": 1200,
+            "max_edits": 10
+        },
+        "llm": {
+            "max_concurrency": 8,
+            "timeout_ms": 15000,
+            "max_retries": 2,
+            "retry_backoff_ms": 250,
+            "max_backoff_ms": 2000,
+            # OpenAI-compatible endpoint; None uses the provider default
+            "base_url": None,
+            "api_key": None
+        },
+        "memory": {
+            # Chunks edited since their last summary are summarized every interval
+            "chunk_size": 1000,
+            "interval_seconds": 300,
+            "max_concurrency": 2,
+            "batch_size": 20
+        },
+        "admission": {
+            # Token buckets in front of the LLM provider (rates in requests per second, 0 for no limit)
+            "global_rate": 10,
+            "global_burst": 20,
+            "project_rate": 1,
+            "project_burst": 5,
+            "max_queue": 64,
+            "max_wait_ms": 2000
+        },
+        "profiling": {
+            # Nothing is sampled unless enabled
+            "enabled": False,
+            "allow_requests": True,
+            "token": None,
+            "slow_request_ms": None,
+            "interval_ms": 10,
+            "window_seconds": 60,
+            "max_profiles": 20
         }
     }
     
@@ -96,6 +151,26 @@ def _load_config_file(path: str) -> Dict[str, Any]:
     else:
         raise ValueError(f"Unsupported configuration file format: {extension}")
 
+# Credentials that may be set in the configuration but are never served back
+SECRET_SETTINGS = (("llm", "api_key"), ("profiling", "token"))
+
+def redact_secrets(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copy a configuration with its credentials replaced by a placeholder.
+
+    Args:
+        config (dict): The configuration, as returned by load_config
+
+    Returns:
+        dict: The configuration safe to send to clients
+    """
+    redacted = {section: dict(values) if isinstance(values, dict) else values for section, values in config.items()}
+    for section, key in SECRET_SETTINGS:
+        values = redacted.get(section)
+        if isinstance(values, dict) and values.get(key) is not None:
+            values[key] = "<redacted>"
+    return redacted
+
 def save_config(config: Dict[str, Any], path: str = "config.json") -> bool:
     """
     Save configuration to a file.
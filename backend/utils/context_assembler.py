@@ -0,0 +1,180 @@
+import re
+import json
+from typing import Dict, Any, List, Tuple
+
+# Instructions sent first and unchanged on every request, so providers that
+# cache prompt prefixes can reuse them
+AUTOCOMPLETE_SYSTEM_PROMPT = """You are an AI writing assistant helping a user complete their current sentence.
+
+TASK:
+Complete ONLY the current sentence in a way that flows naturally from what has been written.
+Do not add any additional sentences, paragraphs, or explanations.
+Return ONLY the suggested text completion that would finish the current sentence.
+
+The user message contains, when available, USER INFORMATION (memories about the story),
+RECENT EDITING HISTORY, PREVIOUS CONTEXT and the CURRENT TEXT to continue."""
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens of a text without a tokenizer.
+
+    Punctuation marks count as one token each and words as one token per
+    four characters, which tracks BPE tokenizers closely enough for budgeting.
+    """
+    return sum((len(token) + 3) // 4 for token in TOKEN_PATTERN.findall(text))
+
+
+def _take_tokens_from_end(text: str, budget: int) -> str:
+    """Longest suffix of text that fits in budget tokens, cut at a word boundary"""
+    if estimate_tokens(text) <= budget:
+        return text
+    # Tokens average about four characters; shrink until it fits
+    length = budget * 4
+    while length > 0:
+        suffix = text[-length:]
+        space = suffix.find(" ")
+        if 0 <= space < len(suffix) - 1:
+            suffix = suffix[space + 1:]
+        if estimate_tokens(suffix) <= budget:
+            return suffix
+        length = int(length * 0.8)
+    return ""
+
+
+def compact_edit(edit: Dict[str, Any]) -> str:
+    """Summarize an edit history record on one line, quoting the text it changed"""
+    diff = edit.get("diff") or {}
+    summary = f"{edit.get('edit_type', 'edit')} +{diff.get('inserted', diff.get('change_size', 0))}"
+    if "deleted" in diff:
+        summary += f"/-{diff['deleted']}"
+    changed = edit.get("changed")
+    if changed is None:
+        # Records from before the changed text was stored: quote the ops themselves
+        ops = diff.get("ops") or []
+        changed = {
+            "before": " ".join(op["text"] for op in ops if op["op"] == "delete"),
+            "after": " ".join(op["text"] for op in ops if op["op"] == "insert")
+        }
+    after = " ".join(changed.get("after", "").split())
+    before = " ".join(changed.get("before", "").split())
+    if after:
+        summary += f" {json.dumps(after[:60])}"
+    if before:
+        summary += f" (was {json.dumps(before[:60])})"
+    return "- " + summary
+
+
+class ContextAssembler:
+    """Builds the autocomplete prompt within a token budget"""
+
+    # Share of the budget each section is guaranteed before leftovers are handed out by priority
+    SECTION_SHARES = (("previous_context", 0.5), ("memories", 0.3), ("edits", 0.2))
+
+    def __init__(self, budget_tokens=1200, max_edits=10):
+        """
+        Initialize the assembler.
+
+        The current snippet is always included. The remaining budget goes to
+        the nearest previous context, the memories most relevant to the text
+        around the cursor and one-line edit summaries, in that priority: each
+        section first gets up to its share, then unused tokens flow to the
+        sections that still have content, highest priority first.
+
+        Args:
+            budget_tokens (int): Estimated tokens available for the user message
+            max_edits (int): Maximum number of recent edits summarized
+        """
+        self.budget_tokens = budget_tokens
+        self.max_edits = max_edits
+
+    def assemble(self, memory: str, recent_edits: List[Dict[str, Any]], previous_context: str,
+                 current_snippet: str) -> Tuple[str, str, Dict[str, Any]]:
+        """
+        Build the prompt of an autocomplete request.
+
+        Args:
+            memory (str): Memories about the story, one per line or paragraph
+            recent_edits (list): Edit history records, newest first
+            previous_context (str): Text before the cursor
+            current_snippet (str): Incomplete sentence before the cursor
+
+        Returns:
+            tuple: (system prompt, user prompt, report with estimated token counts)
+        """
+        current_text = f"CURRENT TEXT (incomplete sentence, just continue on): {current_snippet}"
+        remaining = max(0, self.budget_tokens - estimate_tokens(current_text))
+
+        # Everything each section could use, in priority order
+        focus = set(WORD_PATTERN.findall((previous_context[-300:] + " " + current_snippet).lower()))
+        candidates = {
+            "previous_context": previous_context,
+            "memories": self._rank_memories(memory, focus),
+            "edits": [compact_edit(edit) for edit in recent_edits[:self.max_edits]]
+        }
+        needs = {
+            "previous_context": estimate_tokens(previous_context),
+            "memories": sum(estimate_tokens(item) for item in candidates["memories"]),
+            "edits": sum(estimate_tokens(item) for item in candidates["edits"])
+        }
+
+        allowances = {}
+        for name, share in self.SECTION_SHARES:
+            allowances[name] = min(needs[name], int(self.budget_tokens * share), remaining)
+            remaining -= allowances[name]
+        for name, _ in self.SECTION_SHARES:
+            extra = min(needs[name] - allowances[name], remaining)
+            allowances[name] += extra
+            remaining -= extra
+
+        context = _take_tokens_from_end(previous_context, allowances["previous_context"])
+        memories = self._fill(candidates["memories"], allowances["memories"])
+        edits = self._fill(candidates["edits"], allowances["edits"])
+
+        sections = []
+        if memories:
+            sections.append("USER INFORMATION:\n" + "\n".join(memories))
+        if edits:
+            sections.append("RECENT EDITING HISTORY:\n" + "\n".join(edits))
+        if context:
+            sections.append("PREVIOUS CONTEXT:\n" + context)
+        sections.append(current_text)
+        user_prompt = "\n\n".join(sections)
+
+        # What the prompt would cost with every candidate: add back what trimming left out
+        tokens_after = estimate_tokens(AUTOCOMPLETE_SYSTEM_PROMPT) + estimate_tokens(user_prompt)
+        used = estimate_tokens(context) + sum(estimate_tokens(item) for item in memories + edits)
+        report = {
+            "tokens_before": tokens_after + sum(needs.values()) - used,
+            "tokens_after": tokens_after,
+            "budget_tokens": self.budget_tokens,
+            "memories": f"{len(memories)}/{len(candidates['memories'])}",
+            "edits": f"{len(edits)}/{len(candidates['edits'])}",
+            "context_chars": f"{len(context)}/{len(previous_context)}"
+        }
+        return AUTOCOMPLETE_SYSTEM_PROMPT, user_prompt, report
+
+    @staticmethod
+    def _rank_memories(memory: str, focus: set) -> List[str]:
+        """Split the memory text into items, most word overlap with the focus text first"""
+        items = list(dict.fromkeys(item.strip() for item in re.split(r"\n\s*\n|\n", memory) if item.strip()))
+        scored = [
+            (-len(focus & set(WORD_PATTERN.findall(item.lower()))), index, item)
+            for index, item in enumerate(items)
+        ]
+        return [item for _, _, item in sorted(scored)]
+
+    @staticmethod
+    def _fill(items: List[str], budget: int) -> List[str]:
+        """Take items in order, skipping those that no longer fit"""
+        chosen = []
+        for item in items:
+            cost = estimate_tokens(item)
+            if cost > budget:
+                continue
+            chosen.append(item)
+            budget -= cost
+        return chosen
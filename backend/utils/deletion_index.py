@@ -0,0 +1,145 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Iterable
+
+
+def trigrams(text: str) -> set:
+    """Lowercased character trigrams of a string"""
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class DeletionIndex:
+    """In-memory index of recent deletions by time, by position and by text"""
+
+    def __init__(self, max_entries=100):
+        """
+        Initialize the index.
+
+        Deletions are looked up by timestamp (bisect over a sorted list),
+        by their offset in the document at the time of the deletion (bisect
+        over a sorted list) and by text (a trigram inverted index whose
+        candidates are confirmed with a substring check).
+
+        Args:
+            max_entries (int): Number of most recent deletions to keep indexed
+        """
+        self.max_entries = max_entries
+        self._entries: Dict[int, Dict[str, Any]] = {}
+        self._next_id = 0
+        # (timestamp, id) sorted by timestamp
+        self._by_time: List[tuple] = []
+        # (offset, id) sorted by offset
+        self._by_position: List[tuple] = []
+        self._by_trigram = defaultdict(set)
+        self._lowered: Dict[int, str] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, deletion: Dict[str, Any]):
+        """
+        Index a deletion, evicting the oldest one if the index is full.
+
+        Args:
+            deletion (dict): Deletion record with ``timestamp``, ``deleted_text`` and ``location``
+        """
+        entry_id = self._next_id
+        self._next_id += 1
+
+        self._entries[entry_id] = deletion
+        insort(self._by_time, (deletion.get("timestamp") or "", entry_id))
+        offset = self._offset(deletion)
+        if offset is not None:
+            insort(self._by_position, (offset, entry_id))
+
+        lowered = deletion.get("deleted_text", "").lower()
+        self._lowered[entry_id] = lowered
+        for gram in trigrams(lowered):
+            self._by_trigram[gram].add(entry_id)
+
+        while len(self._entries) > self.max_entries:
+            # Entries are kept in insertion order, oldest first
+            self._remove(next(iter(self._entries)))
+
+    def add_all(self, deletions: Iterable[Dict[str, Any]]):
+        """Index deletions given oldest first"""
+        for deletion in deletions:
+            self.add(deletion)
+
+    def search(self, text: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+               position: Optional[int] = None, radius: int = 0, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Find deletions matching every given criterion, newest first.
+
+        Args:
+            text (str, optional): Case-insensitive substring of the deleted text
+            since (str, optional): Earliest ISO timestamp (inclusive)
+            until (str, optional): Latest ISO timestamp (inclusive)
+            position (int, optional): Document offset the deletion must be near
+            radius (int): Maximum distance from position
+            limit (int): Maximum number of results
+
+        Returns:
+            list: Matching deletions
+        """
+        candidates = None
+
+        if since is not None or until is not None:
+            lo = bisect_left(self._by_time, (since,)) if since is not None else 0
+            # (until, inf) sorts after every entry stamped ``until``, making the bound inclusive
+            hi = bisect_right(self._by_time, (until, float("inf"))) if until is not None else len(self._by_time)
+            candidates = {entry_id for _, entry_id in self._by_time[lo:hi]}
+
+        if position is not None:
+            lo = bisect_left(self._by_position, (position - radius,))
+            hi = bisect_right(self._by_position, (position + radius, float("inf")))
+            near = {entry_id for _, entry_id in self._by_position[lo:hi]}
+            candidates = near if candidates is None else candidates & near
+
+        if text:
+            candidates = self._match_text(text.lower(), candidates)
+
+        if candidates is None:
+            candidates = self._entries.keys()
+
+        return [self._entries[entry_id] for entry_id in sorted(candidates, reverse=True)[:limit]]
+
+    def _match_text(self, query: str, candidates: Optional[set]) -> set:
+        grams = trigrams(query)
+        if grams:
+            # Intersect the rarest postings first
+            postings = sorted((self._by_trigram.get(gram, set()) for gram in grams), key=len)
+            matched = set(postings[0])
+            for posting in postings[1:]:
+                if not matched:
+                    break
+                matched &= posting
+            if candidates is not None:
+                matched &= candidates
+        else:
+            # Queries shorter than a trigram are checked directly
+            matched = set(self._entries) if candidates is None else set(candidates)
+
+        # Trigrams can match out of order; confirm the substring
+        return {entry_id for entry_id in matched if query in self._lowered[entry_id]}
+
+    def _remove(self, entry_id: int):
+        deletion = self._entries.pop(entry_id)
+        index = bisect_left(self._by_time, (deletion.get("timestamp") or "", entry_id))
+        del self._by_time[index]
+
+        offset = self._offset(deletion)
+        if offset is not None:
+            index = bisect_left(self._by_position, (offset, entry_id))
+            del self._by_position[index]
+
+        for gram in trigrams(self._lowered.pop(entry_id)):
+            posting = self._by_trigram[gram]
+            posting.discard(entry_id)
+            if not posting:
+                del self._by_trigram[gram]
+
+    @staticmethod
+    def _offset(deletion: Dict[str, Any]) -> Optional[int]:
+        return (deletion.get("location") or {}).get("offset")
@@ -0,0 +1,292 @@
+"""
+Character-level diff engine for manuscript edits.
+
+The common prefix and suffix of the two texts are trimmed first (with
+binary-searched slice comparisons, so untouched text is never walked
+character by character in Python). Only the remaining window is handed to a
+linear-space Myers diff, which recursively bisects on the middle snake.
+
+Ops are dicts of the form ``{"op": "insert" | "delete", "offset": int, "text": str}``
+where ``offset`` is a position in the old text. Ops are sorted by offset and
+a delete always comes before an insert at the end of the deleted range.
+"""
+from typing import List, Dict, Any, Optional
+
+# Edit distance above which a window is reported as one replacement
+# instead of being diffed character by character.
+DEFAULT_MAX_COST = 1000
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    """Length of the common prefix of two strings"""
+    if not a or not b or a[0] != b[0]:
+        return 0
+
+    low, high = 0, min(len(a), len(b))
+    mid = high
+    start = 0
+    while low < mid:
+        if a[start:mid] == b[start:mid]:
+            low = mid
+            start = low
+        else:
+            high = mid
+        mid = (high - low) // 2 + low
+    return mid
+
+
+def common_suffix_length(a: str, b: str) -> int:
+    """Length of the common suffix of two strings"""
+    if not a or not b or a[-1] != b[-1]:
+        return 0
+
+    low, high = 0, min(len(a), len(b))
+    mid = high
+    end = 0
+    while low < mid:
+        if a[len(a) - mid:len(a) - end] == b[len(b) - mid:len(b) - end]:
+            low = mid
+            end = low
+        else:
+            high = mid
+        mid = (high - low) // 2 + low
+    return mid
+
+
+def compute_diff(old_text: str, new_text: str, max_cost: int = DEFAULT_MAX_COST) -> List[Dict[str, Any]]:
+    """
+    Compute the insert/delete ops that turn old_text into new_text.
+
+    Args:
+        old_text (str): Text before the edit
+        new_text (str): Text after the edit
+        max_cost (int): Edit distance beyond which a changed window is reported
+                        as a single delete plus insert
+
+    Returns:
+        list: Ops sorted by offset in old_text
+    """
+    ops = []
+    _diff(old_text, new_text, 0, max_cost, ops)
+    return _merge(ops)
+
+
+def apply_diff(old_text: str, ops: List[Dict[str, Any]]) -> str:
+    """
+    Apply ops produced by compute_diff to the text they were computed against.
+
+    Args:
+        old_text (str): Text the ops were computed against
+        ops (list): Ops sorted by offset
+
+    Returns:
+        str: The edited text
+    """
+    pieces = []
+    cursor = 0
+    for op in ops:
+        pieces.append(old_text[cursor:op["offset"]])
+        if op["op"] == "insert":
+            pieces.append(op["text"])
+            cursor = op["offset"]
+        else:
+            cursor = op["offset"] + len(op["text"])
+    pieces.append(old_text[cursor:])
+    return "".join(pieces)
+
+
+def invert_diff(ops: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Invert ops so they turn the new text back into the old text.
+
+    Args:
+        ops (list): Ops sorted by offset in the old text
+
+    Returns:
+        list: Ops sorted by offset in the new text
+    """
+    inverted = []
+    shift = 0
+    for op in ops:
+        if op["op"] == "insert":
+            inverted.append({"op": "delete", "offset": op["offset"] + shift, "text": op["text"]})
+            shift += len(op["text"])
+        else:
+            inverted.append({"op": "insert", "offset": op["offset"] + shift, "text": op["text"]})
+            shift -= len(op["text"])
+    # A delete/insert pair at one boundary inverts to insert/delete; restore delete-first order
+    for i in range(len(inverted) - 1):
+        first, second = inverted[i], inverted[i + 1]
+        if first["op"] == "insert" and second["op"] == "delete" and second["offset"] == first["offset"]:
+            first["offset"] += len(second["text"])
+            inverted[i], inverted[i + 1] = second, first
+    return inverted
+
+
+def diff_stats(old_text: str, new_text: str, ops: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Summarize a diff in the format stored in the edit history.
+
+    ``change_ratio`` matches the definition of ``difflib.SequenceMatcher.ratio``
+    (twice the number of matching characters over the total length).
+
+    Args:
+        old_text (str): Text before the edit
+        new_text (str): Text after the edit
+        ops (list): Ops produced by compute_diff
+
+    Returns:
+        dict: Diff information
+    """
+    deleted = sum(len(op["text"]) for op in ops if op["op"] == "delete")
+    inserted = sum(len(op["text"]) for op in ops if op["op"] == "insert")
+    total = len(old_text) + len(new_text)
+
+    return {
+        "change_size": len(new_text) - len(old_text),
+        "change_ratio": 2.0 * (len(old_text) - deleted) / total if total else 1.0,
+        "inserted": inserted,
+        "deleted": deleted,
+        "ops": ops
+    }
+
+
+def _diff(a: str, b: str, offset: int, max_cost: int, ops: List[Dict[str, Any]]):
+    """Append the ops turning a into b, where a starts at offset in the old text"""
+    prefix = common_prefix_length(a, b)
+    if prefix:
+        a, b = a[prefix:], b[prefix:]
+        offset += prefix
+    suffix = common_suffix_length(a, b)
+    if suffix:
+        a, b = a[:len(a) - suffix], b[:len(b) - suffix]
+
+    if not a and not b:
+        return
+    if not a:
+        ops.append({"op": "insert", "offset": offset, "text": b})
+        return
+    if not b:
+        ops.append({"op": "delete", "offset": offset, "text": a})
+        return
+
+    # One side contained in the other: a pure insertion or deletion around it
+    if len(a) > len(b):
+        i = a.find(b)
+        if i != -1:
+            ops.append({"op": "delete", "offset": offset, "text": a[:i]})
+            ops.append({"op": "delete", "offset": offset + i + len(b), "text": a[i + len(b):]})
+            return
+    else:
+        i = b.find(a)
+        if i != -1:
+            ops.append({"op": "insert", "offset": offset, "text": b[:i]})
+            ops.append({"op": "insert", "offset": offset + len(a), "text": b[i + len(a):]})
+            return
+
+    split = _middle_snake(a, b, max_cost)
+    if split is None:
+        ops.append({"op": "delete", "offset": offset, "text": a})
+        ops.append({"op": "insert", "offset": offset + len(a), "text": b})
+        return
+
+    x, y = split
+    _diff(a[:x], b[:y], offset, max_cost, ops)
+    _diff(a[x:], b[y:], offset + x, max_cost, ops)
+
+
+def _middle_snake(a: str, b: str, max_cost: int) -> Optional[tuple]:
+    """
+    Find a point on an optimal edit path by running Myers' algorithm from
+    both ends until the forward and reverse paths overlap.
+
+    Returns:
+        tuple: (x, y) split point, or None if the edit distance exceeds max_cost
+    """
+    n, m = len(a), len(b)
+    max_d = min((n + m + 1) // 2, max_cost // 2 + 1)
+    v_offset = max_d
+    v_length = 2 * max_d + 2
+    v1 = [-1] * v_length
+    v2 = [-1] * v_length
+    v1[v_offset + 1] = 0
+    v2[v_offset + 1] = 0
+    delta = n - m
+    # With an odd delta the forward path detects the overlap, otherwise the reverse one
+    front = delta % 2 != 0
+    k1start = k1end = k2start = k2end = 0
+
+    for d in range(max_d):
+        for k1 in range(-d + k1start, d + 1 - k1end, 2):
+            k1_offset = v_offset + k1
+            if k1 == -d or (k1 != d and v1[k1_offset - 1] < v1[k1_offset + 1]):
+                x1 = v1[k1_offset + 1]
+            else:
+                x1 = v1[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[x1] == b[y1]:
+                x1 += 1
+                y1 += 1
+            v1[k1_offset] = x1
+            if x1 > n:
+                k1end += 2
+            elif y1 > m:
+                k1start += 2
+            elif front:
+                k2_offset = v_offset + delta - k1
+                if 0 <= k2_offset < v_length and v2[k2_offset] != -1:
+                    if x1 >= n - v2[k2_offset]:
+                        return x1, y1
+
+        for k2 in range(-d + k2start, d + 1 - k2end, 2):
+            k2_offset = v_offset + k2
+            if k2 == -d or (k2 != d and v2[k2_offset - 1] < v2[k2_offset + 1]):
+                x2 = v2[k2_offset + 1]
+            else:
+                x2 = v2[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[n - x2 - 1] == b[m - y2 - 1]:
+                x2 += 1
+                y2 += 1
+            v2[k2_offset] = x2
+            if x2 > n:
+                k2end += 2
+            elif y2 > m:
+                k2start += 2
+            elif not front:
+                k1_offset = v_offset + delta - k2
+                if 0 <= k1_offset < v_length and v1[k1_offset] != -1:
+                    x1 = v1[k1_offset]
+                    if x1 >= n - x2:
+                        return x1, x1 - (delta - k2)
+
+    return None
+
+
+def _merge(ops: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Coalesce ops touching the same stretch of old text into one delete
+    followed by one insert, dropping empty ops.
+    """
+    hunks = []
+    for op in ops:
+        if not op["text"]:
+            continue
+        if hunks and op["offset"] == hunks[-1]["end"]:
+            hunk = hunks[-1]
+        else:
+            hunk = {"start": op["offset"], "end": op["offset"], "deleted": [], "inserted": []}
+            hunks.append(hunk)
+        if op["op"] == "delete":
+            hunk["deleted"].append(op["text"])
+            hunk["end"] += len(op["text"])
+        else:
+            hunk["inserted"].append(op["text"])
+
+    merged = []
+    for hunk in hunks:
+        if hunk["deleted"]:
+            merged.append({"op": "delete", "offset": hunk["start"], "text": "".join(hunk["deleted"])})
+        if hunk["inserted"]:
+            merged.append({"op": "insert", "offset": hunk["end"], "text": "".join(hunk["inserted"])})
+    return merged
@@ -0,0 +1,167 @@
+from datetime import datetime
+from typing import List, Dict, Any
+
+from .project_store import ProjectStore, get_default_store
+from .storage import STORAGE_DURATION
+from .text_ranges import find_chapters, resolve_range
+
+# Timed here rather than in the stores so both backends are covered
+_CONTENT_LOAD = STORAGE_DURATION.labels("content_load")
+_CONTENT_SAVE = STORAGE_DURATION.labels("content_save")
+
+class StaleVersionError(Exception):
+    """Raised when edit operations are based on an outdated document version"""
+
+    def __init__(self, base_version: int, current_version: int):
+        super().__init__(
+            f"Base version {base_version} is stale (current version is {current_version})"
+        )
+        self.base_version = base_version
+        self.current_version = current_version
+
+
+class Document:
+    """Server-side model of a project's manuscript"""
+
+    def __init__(self, project_name, store: ProjectStore = None):
+        """
+        Initialize the document.
+
+        Args:
+            project_name (str): Name of the project
+            store (ProjectStore, optional): Where the document is persisted. If None, uses the default store.
+        """
+        self.project_name = project_name
+        self.store = store or get_default_store()
+
+        self.text = ""
+        self.version = 0
+        self.last_updated = None
+        self._persisted = False
+        self._chapters = None
+        self._chapters_version = None
+
+        self.load()
+
+    def exists(self):
+        """Check whether the document has been persisted"""
+        return self._persisted or self.store.load_content(self.project_name) is not None
+
+    def load(self):
+        """Load the document from the store, if it exists"""
+        with _CONTENT_LOAD.time():
+            data = self.store.load_content(self.project_name)
+        self._persisted = data is not None
+        if data is None:
+            return False
+
+        self.text = data.get("content", "")
+        self.version = data.get("version", 0)
+        self.last_updated = data.get("last_updated")
+        return True
+
+    def save(self):
+        """Save the document to the store"""
+        with _CONTENT_SAVE.time():
+            self.store.save_content(self.project_name, {
+                "content": self.text,
+                "version": self.version,
+                "last_updated": self.last_updated,
+                "chapters": self.chapters
+            })
+        self._persisted = True
+
+    @property
+    def chapters(self) -> List[Dict[str, Any]]:
+        """Chapters of the current text (recomputed only when the version changes)"""
+        if self._chapters_version != self.version:
+            self._chapters = find_chapters(self.text)
+            self._chapters_version = self.version
+        return self._chapters
+
+    def read_range(self, start=None, end=None, chapter=None) -> Dict[str, Any]:
+        """
+        Read part of the document.
+
+        Args:
+            start (int, optional): First character of the range
+            end (int, optional): Character after the end of the range
+            chapter (int, optional): Index of a chapter, used instead of start/end
+
+        Returns:
+            dict: The ``content`` of the range with its ``start``, ``end`` and the document ``length``
+        """
+        start, end = resolve_range(len(self.text), self.chapters, start, end, chapter)
+        return {
+            "content": self.text[start:end],
+            "start": start,
+            "end": end,
+            "length": len(self.text),
+            "version": self.version,
+            "last_updated": self.last_updated
+        }
+
+    def replace(self, new_text: str):
+        """
+        Replace the whole document text.
+
+        Args:
+            new_text (str): The new document text
+
+        Returns:
+            str: The text before the replacement
+        """
+        old_text = self.text
+        self._commit(new_text)
+        return old_text
+
+    def apply_ops(self, base_version: int, ops: List[Dict[str, Any]]):
+        """
+        Apply edit operations made against a given version of the document.
+
+        Operations are expressed against the base text: they must be sorted by
+        offset and must not overlap. Each operation removes ``delete_len``
+        characters at ``offset`` and inserts ``insert_text`` in their place.
+
+        Args:
+            base_version (int): Version the operations were computed against
+            ops (list): Operations with ``offset``, ``delete_len`` and ``insert_text`` keys
+
+        Returns:
+            str: The text before the operations were applied
+
+        Raises:
+            StaleVersionError: If base_version is not the current version
+            ValueError: If an operation is out of range or overlaps a previous one
+        """
+        if base_version != self.version:
+            raise StaleVersionError(base_version, self.version)
+
+        old_text = self.text
+        pieces = []
+        cursor = 0
+
+        for op in ops:
+            offset = op["offset"]
+            delete_len = op.get("delete_len", 0)
+            insert_text = op.get("insert_text", "")
+
+            if offset < cursor or delete_len < 0:
+                raise ValueError(f"Operation at offset {offset} overlaps or is out of order")
+            if offset + delete_len > len(old_text):
+                raise ValueError(f"Operation at offset {offset} is past the end of the document")
+
+            pieces.append(old_text[cursor:offset])
+            pieces.append(insert_text)
+            cursor = offset + delete_len
+
+        pieces.append(old_text[cursor:])
+        self._commit("".join(pieces))
+
+        return old_text
+
+    def _commit(self, new_text: str):
+        """Install new text and advance the version"""
+        self.text = new_text
+        self.version += 1
+        self.last_updated = datetime.now().isoformat()
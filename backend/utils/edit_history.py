@@ -1,88 +1,63 @@
-import os
-import json
-from pathlib import Path
 from datetime import datetime
-from difflib import SequenceMatcher
+
+from .diff import compute_diff, diff_stats
+from .deletion_index import DeletionIndex
+from .project_store import get_default_store
 
 class EditHistory:
     """Class to track and manage edit history and context"""
     
-    def __init__(self, project_name, max_history_size=100, history_path=None):
+    def __init__(self, project_name, max_history_size=100, history_path=None, segment_size=50, store=None,
+                 min_deletion_length=3):
         """
         Initialize the edit history tracker.
         
+        Edits and deletions are kept in append-only logs, so recording an edit
+        costs a single small append regardless of how long the history is.
+        
         Args:
             project_name (str): Name of the project
             max_history_size (int): Maximum number of edits to store in history
-            history_path (str, optional): Path to the history file. If None, uses default path.
+            history_path (str, optional): Path to the legacy history file, for JSON stores.
+                                          If None, uses the default path.
+            segment_size (int): Number of records per log segment
+            store (ProjectStore, optional): Where the history is persisted. If None, uses the default store.
+            min_deletion_length (int): Shortest deleted span (ignoring surrounding whitespace)
+                                       that record_edit records as a deletion
         """
         self.project_name = project_name
         self.max_history_size = max_history_size
+        self.history_path = history_path
+        self.segment_size = segment_size
+        self.store = store or get_default_store()
+        self.min_deletion_length = min_deletion_length
         
-        if history_path is None:
-            # Default path in data/projects/{project_name}/edit_history.json
-            self.history_path = os.path.join("data", "projects", project_name, "edit_history.json")
-        else:
-            self.history_path = history_path
-        
-        # Initialize empty history
-        self.history = {
-            "edits": [],
-            "deletions": [],
-            "metadata": {
-                "project_name": project_name,
-                "created_at": datetime.now().isoformat(),
-                "last_updated": datetime.now().isoformat()
-            }
-        }
-        
-        # Load history if it exists
+        # Open the logs, migrating a legacy history file if there is one
         self.load_history()
     
     def load_history(self):
-        """Load edit history from file or initialize new one"""
-        history_file = Path(self.history_path)
-        
-        if history_file.exists():
-            try:
-                with open(self.history_path, 'r') as f:
-                    self.history = json.load(f)
-                return True
-            except Exception as e:
-                print(f"Error loading edit history: {e}")
-                return False
-        else:
-            # Create directories and save empty history
-            history_file.parent.mkdir(parents=True, exist_ok=True)
-            self.save_history()
-            return True
-    
-    def save_history(self):
-        """Save edit history to file"""
-        try:
-            # Update timestamp
-            self.history["metadata"]["last_updated"] = datetime.now().isoformat()
-            
-            # Create parent directories if they don't exist
-            Path(self.history_path).parent.mkdir(parents=True, exist_ok=True)
-            
-            # Write history
-            with open(self.history_path, 'w') as f:
-                json.dump(self.history, f, indent=2)
-            return True
-        except Exception as e:
-            print(f"Error saving edit history: {e}")
-            return False
+        """Open the edit and deletion logs"""
+        self.edits, self.deletions, self.metadata = self.store.open_history(
+            self.project_name, self.max_history_size, self.segment_size, history_path=self.history_path
+        )
+        self.deletion_index = DeletionIndex(self.max_history_size)
+        self.deletion_index.add_all(self.deletions)
+        return True
     
-    def record_edit(self, old_text, new_text, location=None, edit_type="text_change"):
+    def record_edit(self, old_text, new_text, location=None, edit_type="text_change", save_count=1):
         """
         Record an edit in the history.
         
+        Spans the edit deleted are also recorded as deletions, widened to
+        whole words (a character diff of "walked" to "talked" deletes only
+        "w", but the word that disappeared is "walked").
+        
         Args:
             old_text (str): Text before the edit
             new_text (str): Text after the edit
             location (dict, optional): Information about edit location (cursor position, section, etc.)
             edit_type (str): Type of edit (e.g., text_change, format_change, etc.)
+            save_count (int): Number of saves folded into this edit
             
         Returns:
             dict: The recorded edit
@@ -99,16 +74,17 @@ class EditHistory:
             "context": {
                 "before": old_text[-min(100, len(old_text)):] if old_text else "",
                 "after": new_text[:min(100, len(new_text))] if new_text else ""
-            }
+            },
+            "changed": self._changed_text(old_text, new_text, diff["ops"]),
+            "save_count": save_count
         }
         
-        # Add to history and trim if needed
-        self.history["edits"].insert(0, edit)
-        if len(self.history["edits"]) > self.max_history_size:
-            self.history["edits"] = self.history["edits"][:self.max_history_size]
+        self.edits.append(edit)
         
-        # Save history
-        self.save_history()
+        for start, end in self._deleted_words(old_text, diff["ops"]):
+            deleted_text = old_text[start:end]
+            if len(deleted_text.strip()) >= self.min_deletion_length:
+                self.record_deletion(deleted_text, location=dict(location or {}, offset=start))
         
         return edit
     
@@ -131,19 +107,14 @@ class EditHistory:
             "context": deleted_text[:min(200, len(deleted_text))] if deleted_text else ""
         }
         
-        # Add to history and trim if needed
-        self.history["deletions"].insert(0, deletion)
-        if len(self.history["deletions"]) > self.max_history_size:
-            self.history["deletions"] = self.history["deletions"][:self.max_history_size]
-        
-        # Save history
-        self.save_history()
+        self.deletions.append(deletion)
+        self.deletion_index.add(deletion)
         
         return deletion
     
     def get_recent_edits(self, count=10):
         """
-        Get recent edits from history.
+        Get recent edits from history, newest first.
         
         Args:
             count (int): Number of edits to retrieve
@@ -151,11 +122,11 @@ class EditHistory:
         Returns:
             list: Recent edits
         """
-        return self.history["edits"][:min(count, len(self.history["edits"]))]
+        return self.edits.tail(min(count, self.max_history_size))
     
     def get_recent_deletions(self, count=10):
         """
-        Get recent deletions from history.
+        Get recent deletions from history, newest first.
         
         Args:
             count (int): Number of deletions to retrieve
@@ -163,7 +134,7 @@ class EditHistory:
         Returns:
             list: Recent deletions
         """
-        return self.history["deletions"][:min(count, len(self.history["deletions"]))]
+        return self.deletions.tail(min(count, self.max_history_size))
     
     def get_context_for_completion(self, current_text, cursor_position):
         """
@@ -202,17 +173,24 @@ class EditHistory:
         Returns:
             list: Related deletions
         """
-        related_deletions = []
+        return self.deletion_index.search(text=search_text, limit=max_results)
+    
+    def search_deletions(self, text=None, since=None, until=None, position=None, radius=0, max_results=10):
+        """
+        Find deletions by text, time and position, newest first.
         
-        for deletion in self.history["deletions"]:
-            deleted_text = deletion.get("deleted_text", "")
-            if search_text.lower() in deleted_text.lower():
-                related_deletions.append(deletion)
-                
-                if len(related_deletions) >= max_results:
-                    break
-                    
-        return related_deletions
+        Args:
+            text (str, optional): Case-insensitive substring of the deleted text
+            since (str, optional): Earliest ISO timestamp
+            until (str, optional): Latest ISO timestamp
+            position (int, optional): Document offset (at the time of the deletion) to search around
+            radius (int): Maximum distance from position
+            max_results (int): Maximum number of results to return
+            
+        Returns:
+            list: Matching deletions
+        """
+        return self.deletion_index.search(text, since, until, position, radius, max_results)
     
     def _calculate_diff(self, old_text, new_text):
         """
@@ -223,17 +201,60 @@ class EditHistory:
             new_text (str): Text after the edit
             
         Returns:
-            dict: Diff information
+            dict: Diff information, including the insert/delete ops
         """
-        # Simple diff calculation
-        matcher = SequenceMatcher(None, old_text, new_text)
-        change_size = len(new_text) - len(old_text)
-        change_ratio = matcher.ratio()
-        
-        return {
-            "change_size": change_size,
-            "change_ratio": change_ratio
-        }
+        return diff_stats(old_text, new_text, compute_diff(old_text, new_text))
+    
+    @staticmethod
+    def _changed_text(old_text, new_text, ops, limit=100):
+        """
+        The stretch of text an edit changed, before and after, widened to whole words.
+
+        Returns:
+            dict: ``before`` and ``after`` (each cut to ``limit`` characters), empty if nothing changed
+        """
+        if not ops:
+            return {"before": "", "after": ""}
+        start = ops[0]["offset"]
+        old_end = max(op["offset"] + (len(op["text"]) if op["op"] == "delete" else 0) for op in ops)
+        new_end = old_end + len(new_text) - len(old_text)
+        # Text before the first op is the same in both versions
+        while start > 0 and old_text[start - 1].isalnum():
+            start -= 1
+        while old_end < len(old_text) and old_text[old_end].isalnum():
+            old_end += 1
+        while new_end < len(new_text) and new_text[new_end].isalnum():
+            new_end += 1
+        return {"before": old_text[start:old_end][:limit], "after": new_text[start:new_end][:limit]}
+
+    @staticmethod
+    def _deleted_words(old_text, ops):
+        """
+        Spans of the old text deleted by ops, each widened to the words it cuts into.
+
+        Spans that touch or overlap once widened are merged, so a word rewritten
+        through several small deletes is recorded once.
+
+        Returns:
+            list: (start, end) offsets in the old text, in order
+        """
+        spans = []
+        for op in ops:
+            if op["op"] != "delete":
+                continue
+            start, end = op["offset"], op["offset"] + len(op["text"])
+            # Only widen across a cut inside a word, not past the word boundary
+            if op["text"][0].isalnum():
+                while start > 0 and old_text[start - 1].isalnum():
+                    start -= 1
+            if op["text"][-1].isalnum():
+                while end < len(old_text) and old_text[end].isalnum():
+                    end += 1
+            if spans and start <= spans[-1][1]:
+                spans[-1] = (spans[-1][0], max(spans[-1][1], end))
+            else:
+                spans.append((start, end))
+        return spans
     
     def _extract_edit_patterns(self, edits):
         """
@@ -1,25 +1,366 @@
 import os
+import time
+import random
+import asyncio
+from collections import deque
+from typing import Dict, Any, AsyncIterator
 from dotenv import load_dotenv
 import openai
 
+from .metrics import registry
+from .context_assembler import estimate_tokens
+
 # Load environment variables
 load_dotenv()
 
-try:
-    client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-except Exception as e:
-    print(f"Error initializing OpenAI client: {e}")
-    client = None
+DEFAULT_MODEL = "llama-3.3-70b-versatile"
+
+# Errors worth another attempt: the request may succeed if sent again
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+LLM_DURATION = registry.histogram(
+    "llm_request_duration_seconds", "LLM calls from request to last token, including retries",
+    ("model", "mode", "outcome")
+)
+LLM_TIME_TO_FIRST_TOKEN = registry.histogram(
+    "llm_time_to_first_token_seconds", "Time until a streamed LLM call produced its first fragment", ("model",)
+)
+LLM_TOKENS = registry.counter(
+    "llm_tokens_total", "Prompt and completion tokens (as reported, or estimated when streaming)", ("model", "kind")
+)
+LLM_RETRIES = registry.counter("llm_retries_total", "LLM attempts retried after a transient error", ("model",))
 
-def request_llm(user_prompt: str, model: str = "llama-3.3-70b-versatile", max_tokens: int = 100, temperature: float = 0.7, system_prompt: str=None):
+def _build_messages(user_prompt: str, system_prompt: str = None):
     messages = []
     if system_prompt:
         messages.append({"role": "system", "content": system_prompt})
     messages.append({"role": "user", "content": user_prompt})
-    response = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        max_tokens=max_tokens,
-        temperature=temperature
-    )
-    return response.choices[0].message.content.strip()
\ No newline at end of file
+    return messages
+
+class LatencyWindow:
+    """Latency samples of the most recent calls"""
+
+    def __init__(self, size=1000):
+        self.samples = deque(maxlen=size)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def summary(self) -> Dict[str, Any]:
+        """Count, mean and percentiles of the window in milliseconds"""
+        if not self.samples:
+            return {"count": 0, "mean_ms": None, "p50_ms": None, "p95_ms": None}
+        ordered = sorted(self.samples)
+        return {
+            "count": len(ordered),
+            "mean_ms": round(1000 * sum(ordered) / len(ordered), 1),
+            "p50_ms": round(1000 * ordered[len(ordered) // 2], 1),
+            "p95_ms": round(1000 * ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1)
+        }
+
+
+class AsyncLLMClient:
+    """Non-blocking LLM calls over a shared, pooled async client"""
+
+    def __init__(self, max_concurrency=8, timeout=15.0, max_retries=2, retry_backoff=0.25, max_backoff=2.0,
+                 base_url=None, api_key=None):
+        """
+        Initialize the client.
+
+        Every call shares one ``openai.AsyncOpenAI`` instance, so HTTP
+        connections are pooled and kept alive across requests. At most
+        ``max_concurrency`` calls are in flight at once; further calls wait
+        for a slot. Each call has a deadline covering the wait for a slot,
+        every attempt and the pauses between them. Connection errors, rate
+        limits and server errors are retried with full-jitter exponential
+        backoff while the deadline allows.
+
+        Args:
+            max_concurrency (int): Maximum number of concurrent upstream calls
+            timeout (float): Default deadline of a call in seconds
+            max_retries (int): Retries after the first attempt
+            retry_backoff (float): Base of the exponential backoff in seconds
+            max_backoff (float): Longest pause between attempts in seconds
+            base_url (str, optional): OpenAI-compatible endpoint, e.g. a local stand-in.
+                                      If None, uses the SDK default (or OPENAI_BASE_URL).
+            api_key (str, optional): API key. If None, uses OPENAI_API_KEY.
+        """
+        self._client = None
+        self._semaphore = None
+        self.configure(max_concurrency, timeout, max_retries, retry_backoff, max_backoff, base_url, api_key)
+
+        self.calls = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.time_to_first_token = LatencyWindow()
+
+    def configure(self, max_concurrency=8, timeout=15.0, max_retries=2, retry_backoff=0.25, max_backoff=2.0,
+                  base_url=None, api_key=None):
+        """Apply settings; the upstream client is (re)created on next use"""
+        self.base_url = base_url
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self._client = None
+        self._semaphore = None
+
+    def _get_client(self) -> openai.AsyncOpenAI:
+        if self._client is None:
+            # Retries are handled here, against the call's deadline
+            self._client = openai.AsyncOpenAI(
+                api_key=self.api_key or os.getenv("OPENAI_API_KEY"),
+                base_url=self.base_url,
+                max_retries=0
+            )
+        return self._client
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def complete(self, user_prompt: str, model: str = DEFAULT_MODEL, max_tokens: int = 100,
+                       temperature: float = 0.7, system_prompt: str = None, timeout: float = None) -> str:
+        """
+        Request a chat completion.
+
+        Args:
+            user_prompt (str): The user message
+            model (str): Model name
+            max_tokens (int): Maximum number of tokens to generate
+            temperature (float): Sampling temperature
+            system_prompt (str, optional): The system message
+            timeout (float, optional): Deadline of this call in seconds. If None, uses the default.
+
+        Returns:
+            str: The completion text
+
+        Raises:
+            asyncio.TimeoutError: If the deadline passed before a completion was received
+            openai.OpenAIError: If the last attempt failed
+        """
+        self.calls += 1
+        started = time.monotonic()
+        deadline = started + (timeout if timeout is not None else self.timeout)
+        messages = _build_messages(user_prompt, system_prompt)
+
+        outcome = "error"
+        try:
+            completion = await self._complete(messages, model, max_tokens, temperature, deadline)
+            outcome = "ok"
+            return completion
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            raise
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            LLM_DURATION.labels(model, "complete", outcome).observe(time.monotonic() - started)
+
+    async def _complete(self, messages, model, max_tokens, temperature, deadline) -> str:
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.timeouts += 1
+                raise asyncio.TimeoutError("LLM call deadline exceeded")
+
+            try:
+                return await asyncio.wait_for(
+                    self._attempt(messages, model, max_tokens, temperature, remaining), remaining
+                )
+            except (asyncio.TimeoutError, openai.APITimeoutError):
+                self.timeouts += 1
+                raise asyncio.TimeoutError("LLM call deadline exceeded")
+            except RETRYABLE_ERRORS:
+                if attempt >= self.max_retries:
+                    self.failures += 1
+                    raise
+            except Exception:
+                self.failures += 1
+                raise
+
+            attempt += 1
+            self.retries += 1
+            LLM_RETRIES.labels(model).inc()
+            # Full jitter spreads out retries from concurrent callers
+            pause = random.uniform(0, min(self.max_backoff, self.retry_backoff * 2 ** attempt))
+            await asyncio.sleep(min(pause, max(0.0, deadline - time.monotonic())))
+
+    async def _attempt(self, messages, model, max_tokens, temperature, remaining):
+        async with self._get_semaphore():
+            self.in_flight += 1
+            try:
+                response = await self._get_client().chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    timeout=remaining
+                )
+            finally:
+                self.in_flight -= 1
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            LLM_TOKENS.labels(model, "prompt").inc(usage.prompt_tokens or 0)
+            LLM_TOKENS.labels(model, "completion").inc(usage.completion_tokens or 0)
+        return response.choices[0].message.content.strip()
+
+    async def stream(self, user_prompt: str, model: str = DEFAULT_MODEL, max_tokens: int = 100,
+                     temperature: float = 0.7, system_prompt: str = None, timeout: float = None) -> AsyncIterator[str]:
+        """
+        Stream a chat completion as text fragments.
+
+        The deadline applies until the first fragment arrives, and failed
+        attempts are retried like ``complete`` up to that point; afterwards
+        the same duration bounds the wait between fragments. The concurrency
+        slot is held until the stream is exhausted or closed, and closing the
+        iterator early (``aclose``) closes the upstream response.
+
+        Args:
+            Same as complete
+
+        Yields:
+            str: Fragments of the completion text
+
+        Raises:
+            asyncio.TimeoutError: If the model stopped responding before the deadline
+            openai.OpenAIError: If the last attempt failed
+        """
+        self.calls += 1
+        timeout = timeout if timeout is not None else self.timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        messages = _build_messages(user_prompt, system_prompt)
+
+        outcome = "error"
+        fragments = 0
+        usage = None
+        try:
+            async with self._get_semaphore():
+                self.in_flight += 1
+                try:
+                    attempt = 0
+                    while True:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.timeouts += 1
+                            raise asyncio.TimeoutError("LLM call deadline exceeded")
+
+                        try:
+                            response, first = await asyncio.wait_for(
+                                self._open_stream(messages, model, max_tokens, temperature, remaining), remaining
+                            )
+                            break
+                        except (asyncio.TimeoutError, openai.APITimeoutError):
+                            self.timeouts += 1
+                            raise asyncio.TimeoutError("LLM call deadline exceeded")
+                        except RETRYABLE_ERRORS:
+                            if attempt >= self.max_retries:
+                                self.failures += 1
+                                raise
+                        except Exception:
+                            self.failures += 1
+                            raise
+
+                        attempt += 1
+                        self.retries += 1
+                        LLM_RETRIES.labels(model).inc()
+                        pause = random.uniform(0, min(self.max_backoff, self.retry_backoff * 2 ** attempt))
+                        await asyncio.sleep(min(pause, max(0.0, deadline - time.monotonic())))
+
+                    if response is None:
+                        # The model returned nothing
+                        outcome = "ok"
+                        return
+                    self.time_to_first_token.record(time.monotonic() - started)
+                    LLM_TIME_TO_FIRST_TOKEN.labels(model).observe(time.monotonic() - started)
+
+                    try:
+                        chunk = first
+                        while chunk is not None:
+                            usage = getattr(chunk, "usage", None) or usage
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                fragments += 1
+                                yield chunk.choices[0].delta.content
+                            try:
+                                chunk = await asyncio.wait_for(response.__anext__(), timeout)
+                            except StopAsyncIteration:
+                                chunk = None
+                            except asyncio.TimeoutError:
+                                self.timeouts += 1
+                                raise
+                    finally:
+                        await response.close()
+                finally:
+                    self.in_flight -= 1
+            outcome = "ok"
+        except GeneratorExit:
+            # The caller stopped reading, e.g. once the sentence was complete
+            outcome = "ok"
+            raise
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            raise
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            LLM_DURATION.labels(model, "stream", outcome).observe(time.monotonic() - started)
+            if usage is not None:
+                LLM_TOKENS.labels(model, "prompt").inc(usage.prompt_tokens or 0)
+                LLM_TOKENS.labels(model, "completion").inc(usage.completion_tokens or 0)
+            else:
+                # Streams rarely report usage; each fragment is about one token
+                LLM_TOKENS.labels(model, "prompt").inc(sum(estimate_tokens(m["content"]) for m in messages))
+                LLM_TOKENS.labels(model, "completion").inc(fragments)
+
+    async def _open_stream(self, messages, model, max_tokens, temperature, remaining):
+        """Start a streamed completion and wait for its first chunk, closing the response on failure"""
+        response = await self._get_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+            timeout=remaining
+        )
+        try:
+            first = await response.__anext__()
+        except StopAsyncIteration:
+            await response.close()
+            return None, None
+        except BaseException:
+            await response.close()
+            raise
+        return response, first
+
+    def stats(self) -> Dict[str, Any]:
+        """Get call counters"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "time_to_first_token": self.time_to_first_token.summary()
+        }
+
+
+# Shared instance, configured by the application at startup
+llm_client = AsyncLLMClient()
+
+registry.callback(
+    "llm_requests_in_flight", "LLM calls holding a concurrency slot", "gauge", lambda: llm_client.in_flight
+)
@@ -1,16 +1,40 @@
-import os
-import json
-from pathlib import Path
+import uuid
+import threading
+from collections import deque
+from bisect import bisect_left, bisect_right
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
+from .project_store import ProjectStore, get_default_store
+
+# Memory changes remembered for indexes catching up (older ones mean a full rebuild)
+JOURNAL_LIMIT = 4096
+
 class MemoryManager:
     """Simple class to manage story memories for a project"""
     
-    def __init__(self, project_name):
-        """Initialize the memory manager"""
+    def __init__(self, project_name, store: ProjectStore = None):
+        """
+        Initialize the memory manager.
+
+        Memories are indexed by id (a dict) and by position: ``chunks`` is
+        kept sorted by ``position`` next to a list of the positions, so
+        lookups around an offset bisect instead of scanning. A memory spans
+        ``position`` to ``end`` (its chunk); memories without an ``end`` are
+        points. Chunk memories do not overlap, which is what lets the
+        covering memory be found next to the insertion point.
+        """
         self.project_name = project_name
-        self.memory_path = os.path.join("data", "projects", project_name, "memories.json")
+        self.store = store or get_default_store()
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._starts: List[int] = []
+        # Bumped whenever a memory is added, removed or its text changes, so indexes
+        # built on the memories know when and what to catch up on
+        self.revision = 0
+        self._journal = deque()
+        self._journal_floor = 0
+        # Queries run on the event loop while refreshes move memories in the storage threads
+        self._lock = threading.RLock()
         
         # Initialize empty memories structure
         self.memories = {
@@ -27,35 +51,108 @@ class MemoryManager:
 
    
     def load_memories(self):
-        """Load memories from file or initialize new ones"""
-        memory_file = Path(self.memory_path)
+        """Load memories from the store or initialize new ones"""
+        try:
+            memories = self.store.load_memories(self.project_name)
+        except Exception as e:
+            print(f"Error loading memories: {e}")
+            return False
         
-        if memory_file.exists():
-            try:
-                with open(self.memory_path, 'r') as f:
-                    self.memories = json.load(f)
-                return True
-            except Exception as e:
-                print(f"Error loading memories: {e}")
-                return False
+        if memories is not None:
+            self.memories = memories
+            renamed = self._reindex()
+            with self._lock:
+                # Anything indexed before the load is rebuilt
+                self.revision += 1
+                self._journal_floor = self.revision
+            if renamed:
+                self.save_memories(changed=renamed)
         else:
-            # Create directories and save empty memories
-            memory_file.parent.mkdir(parents=True, exist_ok=True)
+            # Save empty memories
             self.save_memories()
-            return True
+        return True
+
+    def _reindex(self) -> List[str]:
+        """
+        Rebuild the id and position indexes after positions changed.
+
+        Returns:
+            list: Ids given to memories that shared an id with an earlier one
+                  (from the time ids were only the creation second)
+        """
+        with self._lock:
+            by_id, renamed = {}, []
+            for memory in self.memories["chunks"]:
+                if memory["id"] in by_id:
+                    memory["id"] = self._new_id()
+                    renamed.append(memory["id"])
+                by_id[memory["id"]] = memory
+            self.memories["chunks"].sort(key=lambda m: m.get("position", 0))
+            self._by_id = by_id
+            self._starts = [memory.get("position", 0) for memory in self.memories["chunks"]]
+        return renamed
+
+    @staticmethod
+    def _new_id() -> str:
+        return f"mem_{int(datetime.now().timestamp())}_{uuid.uuid4().hex[:8]}"
+
+    def _insert(self, memory: Dict[str, Any]):
+        position = memory.get("position", 0)
+        index = bisect_right(self._starts, position)
+        self._starts.insert(index, position)
+        self.memories["chunks"].insert(index, memory)
+        self._by_id[memory["id"]] = memory
+        self._record([memory["id"]])
 
-    def save_memories(self):
-        """Save memories to file"""
+    def _remove(self, memory: Dict[str, Any]):
+        chunks = self.memories["chunks"]
+        index = bisect_left(self._starts, memory.get("position", 0))
+        while chunks[index] is not memory:
+            index += 1
+        del chunks[index]
+        del self._starts[index]
+        del self._by_id[memory["id"]]
+        self._record([memory["id"]])
+
+    def _record(self, memory_ids: List[str]):
+        with self._lock:
+            for memory_id in memory_ids:
+                self.revision += 1
+                self._journal.append((self.revision, memory_id))
+            while len(self._journal) > JOURNAL_LIMIT:
+                self._journal_floor = self._journal.popleft()[0]
+
+    def changes_since(self, revision: int) -> Optional[List[str]]:
+        """
+        Ids of the memories added, removed or edited after a revision.
+
+        Returns:
+            list: The ids (possibly repeated), or None if the revision is too old to tell
+        """
+        with self._lock:
+            if revision < self._journal_floor:
+                return None
+            changed = []
+            for entry_revision, memory_id in reversed(self._journal):
+                if entry_revision <= revision:
+                    break
+                changed.append(memory_id)
+            return changed
+
+    def save_memories(self, changed=None, deleted=None):
+        """
+        Save memories to the store.
+        
+        Args:
+            changed (list, optional): Ids of the chunks that changed
+            deleted (list, optional): Ids of the chunks that were deleted
+        """
         try:
             # Update timestamp
             self.memories["metadata"]["last_updated"] = datetime.now().isoformat()
             
-            # Create parent directories if they don't exist
-            Path(self.memory_path).parent.mkdir(parents=True, exist_ok=True)
-            
             # Write memories
-            with open(self.memory_path, 'w') as f:
-                json.dump(self.memories, f, indent=2)
+            self.store.save_memories(self.project_name, self.memories, changed=changed, deleted=deleted)
             return True
         except Exception as e:
             print(f"Error saving memories: {e}")
@@ -72,43 +169,173 @@ class MemoryManager:
         Returns:
             dict: The created memory
         """
-        timestamp = int(datetime.now().timestamp())
         memory = {
-            "id": f"mem_{timestamp}",
+            "id": self._new_id(),
             "text": memory_text,
             "position": text_position,
-            "created_at": timestamp,
+            "created_at": int(datetime.now().timestamp()),
             "user_edited": False
         }
         
         # Add to memories and save
-        self.memories["chunks"].append(memory)
-        self.save_memories()
+        with self._lock:
+            self._insert(memory)
+        self.save_memories(changed=[memory["id"]])
         
         return memory
     
+    def get_summarized_chunks(self) -> set:
+        """Ids of the content-defined chunks already summarized (with or without a memory)"""
+        return set(self.memories["metadata"].get("chunk_ids", []))
+
+    def sync_chunk_memories(self, chunks: List[Dict[str, Any]], summaries: Dict[str, Optional[str]],
+                            prune: bool = True):
+        """
+        Store the summaries of text chunks, move chunk memories to where their chunk now is, and save once.
+
+        Chunks are identified by a hash of their text, so a memory belongs to
+        a chunk for as long as the chunk's text is unchanged, wherever the
+        chunk moved to; moving it only updates its position. Memories the user
+        edited are kept as they are.
+
+        Args:
+            chunks (list): The current chunks of the text (``id``, ``start``, ``end``)
+            summaries (dict): Memory text of newly summarized chunks by chunk id
+                              (None when the chunk did not warrant a memory)
+            prune (bool): Drop the memories of chunks no longer in the text. Left
+                          False while some chunks still wait for their summary, so
+                          the old memories cover their part of the text until then.
+
+        Returns:
+            list: The memories created
+        """
+        metadata = self.memories["metadata"]
+        summarized = set(metadata.get("chunk_ids", [])) | set(summaries)
+        timestamp = int(datetime.now().timestamp())
+        changed, deleted, stored = [], [], []
+
+        with self._lock:
+            by_chunk = {memory["chunk_id"]: memory for memory in self.memories["chunks"] if "chunk_id" in memory}
+            for chunk in chunks:
+                existing = by_chunk.get(chunk["id"])
+                if chunk["id"] in summaries and summaries[chunk["id"]] is not None and existing is None:
+                    existing = {
+                        "id": f"mem_{chunk['id']}",
+                        "chunk_id": chunk["id"],
+                        "text": summaries[chunk["id"]],
+                        "created_at": timestamp,
+                        "user_edited": False
+                    }
+                    self.memories["chunks"].append(existing)
+                    by_chunk[chunk["id"]] = existing
+                    stored.append(existing)
+                if existing is not None and (existing.get("position"), existing.get("end")) != (chunk["start"], chunk["end"]):
+                    existing["position"] = chunk["start"]
+                    existing["end"] = chunk["end"]
+                    changed.append(existing["id"])
+
+            if prune:
+                current = {chunk["id"] for chunk in chunks}
+                summarized &= current
+                # Also drops memories of the earlier fixed-size chunks ("chunk" index)
+                kept = []
+                for memory in self.memories["chunks"]:
+                    if (("chunk_id" in memory or "chunk" in memory) and memory.get("chunk_id") not in current
+                            and not memory.get("user_edited")):
+                        deleted.append(memory["id"])
+                    else:
+                        kept.append(memory)
+                self.memories["chunks"] = kept
+                metadata.pop("chunk_hashes", None)
+
+            if changed or deleted:
+                # Positions moved: re-sort once rather than once per memory
+                self._reindex()
+                self._record([memory["id"] for memory in stored] + deleted)
+
+        if changed or deleted or summarized != set(metadata.get("chunk_ids", [])):
+            metadata["chunk_ids"] = sorted(summarized)
+            self.save_memories(changed=changed, deleted=deleted)
+        return stored
+
     def get_all_memories(self):
-        """Get all memories"""
+        """Get all memories, in text order"""
         return self.memories["chunks"]
-    
+
+    def get_memory(self, memory_id: str) -> Optional[Dict[str, Any]]:
+        return self._by_id.get(memory_id)
+
+    def memories_in_range(self, start: int, end: int) -> List[Dict[str, Any]]:
+        """
+        Memories overlapping the text range [start, end), in text order.
+
+        Args:
+            start (int): First character offset of the range
+            end (int): Offset just past the range
+
+        Returns:
+            list: Memories whose span overlaps the range (point memories inside it)
+        """
+        with self._lock:
+            chunks = self.memories["chunks"]
+            first = bisect_left(self._starts, start)
+            # The memory starting before the range may still reach into it
+            if first > 0 and self._end(chunks[first - 1]) > start:
+                first -= 1
+            last = bisect_left(self._starts, end)
+            return chunks[first:last]
+
+    def memories_near(self, position: int, limit: int = 3) -> List[Dict[str, Any]]:
+        """
+        The memory covering an offset and the ones nearest to it, closest first.
+
+        Args:
+            position (int): Character offset, e.g. the cursor
+            limit (int): Maximum number of memories returned
+
+        Returns:
+            list: Up to ``limit`` memories, by distance of their span to the offset
+        """
+        with self._lock:
+            chunks = self.memories["chunks"]
+            after = bisect_right(self._starts, position)
+            before = after - 1
+            nearest = []
+            # Walk outwards from the offset, taking the closer side each time
+            while len(nearest) < limit and (before >= 0 or after < len(chunks)):
+                before_distance = max(0, position - self._end(chunks[before]) + 1) if before >= 0 else None
+                after_distance = self._starts[after] - position if after < len(chunks) else None
+                if after_distance is None or (before_distance is not None and before_distance <= after_distance):
+                    nearest.append(chunks[before])
+                    before -= 1
+                else:
+                    nearest.append(chunks[after])
+                    after += 1
+            return nearest
+
+    @staticmethod
+    def _end(memory: Dict[str, Any]) -> int:
+        position = memory.get("position", 0)
+        return max(memory.get("end", position), position + 1)
+
     def edit_memory(self, memory_id: str, new_text: str):
         """Edit an existing memory"""
-        for i, memory in enumerate(self.memories["chunks"]):
-            if memory["id"] == memory_id:
-                self.memories["chunks"][i]["text"] = new_text
-                self.memories["chunks"][i]["user_edited"] = True
-                self.save_memories()
-                return self.memories["chunks"][i]
-        
-        return None
+        with self._lock:
+            memory = self._by_id.get(memory_id)
+            if memory is None:
+                return None
+            memory["text"] = new_text
+            memory["user_edited"] = True
+            self._record([memory_id])
+        self.save_memories(changed=[memory_id])
+        return memory
     
     def delete_memory(self, memory_id: str):
         """Delete a memory"""
-        for i, memory in enumerate(self.memories["chunks"]):
-            if memory["id"] == memory_id:
-                del self.memories["chunks"][i]
-                self.save_memories()
-                return True
-        
-        return False
-    
\ No newline at end of file
+        with self._lock:
+            memory = self._by_id.get(memory_id)
+            if memory is None:
+                return False
+            self._remove(memory)
+        self.save_memories(deleted=[memory_id])
+        return True
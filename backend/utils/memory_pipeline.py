@@ -0,0 +1,332 @@
+import time
+import asyncio
+from collections import deque
+from contextlib import nullcontext
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable, ContextManager
+
+from .chunking import content_defined_chunks
+from .llm import LatencyWindow
+from .metrics import registry
+from .storage import storage
+from .summary_tree import TOPICS, build_levels
+
+MEMORY_LLM_CALLS = registry.counter("memory_pipeline_llm_calls_total", "Chunks sent to the LLM for a memory")
+MEMORY_FRESHNESS_LAG = registry.histogram(
+    "memory_freshness_lag_seconds", "Time from an edit to the memories of the chunks it touched being refreshed",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+)
+SUMMARY_LLM_CALLS = registry.counter(
+    "summary_tree_llm_calls_total", "Section summaries requested from the LLM", ("topic",)
+)
+
+
+class MemoryPipeline:
+    """Keeps each project's chunk memories up to date in the background"""
+
+    def __init__(self, get_project: Callable[[str], Awaitable[Any]],
+                 summarize: Callable[[str, str], Awaitable[Optional[str]]],
+                 chunk_size=1000, interval=300.0, max_concurrency=2, batch_size=20,
+                 summarize_topic: Optional[Callable[[str, str, List[str]], Awaitable[str]]] = None,
+                 fanout=8, summary_every_chars=5000, leases: Optional[Callable[[], ContextManager]] = None):
+        """
+        Initialize the pipeline.
+
+        The manuscript is split into content-defined chunks of about
+        ``chunk_size`` characters (see utils/chunking.py), each identified by
+        a hash of its text and with at most one memory. Every committed save
+        marks its project as changed; every ``interval`` seconds the chunks of
+        changed projects that have not been summarized yet, which are only the
+        chunks an edit touched, are summarized and stored through the
+        project's MemoryManager, and the memories of moved chunks get their
+        new positions without a call. Since summarized chunk ids are stored
+        with the memories, edits made before a restart are found the same way.
+
+        Once ``summary_every_chars`` characters have been summarized into new
+        memories, the project's summary tree (see utils/summary_tree.py) is
+        refreshed: only sections without a summary, which are the ones on the
+        paths from the new memories to the root, are summarized per topic,
+        and frozen topics are skipped.
+
+        Args:
+            get_project (callable): Async function returning a project's ProjectState
+            summarize (callable): Async function (project name, chunk text) returning a memory,
+                                  or None if the chunk holds nothing worth remembering
+            chunk_size (int): Typical characters per chunk
+            interval (float): Seconds between scheduled refreshes
+            max_concurrency (int): Maximum number of chunks summarized at once
+            batch_size (int): Maximum number of chunks per project per scheduled refresh
+            summarize_topic (callable, optional): Async function (project name, topic, texts) returning
+                                                  their summary for the topic. If None, no summary tree is kept.
+            fanout (int): Typical number of children per section of the summary tree
+            summary_every_chars (int): Characters of newly summarized chunks between summary tree refreshes
+            leases (callable, optional): Returns a context manager within which the projects fetched
+                                         with get_project stay loaded (e.g. ProjectCache.leases)
+
+        Raises:
+            ValueError: If fanout is below 2
+        """
+        if fanout < 2:
+            raise ValueError(f"Summary tree fanout must be at least 2, got {fanout}")
+
+        self.get_project = get_project
+        self.summarize = summarize
+        self.chunk_size = chunk_size
+        self.interval = interval
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self.summarize_topic = summarize_topic
+        self.fanout = fanout
+        self.summary_every_chars = summary_every_chars
+        self.leases = leases or nullcontext
+
+        # project -> monotonic time of its first change not refreshed yet
+        self._changed: Dict[str, float] = {}
+        self._generation: Dict[str, int] = {}
+        # project -> (document version, chunks), so a refresh and the pending count chunk the text once
+        self._chunks: Dict[str, Tuple[int, List[Dict[str, Any]]]] = {}
+        self._pending: Dict[str, int] = {}
+        # project -> characters summarized into memories since its summary tree was refreshed
+        self._summary_chars: Dict[str, int] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._semaphore = None
+        self._task = None
+
+        self._calls = deque()
+        self.refreshed = 0
+        self.failed = 0
+        self.summary_calls = 0
+        self.freshness_lag = LatencyWindow()
+
+    def mark_changed(self, project_name: str, old_text: str, new_text: str):
+        """Note that a project's text changed (which chunks changed is worked out at the refresh)"""
+        if old_text == new_text:
+            return
+        self._changed.setdefault(project_name, time.monotonic())
+        self._generation[project_name] = self._generation.get(project_name, 0) + 1
+
+    def start(self):
+        """Start the scheduler (from within the running event loop)"""
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"Error refreshing memories: {e}")
+
+    async def run_once(self):
+        """Summarize a batch of new chunks of every changed project"""
+        projects = set(self._changed) | {name for name, pending in self._pending.items() if pending}
+        await asyncio.gather(*(self.refresh(name, limit=self.batch_size) for name in projects))
+
+    async def refresh(self, project_name: str, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Summarize a project's new chunks now.
+
+        Args:
+            project_name (str): Name of the project
+            limit (int, optional): Maximum number of chunks to summarize. If None, all new chunks are.
+
+        Returns:
+            dict: Number of chunks refreshed and failed, and of chunks still waiting
+        """
+        # The scheduler and the refresh endpoint must not summarize the same chunks twice
+        lock = self._locks.setdefault(project_name, asyncio.Lock())
+        async with lock:
+            with self.leases():
+                return await self._refresh(project_name, limit)
+
+    async def _snapshot(self, project_name: str):
+        """The project's state, text, chunks, MemoryManager and summarized chunk ids"""
+        state = await self.get_project(project_name)
+        # Only the document is copied under the project lock; loading and chunking happen after
+        async with state.lock:
+            text = state.document.text
+            version = state.document.version
+        memories = await storage.run(lambda: state.memories)
+        summarized = memories.get_summarized_chunks()
+        cached = self._chunks.get(project_name)
+        if cached is not None and cached[0] == version:
+            chunks = cached[1]
+        else:
+            chunks = await storage.run(content_defined_chunks, text, self.chunk_size)
+            self._chunks[project_name] = (version, chunks)
+        return state, text, chunks, memories, summarized
+
+    async def _refresh(self, project_name: str, limit: Optional[int]) -> Dict[str, Any]:
+        generation = self._generation.get(project_name, 0)
+        state, text, chunks, memories, summarized = await self._snapshot(project_name)
+
+        todo = [chunk for chunk in chunks if chunk["id"] not in summarized]
+        work = todo if limit is None else todo[:limit]
+        results = await asyncio.gather(
+            *(self._summarize(project_name, text[chunk["start"]:chunk["end"]]) for chunk in work),
+            return_exceptions=True
+        )
+
+        summaries = {}
+        failed = 0
+        for chunk, result in zip(work, results):
+            if isinstance(result, BaseException):
+                failed += 1
+                continue
+            summaries[chunk["id"]] = result
+        pending = len(todo) - len(summaries)
+
+        # Moves every memory to its chunk's position; stale memories go once nothing is pending.
+        # Refreshes of a project are serialized by its pipeline lock, so the project lock is not needed.
+        await storage.run(memories.sync_chunk_memories, chunks, summaries, pending == 0)
+
+        now = time.monotonic()
+        since = self._changed.get(project_name, now)
+        for _ in summaries:
+            self.freshness_lag.record(now - since)
+            MEMORY_FRESHNESS_LAG.observe(now - since)
+        if pending == 0 and self._generation.get(project_name, 0) == generation:
+            # Not edited again while being summarized
+            self._changed.pop(project_name, None)
+        self._pending[project_name] = pending
+
+        self.refreshed += len(summaries)
+        self.failed += failed
+        result = {"refreshed": len(summaries), "failed": failed, "pending": pending}
+
+        self._summary_chars[project_name] = self._summary_chars.get(project_name, 0) + sum(
+            chunk["end"] - chunk["start"] for chunk in work if chunk["id"] in summaries
+        )
+        if (self.summarize_topic is not None and pending == 0
+                and self._summary_chars[project_name] >= self.summary_every_chars):
+            result["summaries"] = await self._refresh_summaries(project_name)
+        return result
+
+    async def refresh_summaries(self, project_name: str) -> Dict[str, Any]:
+        """
+        Bring a project's summary tree up to date with its memories now.
+
+        Returns:
+            dict: Number of section summaries made and failed, and the depth of the tree
+        """
+        lock = self._locks.setdefault(project_name, asyncio.Lock())
+        async with lock:
+            with self.leases():
+                return await self._refresh_summaries(project_name)
+
+    async def _refresh_summaries(self, project_name: str) -> Dict[str, Any]:
+        state = await self.get_project(project_name)
+        memories = await storage.run(lambda: state.memories)
+        tree = await storage.run(lambda: state.summaries)
+        # Memories only change in refreshes, which this project's pipeline lock keeps out
+        snapshot = [dict(memory) for memory in memories.get_all_memories()]
+        levels = await storage.run(build_levels, snapshot, self.fanout)
+        topics = [topic for topic in TOPICS if not tree.is_frozen(topic)]
+
+        # Bottom-up, since a section is summarized from its children's summaries
+        new: Dict[str, Dict[str, str]] = {}
+        made = failed = 0
+        for index in range(1, len(levels)):
+            children = {node["id"]: node for node in levels[index - 1]}
+            jobs = []
+            for node in levels[index]:
+                for topic in topics:
+                    if tree.summary(node["id"], topic) is not None:
+                        continue
+                    texts = [self._node_text(children[child], topic, tree, new) for child in node["children"]]
+                    if any(text is None for text in texts):
+                        # A child failed; this branch waits for the next refresh
+                        continue
+                    if len(texts) == 1 and "text" not in children[node["children"][0]]:
+                        # A section of one section says the same
+                        new.setdefault(node["id"], {})[topic] = texts[0]
+                        continue
+                    jobs.append((node["id"], topic, texts))
+
+            results = await asyncio.gather(
+                *(self._summarize_topic(project_name, topic, texts) for _, topic, texts in jobs),
+                return_exceptions=True
+            )
+            for (node_id, topic, _), result in zip(jobs, results):
+                if isinstance(result, BaseException):
+                    failed += 1
+                    continue
+                new.setdefault(node_id, {})[topic] = result
+                made += 1
+
+        async with state.lock:
+            await storage.run(tree.apply, levels, new)
+        if failed == 0:
+            self._summary_chars[project_name] = 0
+        return {"summarized": made, "failed": failed, "depth": len(levels)}
+
+    @staticmethod
+    def _node_text(node: Dict[str, Any], topic: str, tree, new: Dict[str, Dict[str, str]]) -> Optional[str]:
+        """A leaf's memory, or a section's summary for the topic"""
+        if "text" in node:
+            return node["text"]
+        return new.get(node["id"], {}).get(topic) or tree.summary(node["id"], topic)
+
+    async def _summarize_topic(self, project_name: str, topic: str, texts: List[str]) -> str:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            self._calls.append(time.monotonic())
+            self.summary_calls += 1
+            SUMMARY_LLM_CALLS.labels(topic).inc()
+            try:
+                return await self.summarize_topic(project_name, topic, texts)
+            except Exception as e:
+                print(f"Error summarizing {topic} of '{project_name}': {e}")
+                raise
+
+    async def _summarize(self, project_name: str, source: str) -> Optional[str]:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            self._calls.append(time.monotonic())
+            MEMORY_LLM_CALLS.inc()
+            try:
+                return await self.summarize(project_name, source)
+            except Exception as e:
+                print(f"Error summarizing chunk of '{project_name}': {e}")
+                raise
+
+    async def pending(self, project_name: str) -> int:
+        """Number of the project's chunks waiting for their summary"""
+        _, _, chunks, _, summarized = await self._snapshot(project_name)
+        return sum(1 for chunk in chunks if chunk["id"] not in summarized)
+
+    def oldest_dirty_seconds(self) -> float:
+        """Age of the oldest change not summarized yet, of any project (the current freshness lag)"""
+        oldest = min(self._changed.values(), default=None)
+        return time.monotonic() - oldest if oldest is not None else 0.0
+
+    def calls_last_hour(self) -> int:
+        cutoff = time.monotonic() - 3600
+        while self._calls and self._calls[0] < cutoff:
+            self._calls.popleft()
+        return len(self._calls)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get dirty chunk counts, freshness lag and LLM usage"""
+        return {
+            "interval_seconds": self.interval,
+            "changed_projects": len(self._changed),
+            "dirty_chunks": sum(self._pending.values()),
+            "oldest_dirty_seconds": round(self.oldest_dirty_seconds(), 1),
+            "llm_calls_last_hour": self.calls_last_hour(),
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+            "summary_calls": self.summary_calls,
+            "freshness_lag": self.freshness_lag.summary()
+        }
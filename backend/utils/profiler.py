@@ -0,0 +1,241 @@
+import os
+import sys
+import hmac
+import time
+import itertools
+import threading
+from collections import deque, Counter, OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+# Leaf frames of threads waiting for work; samples ending in them are idle time
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+class StackSampler:
+    """Samples the stacks of every thread into a ring buffer of recent samples"""
+
+    def __init__(self, interval=0.01, window=60.0):
+        """
+        Initialize the sampler.
+
+        One daemon thread wakes up every ``interval`` seconds and records the
+        Python stack of each busy thread (the event loop and the storage
+        threads alike), so the work a request hands to the thread pool is
+        sampled too. Only the last ``window`` seconds of samples are kept;
+        profiles are cut out of that history after the fact, which is what
+        lets slow requests be captured without knowing in advance.
+
+        Args:
+            interval (float): Seconds between samples
+            window (float): Seconds of samples kept
+        """
+        self.interval = interval
+        self.samples = deque(maxlen=max(1, int(window / interval)))
+        self._labels: Dict[Any, str] = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            now = time.monotonic()
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = self._stack(frame)
+                if stack is not None:
+                    stacks.append((names.get(thread_id, str(thread_id)),) + stack)
+            if stacks:
+                self.samples.append((now, stacks))
+
+    def _stack(self, frame) -> Optional[Tuple[str, ...]]:
+        """Root-first frame labels, or None if the thread is idle"""
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+            return None
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                self._labels[code] = label
+            labels.append(label)
+            frame = frame.f_back
+        labels.reverse()
+        return tuple(labels)
+
+    def collapsed(self, start: float, end: float) -> Tuple[str, int]:
+        """
+        Stacks sampled between two monotonic times, in the collapsed format.
+
+        Returns:
+            tuple: (one "frame;frame;frame count" line per distinct stack, number of samples)
+        """
+        counts = Counter()
+        taken = 0
+        for timestamp, stacks in list(self.samples):
+            if start <= timestamp <= end:
+                taken += 1
+                counts.update(";".join(stack) for stack in stacks)
+        lines = [f"{stack} {count}" for stack, count in counts.most_common()]
+        return "\n".join(lines) + ("\n" if lines else ""), taken
+
+
+# Clients allowed to read profiles when no token is configured
+LOCAL_HOSTS = ("127.0.0.1", "::1", "localhost")
+
+
+class RequestProfiler:
+    """Keeps sampled stack profiles of requested and slow HTTP requests"""
+
+    def __init__(self, enabled=False, allow_requests=True, token=None, slow_request_ms=None,
+                 interval_ms=10, window_seconds=60, max_profiles=20):
+        """
+        Initialize the profiler.
+
+        Args:
+            enabled (bool): Whether profiling is available at all (nothing is sampled when False)
+            allow_requests (bool): Whether clients may ask for a profile with the ``X-Profile``
+                                   header or the ``profile`` query parameter
+            token (str, optional): If set, the header or parameter value must equal it
+            slow_request_ms (float, optional): Requests at least this slow are profiled
+                                               automatically. If None, only requested ones are.
+            interval_ms (float): Milliseconds between stack samples
+            window_seconds (float): Longest request that can be profiled completely
+            max_profiles (int): Number of most recent profiles kept
+        """
+        self.enabled = enabled
+        self.allow_requests = allow_requests
+        self.token = token
+        self.slow_request = slow_request_ms / 1000 if slow_request_ms is not None else None
+        self.max_profiles = max_profiles
+        self.sampler = StackSampler(interval_ms / 1000, window_seconds)
+        self.profiles: OrderedDict = OrderedDict()
+        self._ids = itertools.count(1)
+
+    def is_requested(self, scope) -> bool:
+        """Whether the client asked for a profile of this request (and is allowed to)"""
+        if not self.allow_requests:
+            return False
+        value = None
+        for name, header in scope.get("headers", ()):
+            if name == b"x-profile":
+                value = header.decode("latin-1")
+                break
+        if value is None:
+            values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("profile")
+            value = values[0] if values else None
+        if value is None:
+            return False
+        if self.token is not None:
+            return hmac.compare_digest(value, self.token)
+        return value.lower() not in ("", "0", "false", "no")
+
+    def can_read(self, token: Optional[str], client_host: Optional[str]) -> bool:
+        """
+        Whether a client may list and download the kept profiles.
+
+        With a token configured the client must present it; without one,
+        only clients on this machine may read profiles.
+
+        Args:
+            token (str, optional): Token the client sent
+            client_host (str, optional): Address of the client
+        """
+        if not self.enabled:
+            return False
+        if self.token is not None:
+            return token is not None and hmac.compare_digest(token, self.token)
+        return client_host in LOCAL_HOSTS
+
+    def next_id(self) -> str:
+        return f"prof-{next(self._ids)}"
+
+    def record(self, profile_id: str, start: float, end: float, info: Dict[str, Any]) -> Dict[str, Any]:
+        """Cut a request's samples out of the sampler history and keep them"""
+        collapsed, samples = self.sampler.collapsed(start, end)
+        profile = dict(info, id=profile_id, samples=samples, interval_ms=self.sampler.interval * 1000,
+                       collapsed=collapsed)
+        self.profiles[profile_id] = profile
+        while len(self.profiles) > self.max_profiles:
+            self.profiles.popitem(last=False)
+        return profile
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """Kept profiles without their stacks, newest first"""
+        return [
+            {key: value for key, value in profile.items() if key != "collapsed"}
+            for profile in reversed(self.profiles.values())
+        ]
+
+    def get_profile(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        return self.profiles.get(profile_id)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests that ask for it or turn out slow"""
+
+    def __init__(self, app, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        profiler = self.profiler
+        if scope["type"] != "http" or not profiler.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        profiler.sampler.start()
+        requested = profiler.is_requested(scope)
+        profile_id = profiler.next_id() if requested else None
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profile_id is not None:
+                    # The profile is complete once the response is
+                    message = dict(message, headers=list(message.get("headers", [])) + [
+                        (b"x-profile-id", profile_id.encode("latin-1"))
+                    ])
+            await send(message)
+
+        wall_started = time.time()
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            ended = time.monotonic()
+            duration = ended - started
+            slow = profiler.slow_request is not None and duration >= profiler.slow_request
+            if requested or slow:
+                profiler.record(profile_id or profiler.next_id(), started, ended, {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status,
+                    "trigger": "requested" if requested else "slow",
+                    "started": wall_started,
+                    "duration_ms": round(1000 * duration, 1)
+                })
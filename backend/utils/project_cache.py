@@ -0,0 +1,287 @@
+import sys
+import asyncio
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional
+
+from .document import Document
+from .edit_history import EditHistory
+from .memory_manager import MemoryManager
+from .project_store import get_default_store
+from .retrieval import MemoryRetriever
+from .summary_tree import SummaryTree
+from .version_store import VersionStore
+
+# Rough per-object overhead added to the measured text sizes
+ENTRY_OVERHEAD_BYTES = 4096
+MEMORY_CHUNK_OVERHEAD_BYTES = 256
+
+# States pinned within the current ProjectCache.leases() scope
+_leased: ContextVar[Optional[List["ProjectState"]]] = ContextVar("leased_projects", default=None)
+
+
+class ProjectState:
+    """Parsed state of a single project, kept in memory between requests"""
+
+    def __init__(self, project_name):
+        """
+        Load the project's document. History, versions, memories, summaries and the retrieval index are opened on first use.
+
+        Args:
+            project_name (str): Name of the project
+        """
+        self.project_name = project_name
+        self.document = Document(project_name)
+        self._history = None
+        self._memories = None
+        self._summaries = None
+        self._retriever = None
+        self._versions = None
+        # Guards the lazy loads above, which the storage threads may reach concurrently
+        # (reentrant: the retriever loads the memories)
+        self._load_lock = threading.RLock()
+        # Serializes mutations of this project across concurrent requests
+        self.lock = asyncio.Lock()
+        # Set while in-memory changes are waiting for a coalesced commit
+        self.dirty = False
+        # Number of requests (or background jobs) holding this state; a leased state is never evicted
+        self.leases = 0
+
+    @property
+    def history(self) -> EditHistory:
+        if self._history is None:
+            with self._load_lock:
+                if self._history is None:
+                    self._history = EditHistory(self.project_name)
+        return self._history
+
+    @property
+    def memories(self) -> MemoryManager:
+        if self._memories is None:
+            with self._load_lock:
+                if self._memories is None:
+                    self._memories = MemoryManager(self.project_name)
+        return self._memories
+
+    @property
+    def summaries(self) -> SummaryTree:
+        if self._summaries is None:
+            with self._load_lock:
+                if self._summaries is None:
+                    self._summaries = SummaryTree(self.project_name)
+        return self._summaries
+
+    @property
+    def retriever(self) -> MemoryRetriever:
+        if self._retriever is None:
+            with self._load_lock:
+                if self._retriever is None:
+                    self._retriever = MemoryRetriever(self.memories, get_default_store().load_story_elements(self.project_name))
+        return self._retriever
+
+    @property
+    def versions(self) -> VersionStore:
+        if self._versions is None:
+            with self._load_lock:
+                if self._versions is None:
+                    self._versions = VersionStore(self.project_name)
+        return self._versions
+
+    def size_bytes(self) -> int:
+        """Estimate the memory held by this project"""
+        size = ENTRY_OVERHEAD_BYTES + sys.getsizeof(self.document.text)
+        if self._versions is not None:
+            size += self._versions.size_bytes()
+        if self._memories is not None:
+            for chunk in self._memories.get_all_memories():
+                size += MEMORY_CHUNK_OVERHEAD_BYTES + sys.getsizeof(chunk.get("text", ""))
+        if self._summaries is not None:
+            size += self._summaries.size_bytes()
+        if self._retriever is not None:
+            size += self._retriever.index.size_bytes()
+        return size
+
+
+class ProjectCache:
+    """LRU cache of project state, bounded by the total estimated size in bytes"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        """
+        Initialize the cache.
+
+        Cached state is the source of truth between commits: saves are applied
+        in memory and persisted in coalesced groups, so projects that are
+        dirty (or locked mid-mutation) are never evicted. Neither are projects
+        leased by a request still using them (see ``leases``), so a request
+        never mutates a state the cache already replaced. The cache may be
+        used from the storage threads; bookkeeping is guarded by a lock and
+        projects are loaded outside it.
+
+        Args:
+            max_bytes (int): Budget for the total estimated size of cached projects
+        """
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.RLock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, project_name: str, held: Optional[List[ProjectState]] = None) -> ProjectState:
+        """
+        Get a project's state, loading it on a miss.
+
+        Args:
+            project_name (str): Name of the project
+            held (list, optional): Lease the state into this list (from ``held()``)
+
+        Returns:
+            ProjectState: The cached project state
+        """
+        cached = self.peek(project_name, held)
+        if cached is not None:
+            return cached
+
+        state = ProjectState(project_name)
+        with self._lock:
+            # Another thread may have loaded the project in the meantime
+            existing = self._entries.get(project_name)
+            if existing is not None:
+                self.hits += 1
+                self._entries.move_to_end(project_name)
+                self._pin(existing, held)
+                return existing
+
+            self.misses += 1
+            self._entries[project_name] = state
+            self._sizes[project_name] = 0
+            self._pin(state, held)
+            self.update_size(project_name)
+        return state
+
+    def peek(self, project_name: str, held: Optional[List[ProjectState]] = None):
+        """
+        Get a project's state only if it is already cached (counts as a hit).
+
+        Args:
+            project_name (str): Name of the project
+            held (list, optional): Lease the state into this list (from ``held()``)
+
+        Returns:
+            ProjectState: The cached project state, or None
+        """
+        with self._lock:
+            state = self._entries.get(project_name)
+            if state is not None:
+                self.hits += 1
+                self._entries.move_to_end(project_name)
+                self._pin(state, held)
+            return state
+
+    @contextmanager
+    def leases(self):
+        """
+        Scope within which the states fetched with ``held()`` stay cached.
+
+        Every lease taken inside the scope is given back when it exits, so a
+        request (or a background refresh) holds its projects for as long as
+        it runs.
+        """
+        token = _leased.set([])
+        try:
+            yield
+        finally:
+            held = _leased.get()
+            _leased.reset(token)
+            with self._lock:
+                for state in held:
+                    state.leases -= 1
+                self._evict()
+
+    @staticmethod
+    def held() -> Optional[List[ProjectState]]:
+        """Leases of the current leases() scope, to pass to get() or peek(); None outside a scope"""
+        return _leased.get()
+
+    @staticmethod
+    def _pin(state: ProjectState, held: Optional[List[ProjectState]]):
+        if held is not None:
+            state.leases += 1
+            held.append(state)
+
+    def update_size(self, project_name: str):
+        """
+        Re-measure a project after it changed and evict cold projects if over budget.
+
+        Args:
+            project_name (str): Name of the project
+        """
+        with self._lock:
+            state = self._entries.get(project_name)
+            if state is None:
+                return
+
+            size = state.size_bytes()
+            self.current_bytes += size - self._sizes[project_name]
+            self._sizes[project_name] = size
+            self._evict(keep=project_name)
+
+    def invalidate(self, project_name: str):
+        """
+        Drop a project from the cache.
+
+        Args:
+            project_name (str): Name of the project
+        """
+        with self._lock:
+            if project_name in self._entries:
+                del self._entries[project_name]
+                self.current_bytes -= self._sizes.pop(project_name)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and occupancy"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+
+    def _evict(self, keep=None):
+        """Evict least recently used projects until the cache fits its budget"""
+        while self.current_bytes > self.max_bytes:
+            # The project being used, projects leased or mid-mutation and projects with
+            # uncommitted changes are never evicted, even if that leaves the cache over budget
+            victim = next(
+                (name for name, state in self._entries.items()
+                 if name != keep and not state.leases and not state.dirty and not state.lock.locked()),
+                None
+            )
+            if victim is None:
+                return
+            self.invalidate(victim)
+            self.evictions += 1
+
+
+class ProjectLeaseMiddleware:
+    """ASGI middleware keeping the projects a request fetched cached until its response is sent"""
+
+    def __init__(self, app, cache: ProjectCache):
+        self.app = app
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with self.cache.leases():
+            await self.app(scope, receive, send)
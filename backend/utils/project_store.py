@@ -0,0 +1,488 @@
+import os
+import json
+import mmap
+import hashlib
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterable
+
+from .append_log import AppendLog
+from .storage import storage
+from .text_ranges import find_chapters, resolve_range
+
+
+class ProjectStore:
+    """Interface for persisting projects, their content, history and memories"""
+
+    def project_exists(self, project_name: str) -> bool:
+        raise NotImplementedError
+
+    def list_projects(self) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def create_project(self, project_name: str, info: Dict[str, Any]):
+        raise NotImplementedError
+
+    def load_content(self, project_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Load a project's document.
+
+        Returns:
+            dict: ``content``, ``version`` and ``last_updated``, or None if there is no document
+        """
+        raise NotImplementedError
+
+    def save_content(self, project_name: str, data: Dict[str, Any]):
+        """
+        Persist a project's document.
+
+        Args:
+            project_name (str): Name of the project
+            data (dict): ``content``, ``version``, ``last_updated`` and ``chapters``
+        """
+        raise NotImplementedError
+
+    def read_content_range(self, project_name: str, start=None, end=None, chapter=None) -> Optional[Dict[str, Any]]:
+        """
+        Read part of a project's document without loading all of it.
+
+        Args:
+            project_name (str): Name of the project
+            start (int, optional): First character of the range
+            end (int, optional): Character after the end of the range
+            chapter (int, optional): Index of a chapter, used instead of start/end
+
+        Returns:
+            dict: Same shape as Document.read_range, or None if there is no document
+        """
+        raise NotImplementedError
+
+    def open_history(self, project_name: str, max_records: int, segment_size: int, history_path=None):
+        """
+        Open a project's edit and deletion logs.
+
+        The logs support ``append(record)``, ``tail(count)`` (newest first)
+        and iteration (oldest first).
+
+        Returns:
+            tuple: (edits log, deletions log, metadata dict)
+        """
+        raise NotImplementedError
+
+    def open_versions(self, project_name: str, max_records: Optional[int] = None):
+        """
+        Open a project's version log (same interface as the history logs).
+
+        Records older than the ``max_records`` most recent may be dropped by
+        ``compact()``; if None, nothing is ever dropped.
+        """
+        raise NotImplementedError
+
+    def save_version_snapshot(self, project_name: str, version: int, text: str):
+        """Persist the full text of a version"""
+        raise NotImplementedError
+
+    def load_version_snapshot(self, project_name: str, version: int) -> Optional[str]:
+        """Load the full text of a version, or None if it has no snapshot"""
+        raise NotImplementedError
+
+    def delete_version_snapshots(self, project_name: str, before_version: int):
+        """Delete the snapshots of the versions older than ``before_version``"""
+        raise NotImplementedError
+
+    def load_memories(self, project_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Load a project's memory chunks.
+
+        Returns:
+            dict: ``chunks`` and ``metadata``, or None if nothing is stored
+        """
+        raise NotImplementedError
+
+    def save_memories(self, project_name: str, memories: Dict[str, Any],
+                      changed: Optional[Iterable[str]] = None, deleted: Optional[Iterable[str]] = None):
+        """
+        Persist a project's memory chunks.
+
+        Backends that store chunks individually only write the chunks listed in
+        ``changed`` and remove those in ``deleted``; when both are None every
+        chunk is written.
+        """
+        raise NotImplementedError
+
+    def load_story_elements(self, project_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Load a project's story elements (characters, settings, plot points...).
+
+        Returns:
+            dict: Element lists keyed by category, plus ``metadata``, or None if nothing is stored
+        """
+        raise NotImplementedError
+
+    def save_story_elements(self, project_name: str, elements: Dict[str, Any]):
+        raise NotImplementedError
+
+    def load_summary_tree(self, project_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Load a project's summary tree.
+
+        Returns:
+            dict: ``nodes`` by id, ``topics`` and ``metadata``, or None if nothing is stored
+        """
+        raise NotImplementedError
+
+    def save_summary_tree(self, project_name: str, tree: Dict[str, Any],
+                          changed: Optional[Iterable[str]] = None, deleted: Optional[Iterable[str]] = None):
+        """
+        Persist a project's summary tree.
+
+        Backends that store nodes individually only write the nodes listed in
+        ``changed`` and remove those in ``deleted``; when both are None every
+        node is written.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JsonProjectStore(ProjectStore):
+    """Projects stored as JSON files under data/projects/{project_name}/"""
+
+    def __init__(self, projects_dir=os.path.join("data", "projects")):
+        """
+        Initialize the store.
+
+        Args:
+            projects_dir (str): Directory holding one subdirectory per project
+        """
+        self.projects_dir = Path(projects_dir)
+
+    def _path(self, project_name: str, *parts) -> Path:
+        return self.projects_dir.joinpath(project_name, *parts)
+
+    def project_exists(self, project_name):
+        return self._path(project_name).exists()
+
+    def list_projects(self):
+        if not self.projects_dir.exists():
+            return []
+
+        projects = []
+        for project_dir in self.projects_dir.iterdir():
+            if project_dir.is_dir():
+                info_path = project_dir / "info.json"
+                project_info = {"project_name": project_dir.name}
+
+                if info_path.exists():
+                    project_info.update(storage.read_json_sync(info_path))
+
+                projects.append(project_info)
+        return projects
+
+    def create_project(self, project_name, info):
+        storage.write_json_atomic(self._path(project_name, "info.json"), info)
+
+    # The manuscript is kept as raw UTF-8 in content.txt, with a small JSON
+    # sidecar holding the version, the chapters and a character-to-byte index
+    # so ranges can be read from a memory map without decoding the whole file.
+    # The text is replaced first and the sidecar second; the sidecar carries a
+    # digest of the text, so a load after a crash between the two finds the
+    # mismatch and rebuilds the sidecar from the text.
+    INDEX_STEP = 4096
+
+    def load_content(self, project_name, repair=True):
+        # repair=False leaves a mismatched sidecar on disk (for read-only callers such as migrations)
+        meta = self._load_content_meta(project_name)
+        if meta is None:
+            # Projects written before the raw-text format
+            legacy_path = self._path(project_name, "content.json")
+            if not legacy_path.exists():
+                return None
+            return storage.read_json_sync(legacy_path)
+
+        text_path = self._path(project_name, "content.txt")
+        text = storage.read_text_sync(text_path)
+        digest = self._digest(text)
+        # Sidecars written before digests were kept are checked by length only
+        if meta.get("digest", digest) != digest or meta.get("length") != len(text):
+            # The text was replaced but its sidecar was not: it is newer than the sidecar says
+            version = meta.get("version", 0) + 1
+            last_updated = datetime.fromtimestamp(os.stat(text_path).st_mtime).isoformat()
+            if not repair:
+                return {"content": text, "version": version, "last_updated": last_updated}
+            meta = self._write_content_meta(project_name, text, version, last_updated, find_chapters(text))
+        return {"content": text, "version": meta.get("version", 0), "last_updated": meta.get("last_updated")}
+
+    def save_content(self, project_name, data):
+        text = data.get("content", "")
+        storage.write_text_atomic(self._path(project_name, "content.txt"), text)
+        self._write_content_meta(
+            project_name, text, data.get("version", 0), data.get("last_updated"), data.get("chapters", [])
+        )
+
+        legacy_path = self._path(project_name, "content.json")
+        if legacy_path.exists():
+            legacy_path.unlink()
+
+    def read_content_range(self, project_name, start=None, end=None, chapter=None):
+        for _ in range(3):
+            meta = self._load_content_meta(project_name)
+            if meta is None:
+                break
+            start_char, end_char = resolve_range(meta["length"], meta["chapters"], start, end, chapter)
+            text = self._read_indexed_range(project_name, meta, start_char, end_char)
+            if text is not None:
+                return {
+                    "content": text,
+                    "start": start_char,
+                    "end": end_char,
+                    "length": meta["length"],
+                    "version": meta.get("version", 0),
+                    "last_updated": meta.get("last_updated")
+                }
+            # The text was replaced between reading the sidecar and the file; retry
+
+        # No sidecar (legacy layout) or a writer kept racing us: fall back to a full read
+        data = self.load_content(project_name)
+        if data is None:
+            return None
+        text = data.get("content", "")
+        start_char, end_char = resolve_range(len(text), find_chapters(text), start, end, chapter)
+        return {
+            "content": text[start_char:end_char],
+            "start": start_char,
+            "end": end_char,
+            "length": len(text),
+            "version": data.get("version", 0),
+            "last_updated": data.get("last_updated")
+        }
+
+    def _write_content_meta(self, project_name, text, version, last_updated, chapters):
+        """Write the sidecar describing the current content.txt"""
+        byte_index = []
+        byte_length = 0
+        for i in range(0, len(text), self.INDEX_STEP):
+            byte_index.append(byte_length)
+            byte_length += len(text[i:i + self.INDEX_STEP].encode("utf-8"))
+        byte_index.append(byte_length)
+
+        meta = {
+            "version": version,
+            "last_updated": last_updated,
+            "length": len(text),
+            "digest": self._digest(text),
+            # Every atomic write creates a new inode, which lets readers detect a newer text file
+            "inode": os.stat(self._path(project_name, "content.txt")).st_ino,
+            "byte_length": byte_length,
+            "index_step": self.INDEX_STEP,
+            "byte_index": byte_index,
+            "chapters": chapters
+        }
+        storage.write_json_atomic(self._path(project_name, "content.meta.json"), meta)
+        return meta
+
+    @staticmethod
+    def _digest(text):
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def _load_content_meta(self, project_name):
+        path = self._path(project_name, "content.meta.json")
+        if not path.exists():
+            return None
+        return storage.read_json_sync(path)
+
+    def _read_indexed_range(self, project_name, meta, start_char, end_char):
+        """Decode only the indexed blocks covering [start_char, end_char), or None if the file changed"""
+        step = meta["index_step"]
+        byte_index = meta["byte_index"]
+        first_block = start_char // step
+        last_block = min(-(-end_char // step), len(byte_index) - 1)
+
+        with open(self._path(project_name, "content.txt"), 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size != meta["byte_length"] or stat.st_ino != meta.get("inode", stat.st_ino):
+                return None
+            if stat.st_size == 0 or start_char >= end_char:
+                return ""
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                chunk = mapped[byte_index[first_block]:byte_index[last_block]].decode("utf-8")
+
+        offset = start_char - first_block * step
+        return chunk[offset:offset + end_char - start_char]
+
+    def open_history(self, project_name, max_records, segment_size, history_path=None):
+        if history_path is None:
+            history_path = self._path(project_name, "edit_history.json")
+        # Logs live in data/projects/{project_name}/edit_history/
+        log_dir = Path(os.path.splitext(str(history_path))[0])
+        is_new = not log_dir.exists()
+
+        edits = AppendLog(log_dir, "edits", segment_size, max_records)
+        deletions = AppendLog(log_dir, "deletions", segment_size, max_records)
+
+        metadata = {
+            "project_name": project_name,
+            "created_at": datetime.now().isoformat()
+        }
+        metadata_path = log_dir / "metadata.json"
+        if is_new:
+            metadata.update(self._migrate_legacy_history(Path(history_path), edits, deletions))
+            storage.write_json_atomic(metadata_path, metadata)
+        elif metadata_path.exists():
+            try:
+                metadata = storage.read_json_sync(metadata_path)
+            except Exception as e:
+                print(f"Error loading edit history metadata: {e}")
+
+        return edits, deletions, metadata
+
+    def read_history(self, project_name, history_path=None):
+        """
+        Read a project's edits, deletions and history metadata without opening its logs.
+
+        Unlike open_history, nothing is created or migrated: a legacy
+        edit_history.json is read where it is.
+
+        Returns:
+            tuple: (edits, deletions, metadata), records oldest first
+        """
+        if history_path is None:
+            history_path = self._path(project_name, "edit_history.json")
+        log_dir = Path(os.path.splitext(str(history_path))[0])
+
+        if log_dir.exists():
+            metadata_path = log_dir / "metadata.json"
+            metadata = storage.read_json_sync(metadata_path) if metadata_path.exists() else {}
+            return list(AppendLog(log_dir, "edits")), list(AppendLog(log_dir, "deletions")), metadata
+
+        if Path(history_path).exists():
+            legacy = storage.read_json_sync(history_path)
+            # The legacy lists are newest first
+            return (
+                list(reversed(legacy.get("edits", []))),
+                list(reversed(legacy.get("deletions", []))),
+                legacy.get("metadata", {})
+            )
+        return [], [], {}
+
+    @staticmethod
+    def _migrate_legacy_history(legacy_file: Path, edits: AppendLog, deletions: AppendLog):
+        """Import edits and deletions from a legacy edit_history.json, returning its metadata"""
+        if not legacy_file.exists():
+            return {}
+
+        try:
+            legacy = storage.read_json_sync(legacy_file)
+        except Exception as e:
+            print(f"Error migrating edit history: {e}")
+            return {}
+
+        # The legacy lists are newest first; logs are appended oldest first
+        for edit in reversed(legacy.get("edits", [])):
+            edits.append(edit)
+        for deletion in reversed(legacy.get("deletions", [])):
+            deletions.append(deletion)
+
+        legacy_file.rename(legacy_file.with_name(legacy_file.name + ".migrated"))
+        return legacy.get("metadata", {})
+
+    # Version records are appended to versions/versions-*.jsonl and
+    # snapshots are written next to them as versions/snapshot-{version}.txt
+    VERSION_SEGMENT_SIZE = 200
+
+    def open_versions(self, project_name, max_records=None):
+        return AppendLog(self._path(project_name, "versions"), "versions", self.VERSION_SEGMENT_SIZE, max_records)
+
+    def save_version_snapshot(self, project_name, version, text):
+        storage.write_text_atomic(self._snapshot_path(project_name, version), text)
+
+    def load_version_snapshot(self, project_name, version):
+        path = self._snapshot_path(project_name, version)
+        if not path.exists():
+            return None
+        with open(path, 'r', encoding="utf-8", newline="") as f:
+            return f.read()
+
+    def delete_version_snapshots(self, project_name, before_version):
+        for path in self._path(project_name, "versions").glob("snapshot-*.txt"):
+            try:
+                version = int(path.stem[len("snapshot-"):])
+            except ValueError:
+                continue
+            if version < before_version:
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def _snapshot_path(self, project_name, version):
+        return self._path(project_name, "versions", f"snapshot-{version:08d}.txt")
+
+    def load_memories(self, project_name):
+        path = self._path(project_name, "memories.json")
+        if not path.exists():
+            return None
+        return storage.read_json_sync(path)
+
+    def save_memories(self, project_name, memories, changed=None, deleted=None):
+        # A JSON file can only be rewritten whole
+        storage.write_json_atomic(self._path(project_name, "memories.json"), memories)
+
+    def load_story_elements(self, project_name):
+        path = self._path(project_name, "memory.json")
+        if not path.exists():
+            return None
+        return storage.read_json_sync(path)
+
+    def save_story_elements(self, project_name, elements):
+        storage.write_json_atomic(self._path(project_name, "memory.json"), elements)
+
+    def load_summary_tree(self, project_name):
+        path = self._path(project_name, "summaries.json")
+        if not path.exists():
+            return None
+        return storage.read_json_sync(path)
+
+    def save_summary_tree(self, project_name, tree, changed=None, deleted=None):
+        storage.write_json_atomic(self._path(project_name, "summaries.json"), tree)
+
+
+# Store used when none is passed explicitly, configured by the application at startup
+_default_store: ProjectStore = JsonProjectStore()
+
+
+def get_default_store() -> ProjectStore:
+    return _default_store
+
+
+def set_default_store(store: ProjectStore):
+    global _default_store
+    _default_store = store
+
+
+def create_store(config: Dict[str, Any]) -> ProjectStore:
+    """
+    Create the store selected by the ``storage`` section of the configuration.
+
+    Args:
+        config (dict): The ``storage`` configuration section
+
+    Returns:
+        ProjectStore: The configured store
+    """
+    backend = config.get("backend", "json")
+    projects_dir = config.get("projects_dir", os.path.join("data", "projects"))
+
+    if backend == "json":
+        return JsonProjectStore(projects_dir)
+    if backend == "sqlite":
+        from .sqlite_store import SqliteProjectStore, migrate_json_to_sqlite
+
+        db_path = config.get("sqlite_path", os.path.join("data", "vibe_writer.db"))
+        store = SqliteProjectStore(db_path)
+        if config.get("migrate_on_start", True) and not store.list_projects():
+            migrate_json_to_sqlite(JsonProjectStore(projects_dir), store)
+        return store
+
+    raise ValueError(f"Unsupported storage backend: {backend}")
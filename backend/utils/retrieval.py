@@ -0,0 +1,261 @@
+import re
+import math
+import time
+import threading
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from .metrics import registry
+
+RETRIEVAL_DURATION = registry.histogram(
+    "memory_retrieval_seconds", "Time to rank a project's memories and story elements for a prompt",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+)
+
+WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from had has have he her hers him his i if in into is it its "
+    "me my no not of on or our she so than that the their them then there they this to up was we "
+    "were what when which who will with you your".split()
+)
+
+# Rough cost of one (document, term) entry across the postings and per-document dicts
+POSTING_BYTES = 200
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words of a text, without stopwords and possessive endings"""
+    terms = []
+    for word in WORD.findall(text.lower()):
+        if word.endswith("'s"):
+            word = word[:-2]
+        if word not in STOPWORDS and len(word) > 1:
+            terms.append(word)
+    return terms
+
+
+class BM25Index:
+    """Okapi BM25 over documents that can be added, replaced and removed one at a time"""
+
+    def __init__(self, k1=1.2, b=0.75):
+        """
+        Initialize an empty index.
+
+        Each term keeps a postings dict (document slot to term frequency),
+        turned into NumPy arrays the first time a query needs it after a
+        change, so updating a document only touches its own terms and a query
+        only scores the documents sharing a term with it.
+
+        Args:
+            k1 (float): Term frequency saturation
+            b (float): Document length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self._terms: Dict[str, int] = {}
+        self._postings: List[Dict[int, int]] = []
+        self._arrays: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self._slots: Dict[str, int] = {}
+        self._doc_terms: Dict[int, Dict[int, int]] = {}
+        self._keys: List[Optional[str]] = []
+        self._free: List[int] = []
+        self._lengths = np.zeros(64, dtype=np.float32)
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, key: str):
+        return key in self._slots
+
+    def size_bytes(self) -> int:
+        """Rough memory held by the index (dict entries dominate)"""
+        return POSTING_BYTES * sum(len(postings) for postings in self._postings) + self._lengths.nbytes
+
+    def add(self, key: str, text: str):
+        """Index a document, replacing the one with the same key"""
+        if key in self._slots:
+            self.remove(key)
+        counts = Counter(tokenize(text))
+        slot = self._free.pop() if self._free else len(self._keys)
+        if slot == len(self._keys):
+            self._keys.append(None)
+            if slot >= len(self._lengths):
+                self._lengths = np.concatenate([self._lengths, np.zeros(len(self._lengths), dtype=np.float32)])
+
+        terms = {}
+        for term, count in counts.items():
+            term_id = self._terms.get(term)
+            if term_id is None:
+                term_id = self._terms[term] = len(self._postings)
+                self._postings.append({})
+            self._postings[term_id][slot] = count
+            self._arrays.pop(term_id, None)
+            terms[term_id] = count
+
+        length = sum(counts.values())
+        self._keys[slot] = key
+        self._slots[key] = slot
+        self._doc_terms[slot] = terms
+        self._lengths[slot] = length
+        self._total_length += length
+
+    def remove(self, key: str):
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return
+        for term_id in self._doc_terms.pop(slot):
+            del self._postings[term_id][slot]
+            self._arrays.pop(term_id, None)
+        self._total_length -= int(self._lengths[slot])
+        self._lengths[slot] = 0
+        self._keys[slot] = None
+        self._free.append(slot)
+
+    def _posting_arrays(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        arrays = self._arrays.get(term_id)
+        if arrays is None:
+            postings = self._postings[term_id]
+            arrays = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            )
+            self._arrays[term_id] = arrays
+        return arrays
+
+    def search(self, query: Dict[str, float], k: int) -> List[Tuple[str, float]]:
+        """
+        Rank documents against weighted query terms.
+
+        Args:
+            query (dict): Query weight of each term
+            k (int): Number of results
+
+        Returns:
+            list: Up to ``k`` (key, score) pairs with a positive score, best first
+        """
+        count = len(self._slots)
+        if count == 0 or k <= 0:
+            return []
+        size = len(self._keys)
+        average = self._total_length / count or 1.0
+        scores = np.zeros(size, dtype=np.float32)
+        norm = None
+
+        for term, weight in query.items():
+            term_id = self._terms.get(term)
+            if term_id is None or not self._postings[term_id]:
+                continue
+            if norm is None:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[:size] / average)
+            slots, frequencies = self._posting_arrays(term_id)
+            frequency = len(slots)
+            idf = math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            scores[slots] += weight * idf * frequencies * (self.k1 + 1) / (frequencies + norm[slots])
+
+        if norm is None:
+            return []
+        k = min(k, size)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(self._keys[slot], float(scores[slot])) for slot in best if scores[slot] > 0]
+
+
+class MemoryRetriever:
+    """Finds the memories and story elements of a project most relevant to the text being written"""
+
+    def __init__(self, memories, story_elements: Optional[Dict[str, Any]] = None, focus_weight=2.0):
+        """
+        Initialize the retriever.
+
+        Memories are indexed when first searched and then kept in step with
+        the MemoryManager through its revision counter and change journal:
+        only memories added, edited or removed since the last search are
+        indexed again. Story elements are indexed once, as read when the
+        project was loaded.
+
+        Args:
+            memories (MemoryManager): The project's memories
+            story_elements (dict, optional): Element lists keyed by category (``metadata`` is skipped)
+            focus_weight (float): Weight of the terms of the text right before the cursor
+                                  relative to those of the surrounding context
+        """
+        self.memories = memories
+        self.focus_weight = focus_weight
+        self.index = BM25Index()
+        self._lock = threading.Lock()
+        self._revision = None
+        self._indexed: Dict[str, str] = {}
+        self._elements: Dict[str, str] = {}
+
+        for category, elements in (story_elements or {}).items():
+            if category == "metadata" or not isinstance(elements, list):
+                continue
+            for position, element in enumerate(elements):
+                if not isinstance(element, dict):
+                    continue
+                details = " ".join(
+                    value for field, value in element.items() if field not in ("id", "name") and isinstance(value, str)
+                )
+                text = f"{element['name']}: {details}" if element.get("name") else details
+                if text.strip(": "):
+                    key = f"element:{category}:{element.get('id', position)}"
+                    self._elements[key] = text
+                    self.index.add(key, text)
+
+    def _sync(self):
+        revision = self.memories.revision
+        if revision == self._revision:
+            return
+        changed = self.memories.changes_since(self._revision) if self._revision is not None else None
+        if changed is None:
+            current = {memory["id"]: memory["text"] for memory in list(self.memories.get_all_memories())}
+            changed = set(current) | {key[len("memory:"):] for key in self._indexed}
+        for memory_id in set(changed):
+            key = f"memory:{memory_id}"
+            memory = self.memories.get_memory(memory_id)
+            if memory is None:
+                if key in self._indexed:
+                    self.index.remove(key)
+                    del self._indexed[key]
+            elif self._indexed.get(key) != memory["text"]:
+                self.index.add(key, memory["text"])
+                self._indexed[key] = memory["text"]
+        self._revision = revision
+
+    def search(self, focus: str, context: str = "", k: int = 3) -> List[Dict[str, Any]]:
+        """
+        Rank memories and story elements against the text around the cursor.
+
+        Args:
+            focus (str): Text right before the cursor (e.g. the current snippet)
+            context (str): Nearby text for additional terms
+            k (int): Number of results
+
+        Returns:
+            list: Up to ``k`` dicts with ``kind`` ("memory" or "element"), ``text`` and
+                  ``score``; memories also carry the ``memory`` itself
+        """
+        started = time.perf_counter()
+        query: Dict[str, float] = {}
+        for term in tokenize(context):
+            query[term] = 1.0
+        for term in tokenize(focus):
+            query[term] = self.focus_weight
+
+        with self._lock:
+            self._sync()
+            ranked = self.index.search(query, k)
+
+        results = []
+        for key, score in ranked:
+            if key.startswith("memory:"):
+                memory = self.memories.get_memory(key[len("memory:"):])
+                if memory is not None:
+                    results.append({"kind": "memory", "text": memory["text"], "score": score, "memory": memory})
+            else:
+                results.append({"kind": "element", "text": self._elements[key], "score": score})
+        RETRIEVAL_DURATION.observe(time.perf_counter() - started)
+        return results
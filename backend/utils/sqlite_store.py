@@ -0,0 +1,537 @@
+"""
+SQLite storage backend.
+
+The database runs in WAL mode so readers never block the writer. Edits,
+deletions, memory chunks and story elements are stored one row each, so
+appending an edit or changing a memory touches a single indexed row
+instead of rewriting a file.
+
+To migrate the JSON layout into a database, run from the backend directory:
+
+    python -m utils.sqlite_store --projects-dir data/projects --db data/vibe_writer.db
+"""
+import os
+import json
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterator
+
+from .project_store import ProjectStore, JsonProjectStore
+from .text_ranges import find_chapters, resolve_range
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    name TEXT PRIMARY KEY,
+    info TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS content (
+    project TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    last_updated TEXT
+);
+CREATE TABLE IF NOT EXISTS edits (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project TEXT NOT NULL,
+    timestamp TEXT,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS edits_by_project ON edits (project, id);
+CREATE INDEX IF NOT EXISTS edits_by_time ON edits (project, timestamp);
+CREATE TABLE IF NOT EXISTS deletions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project TEXT NOT NULL,
+    timestamp TEXT,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS deletions_by_project ON deletions (project, id);
+CREATE INDEX IF NOT EXISTS deletions_by_time ON deletions (project, timestamp);
+CREATE TABLE IF NOT EXISTS versions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project TEXT NOT NULL,
+    timestamp TEXT,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS versions_by_project ON versions (project, id);
+CREATE TABLE IF NOT EXISTS version_snapshots (
+    project TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (project, version)
+);
+CREATE TABLE IF NOT EXISTS memory_chunks (
+    project TEXT NOT NULL,
+    id TEXT NOT NULL,
+    position INTEGER,
+    record TEXT NOT NULL,
+    PRIMARY KEY (project, id)
+);
+CREATE INDEX IF NOT EXISTS memory_chunks_by_position ON memory_chunks (project, position);
+CREATE TABLE IF NOT EXISTS story_elements (
+    project TEXT NOT NULL,
+    category TEXT NOT NULL,
+    id TEXT NOT NULL,
+    name TEXT,
+    record TEXT NOT NULL,
+    PRIMARY KEY (project, category, id)
+);
+CREATE INDEX IF NOT EXISTS story_elements_by_name ON story_elements (project, category, name);
+CREATE TABLE IF NOT EXISTS summary_nodes (
+    project TEXT NOT NULL,
+    id TEXT NOT NULL,
+    record TEXT NOT NULL,
+    PRIMARY KEY (project, id)
+);
+CREATE TABLE IF NOT EXISTS metadata (
+    project TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (project, key)
+);
+"""
+
+LOG_TABLES = ("edits", "deletions", "versions")
+
+
+class SqliteLog:
+    """Edit or deletion log of one project backed by a SQLite table"""
+
+    def __init__(self, store, project_name: str, table: str, max_records=None, prune_every=50):
+        """
+        Initialize the log.
+
+        Args:
+            store (SqliteProjectStore): The owning store
+            project_name (str): Name of the project
+            table (str): "edits", "deletions" or "versions"
+            max_records (int, optional): Number of most recent records to retain
+            prune_every (int): Number of appends between retention passes
+        """
+        if table not in LOG_TABLES:
+            raise ValueError(f"Unknown log table: {table}")
+        self.store = store
+        self.project_name = project_name
+        self.table = table
+        self.max_records = max_records
+        self.prune_every = prune_every
+        self._appends = 0
+
+    def append(self, record: Dict[str, Any]):
+        with self.store.transaction() as conn:
+            conn.execute(
+                f"INSERT INTO {self.table} (project, timestamp, record) VALUES (?, ?, ?)",
+                (self.project_name, record.get("timestamp"), json.dumps(record))
+            )
+        self._appends += 1
+        if self._appends % self.prune_every == 0:
+            self.compact()
+
+    def tail(self, count=10) -> List[Dict[str, Any]]:
+        rows = self.store.connection().execute(
+            f"SELECT record FROM {self.table} WHERE project = ? ORDER BY id DESC LIMIT ?",
+            (self.project_name, count)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        rows = self.store.connection().execute(
+            f"SELECT record FROM {self.table} WHERE project = ? ORDER BY id",
+            (self.project_name,)
+        )
+        for row in rows:
+            yield json.loads(row[0])
+
+    def __len__(self):
+        return self.store.connection().execute(
+            f"SELECT COUNT(*) FROM {self.table} WHERE project = ?", (self.project_name,)
+        ).fetchone()[0]
+
+    def compact(self):
+        """Delete records older than the retained window"""
+        if self.max_records is None:
+            return
+        with self.store.transaction() as conn:
+            conn.execute(
+                f"""DELETE FROM {self.table} WHERE project = ? AND id <= (
+                        SELECT id FROM {self.table} WHERE project = ?
+                        ORDER BY id DESC LIMIT 1 OFFSET ?
+                    )""",
+                (self.project_name, self.project_name, self.max_records)
+            )
+
+
+class SqliteProjectStore(ProjectStore):
+    """Projects stored in a single SQLite database in WAL mode"""
+
+    def __init__(self, db_path=os.path.join("data", "vibe_writer.db")):
+        """
+        Open (and if needed create) the database.
+
+        Args:
+            db_path (str): Path to the database file
+        """
+        self.db_path = db_path
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+        conn = self.connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        """Get this thread's connection (SQLite connections are not shared across threads)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def transaction(self) -> sqlite3.Connection:
+        """Connection usable as a context manager that commits (or rolls back) on exit"""
+        return self.connection()
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.ProgrammingError:
+                    # Closed from a thread other than its own; it goes away with the thread
+                    pass
+            self._connections = []
+        self._local = threading.local()
+
+    def _ensure_project(self, conn, project_name: str):
+        conn.execute("INSERT OR IGNORE INTO projects (name) VALUES (?)", (project_name,))
+
+    def _get_metadata(self, project_name: str, key: str) -> Optional[Dict[str, Any]]:
+        row = self.connection().execute(
+            "SELECT value FROM metadata WHERE project = ? AND key = ?", (project_name, key)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set_metadata(self, conn, project_name: str, key: str, value: Dict[str, Any]):
+        conn.execute(
+            "INSERT OR REPLACE INTO metadata (project, key, value) VALUES (?, ?, ?)",
+            (project_name, key, json.dumps(value))
+        )
+
+    def project_exists(self, project_name):
+        row = self.connection().execute(
+            "SELECT 1 FROM projects WHERE name = ?", (project_name,)
+        ).fetchone()
+        return row is not None
+
+    def list_projects(self):
+        projects = []
+        for name, info in self.connection().execute("SELECT name, info FROM projects ORDER BY name"):
+            project_info = {"project_name": name}
+            project_info.update(json.loads(info))
+            projects.append(project_info)
+        return projects
+
+    def create_project(self, project_name, info):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO projects (name, info) VALUES (?, ?)",
+                (project_name, json.dumps(info))
+            )
+
+    def load_content(self, project_name):
+        row = self.connection().execute(
+            "SELECT text, version, last_updated FROM content WHERE project = ?", (project_name,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"content": row[0], "version": row[1], "last_updated": row[2]}
+
+    def save_content(self, project_name, data):
+        text = data.get("content", "")
+        chapters = data.get("chapters")
+        if chapters is None:
+            chapters = find_chapters(text)
+
+        with self.transaction() as conn:
+            self._ensure_project(conn, project_name)
+            conn.execute(
+                "INSERT OR REPLACE INTO content (project, text, version, last_updated) VALUES (?, ?, ?, ?)",
+                (project_name, text, data.get("version", 0), data.get("last_updated"))
+            )
+            self._set_metadata(conn, project_name, "chapters", chapters)
+
+    def read_content_range(self, project_name, start=None, end=None, chapter=None):
+        conn = self.connection()
+        # Both reads see the same snapshot
+        with conn:
+            conn.execute("BEGIN")
+            row = conn.execute(
+                "SELECT length(text), version, last_updated FROM content WHERE project = ?", (project_name,)
+            ).fetchone()
+            if row is None:
+                return None
+            length, version, last_updated = row
+            chapters = self._get_metadata(project_name, "chapters") or []
+            start_char, end_char = resolve_range(length, chapters, start, end, chapter)
+
+            # substr() counts characters from 1
+            text = conn.execute(
+                "SELECT substr(text, ?, ?) FROM content WHERE project = ?",
+                (start_char + 1, end_char - start_char, project_name)
+            ).fetchone()[0]
+
+        return {
+            "content": text,
+            "start": start_char,
+            "end": end_char,
+            "length": length,
+            "version": version,
+            "last_updated": last_updated
+        }
+
+    def open_history(self, project_name, max_records, segment_size, history_path=None):
+        metadata = self._get_metadata(project_name, "edit_history")
+        if metadata is None:
+            metadata = {
+                "project_name": project_name,
+                "created_at": datetime.now().isoformat()
+            }
+            with self.transaction() as conn:
+                self._ensure_project(conn, project_name)
+                self._set_metadata(conn, project_name, "edit_history", metadata)
+
+        edits = SqliteLog(self, project_name, "edits", max_records, prune_every=segment_size)
+        deletions = SqliteLog(self, project_name, "deletions", max_records, prune_every=segment_size)
+        return edits, deletions, metadata
+
+    def open_versions(self, project_name, max_records=None):
+        return SqliteLog(self, project_name, "versions", max_records)
+
+    def save_version_snapshot(self, project_name, version, text):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO version_snapshots (project, version, text) VALUES (?, ?, ?)",
+                (project_name, version, text)
+            )
+
+    def load_version_snapshot(self, project_name, version):
+        row = self.connection().execute(
+            "SELECT text FROM version_snapshots WHERE project = ? AND version = ?", (project_name, version)
+        ).fetchone()
+        return row[0] if row else None
+
+    def delete_version_snapshots(self, project_name, before_version):
+        with self.transaction() as conn:
+            conn.execute(
+                "DELETE FROM version_snapshots WHERE project = ? AND version < ?", (project_name, before_version)
+            )
+
+    def load_memories(self, project_name):
+        metadata = self._get_metadata(project_name, "memories")
+        rows = self.connection().execute(
+            "SELECT record FROM memory_chunks WHERE project = ? ORDER BY rowid", (project_name,)
+        ).fetchall()
+        if metadata is None and not rows:
+            return None
+        return {
+            "chunks": [json.loads(row[0]) for row in rows],
+            "metadata": metadata or {"project_name": project_name}
+        }
+
+    def save_memories(self, project_name, memories, changed=None, deleted=None):
+        chunks = memories.get("chunks", [])
+        with self.transaction() as conn:
+            self._ensure_project(conn, project_name)
+            self._set_metadata(conn, project_name, "memories", memories.get("metadata", {}))
+
+            if changed is None and deleted is None:
+                conn.execute("DELETE FROM memory_chunks WHERE project = ?", (project_name,))
+                to_write = chunks
+            else:
+                changed = set(changed or ())
+                to_write = [chunk for chunk in chunks if chunk["id"] in changed]
+                conn.executemany(
+                    "DELETE FROM memory_chunks WHERE project = ? AND id = ?",
+                    [(project_name, memory_id) for memory_id in (deleted or ())]
+                )
+
+            conn.executemany(
+                "INSERT OR REPLACE INTO memory_chunks (project, id, position, record) VALUES (?, ?, ?, ?)",
+                [(project_name, chunk["id"], chunk.get("position"), json.dumps(chunk)) for chunk in to_write]
+            )
+
+    def load_story_elements(self, project_name):
+        metadata = self._get_metadata(project_name, "story_elements")
+        rows = self.connection().execute(
+            "SELECT category, record FROM story_elements WHERE project = ? ORDER BY rowid", (project_name,)
+        ).fetchall()
+        if metadata is None and not rows:
+            return None
+
+        elements = {"metadata": metadata or {"project_name": project_name}}
+        categories = (metadata or {}).get("categories", [])
+        for category in categories:
+            elements[category] = []
+        for category, record in rows:
+            elements.setdefault(category, []).append(json.loads(record))
+        return elements
+
+    def save_story_elements(self, project_name, elements):
+        categories = [key for key, value in elements.items() if key != "metadata" and isinstance(value, list)]
+        metadata = dict(elements.get("metadata", {}))
+        metadata["categories"] = categories
+
+        with self.transaction() as conn:
+            self._ensure_project(conn, project_name)
+            self._set_metadata(conn, project_name, "story_elements", metadata)
+            conn.execute("DELETE FROM story_elements WHERE project = ?", (project_name,))
+            rows = []
+            for category in categories:
+                for index, element in enumerate(elements[category]):
+                    element_id = str(element.get("id", index))
+                    rows.append((project_name, category, element_id, element.get("name"), json.dumps(element)))
+            conn.executemany(
+                "INSERT OR REPLACE INTO story_elements (project, category, id, name, record) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def load_summary_tree(self, project_name):
+        tree = self._get_metadata(project_name, "summary_tree")
+        rows = self.connection().execute(
+            "SELECT id, record FROM summary_nodes WHERE project = ?", (project_name,)
+        ).fetchall()
+        if tree is None and not rows:
+            return None
+        tree = tree or {"metadata": {"project_name": project_name}}
+        tree["nodes"] = {node_id: json.loads(record) for node_id, record in rows}
+        return tree
+
+    def save_summary_tree(self, project_name, tree, changed=None, deleted=None):
+        nodes = tree.get("nodes", {})
+        with self.transaction() as conn:
+            self._ensure_project(conn, project_name)
+            self._set_metadata(conn, project_name, "summary_tree",
+                               {key: value for key, value in tree.items() if key != "nodes"})
+
+            if changed is None and deleted is None:
+                conn.execute("DELETE FROM summary_nodes WHERE project = ?", (project_name,))
+                to_write = list(nodes)
+            else:
+                to_write = [node_id for node_id in (changed or ()) if node_id in nodes]
+                conn.executemany(
+                    "DELETE FROM summary_nodes WHERE project = ? AND id = ?",
+                    [(project_name, node_id) for node_id in (deleted or ())]
+                )
+
+            conn.executemany(
+                "INSERT OR REPLACE INTO summary_nodes (project, id, record) VALUES (?, ?, ?)",
+                [(project_name, node_id, json.dumps(nodes[node_id])) for node_id in to_write]
+            )
+
+
+def migrate_json_to_sqlite(source: JsonProjectStore, target: SqliteProjectStore) -> List[str]:
+    """
+    Copy every project from the JSON layout into a SQLite store.
+
+    Args:
+        source (JsonProjectStore): Store reading the existing JSON files
+        target (SqliteProjectStore): Store to copy into
+
+    Returns:
+        list: Names of the migrated projects
+    """
+    migrated = []
+    for info in source.list_projects():
+        project_name = info["project_name"]
+        target.create_project(project_name, {k: v for k, v in info.items() if k != "project_name"})
+
+        # The JSON files are only read: the source stays usable as it was
+        content = source.load_content(project_name, repair=False)
+        if content is not None:
+            target.save_content(project_name, content)
+
+        edits, deletions, metadata = source.read_history(project_name)
+        target_edits, target_deletions, _ = target.open_history(project_name, max_records=None, segment_size=50)
+        with target.transaction() as conn:
+            target._set_metadata(conn, project_name, "edit_history", metadata)
+            for table, records in (("edits", edits), ("deletions", deletions)):
+                conn.executemany(
+                    f"INSERT INTO {table} (project, timestamp, record) VALUES (?, ?, ?)",
+                    [(project_name, record.get("timestamp"), json.dumps(record)) for record in records]
+                )
+
+        if source._path(project_name, "versions").exists():
+            try:
+                _migrate_versions(source, target, project_name)
+            except Exception as e:
+                # The project is still usable without its older versions
+                print(f"Error migrating versions of '{project_name}': {e}")
+
+        memories = source.load_memories(project_name)
+        if memories is not None:
+            target.save_memories(project_name, memories)
+
+        story_elements = source.load_story_elements(project_name)
+        if story_elements is not None:
+            target.save_story_elements(project_name, story_elements)
+
+        summary_tree = source.load_summary_tree(project_name)
+        if summary_tree is not None:
+            target.save_summary_tree(project_name, summary_tree)
+
+        migrated.append(project_name)
+    return migrated
+
+
+def _migrate_versions(source: JsonProjectStore, target: SqliteProjectStore, project_name: str):
+    """
+    Copy a project's version records and snapshots.
+
+    A record marked as a snapshot whose snapshot file is missing cannot be
+    reconstructed, and neither can anything older (reconstruction walks
+    forward to a snapshot), so only the records after the newest such record
+    are copied.
+    """
+    records, snapshots = [], {}
+    for record in source.open_versions(project_name):
+        if record.get("snapshot"):
+            text = source.load_version_snapshot(project_name, record["version"])
+            if text is None:
+                records, snapshots = [], {}
+                continue
+            snapshots[record["version"]] = text
+        records.append(record)
+
+    with target.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO versions (project, timestamp, record) VALUES (?, ?, ?)",
+            [(project_name, record.get("timestamp"), json.dumps(record)) for record in records]
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO version_snapshots (project, version, text) VALUES (?, ?, ?)",
+            [(project_name, version, text) for version, text in snapshots.items()]
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate JSON project files into a SQLite database")
+    parser.add_argument("--projects-dir", default=os.path.join("data", "projects"))
+    parser.add_argument("--db", default=os.path.join("data", "vibe_writer.db"))
+    args = parser.parse_args()
+
+    target = SqliteProjectStore(args.db)
+    migrated = migrate_json_to_sqlite(JsonProjectStore(args.projects_dir), target)
+    target.close()
+    print(f"Migrated {len(migrated)} project(s) into {args.db}: {', '.join(migrated)}")
+
+
+if __name__ == "__main__":
+    main()
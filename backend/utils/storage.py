@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import asyncio
+import tempfile
+import threading
+from pathlib import Path
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable
+
+from .metrics import registry
+
+FSYNC_MODES = ("none", "always", "batch")
+
+STORAGE_DURATION = registry.histogram(
+    "storage_operation_duration_seconds", "Time spent reading and writing project data", ("operation",)
+)
+_FILE_READ = STORAGE_DURATION.labels("file_read")
+_FILE_WRITE = STORAGE_DURATION.labels("file_write")
+
+
+class Storage:
+    """File I/O off the event loop, with atomic writes and optional fsync batching"""
+
+    def __init__(self, max_workers=4, fsync="none", fsync_interval=0.05):
+        """
+        Initialize the storage layer.
+
+        Args:
+            max_workers (int): Size of the thread pool used for file I/O
+            fsync (str): "none" leaves flushing to the OS, "always" fsyncs every
+                         write before it becomes visible, "batch" makes writes
+                         visible immediately and fsyncs them in the background
+                         once per interval
+            fsync_interval (float): Seconds between background fsyncs in "batch" mode
+        """
+        self._executor = None
+        self._flusher = None
+        self._pending_fsync = set()
+        self._fsync_lock = threading.Condition()
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self.files_written = 0
+        self.bytes_written = 0
+        self.files_read = 0
+        self.bytes_read = 0
+        self.configure(max_workers, fsync, fsync_interval)
+
+    def configure(self, max_workers=4, fsync="none", fsync_interval=0.05):
+        """Apply settings; the thread pool is (re)created on next use"""
+        if fsync not in FSYNC_MODES:
+            raise ValueError(f"Unsupported fsync mode: {fsync}")
+
+        self.flush()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+        self.max_workers = max_workers
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self._closed = False
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """
+        Run a blocking function in the I/O thread pool.
+
+        Args:
+            fn (callable): The function to run
+            *args: Positional arguments for fn
+            **kwargs: Keyword arguments for fn
+
+        Returns:
+            Any: The function's return value
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), partial(fn, *args, **kwargs))
+
+    async def read_json(self, path) -> Dict[str, Any]:
+        """Read a JSON file without blocking the event loop"""
+        return await self.run(self.read_json_sync, path)
+
+    async def write_json(self, path, data: Dict[str, Any]):
+        """Atomically write a JSON file without blocking the event loop"""
+        await self.run(self.write_json_atomic, path, data)
+
+    def read_json_sync(self, path) -> Dict[str, Any]:
+        return json.loads(self.read_text_sync(path))
+
+    def read_text_sync(self, path) -> str:
+        """Read a whole UTF-8 text file, without newline translation"""
+        started = time.perf_counter()
+        with open(path, 'rb') as f:
+            data = f.read()
+        _FILE_READ.observe(time.perf_counter() - started)
+        with self._stats_lock:
+            self.files_read += 1
+            self.bytes_read += len(data)
+        return data.decode("utf-8")
+
+    def write_json_atomic(self, path, data: Dict[str, Any]):
+        """
+        Write JSON to a temporary file in the same directory and rename it into place,
+        so readers see either the previous or the new file, never a partial one.
+
+        Args:
+            path (str): Destination path
+            data (dict): The data to write
+        """
+        self.write_text_atomic(path, json.dumps(data, indent=2))
+
+    def write_text_atomic(self, path, text: str):
+        """
+        Atomically replace a text file.
+
+        Args:
+            path (str): Destination path
+            text (str): The text to write
+        """
+        started = time.perf_counter()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+        try:
+            # mkstemp creates the file owner-only; keep the permissions of the file being replaced
+            try:
+                mode = os.stat(path).st_mode & 0o777
+            except FileNotFoundError:
+                mode = 0o644
+            os.chmod(tmp_path, mode)
+            data = text.encode("utf-8")
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                if self.fsync == "always":
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+        if self.fsync == "always":
+            self._fsync_directory(path.parent)
+        elif self.fsync == "batch":
+            self._schedule_fsync(path)
+
+        _FILE_WRITE.observe(time.perf_counter() - started)
+        with self._stats_lock:
+            self.files_written += 1
+            self.bytes_written += len(data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get counters of file reads and atomic writes"""
+        with self._stats_lock:
+            return {
+                "fsync": self.fsync,
+                "files_read": self.files_read,
+                "bytes_read": self.bytes_read,
+                "files_written": self.files_written,
+                "bytes_written": self.bytes_written
+            }
+
+    def flush(self):
+        """Fsync every file waiting for the next batch"""
+        with self._fsync_lock:
+            pending = self._pending_fsync
+            self._pending_fsync = set()
+
+        directories = set()
+        for path in pending:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            directories.add(path.parent)
+
+        for directory in directories:
+            self._fsync_directory(directory)
+
+    def close(self):
+        """Flush pending fsyncs and stop the worker threads"""
+        with self._fsync_lock:
+            self._closed = True
+            self._fsync_lock.notify_all()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        self.flush()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="storage")
+        return self._executor
+
+    def _schedule_fsync(self, path: Path):
+        with self._fsync_lock:
+            self._pending_fsync.add(path)
+            if self._flusher is None or not self._flusher.is_alive():
+                self._closed = False
+                self._flusher = threading.Thread(target=self._flush_loop, name="storage-fsync", daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            with self._fsync_lock:
+                self._fsync_lock.wait(self.fsync_interval)
+                if self._closed:
+                    return
+            self.flush()
+
+    @staticmethod
+    def _fsync_directory(directory: Path):
+        """Persist a rename by fsyncing its directory (not supported on every platform)"""
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+# Shared instance, configured by the application at startup
+storage = Storage()
@@ -0,0 +1,194 @@
+import hashlib
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterable
+
+from .project_store import ProjectStore, get_default_store
+
+TOPICS = ("character", "plot", "theme", "setting", "tone")
+
+
+def _hash(*parts: str) -> str:
+    return hashlib.sha1("\0".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def build_levels(memories: List[Dict[str, Any]], fanout=8) -> List[List[Dict[str, Any]]]:
+    """
+    Arrange memories into the levels of a summary tree, leaves first.
+
+    Leaves are the memories in text order. A level is cut into sections
+    after every node whose id hashes to a multiple of ``fanout`` (and after
+    ``2 * fanout`` nodes at most), and a node's id is a hash of its children's
+    ids, so an edited memory gives new ids only to the sections on its path
+    to the root; every other section keeps its id and its summaries.
+
+    Args:
+        memories (list): Memories with ``id``, ``text`` and ``position``
+        fanout (int): Typical number of children per section
+
+    Returns:
+        list: One list of nodes per level (``id``, ``children``, ``start``, ``end``;
+              leaves carry ``memory`` and ``text``), the last holding the root
+
+    Raises:
+        ValueError: If fanout is below 2, which would never reduce a level to a root
+    """
+    if fanout < 2:
+        raise ValueError(f"Summary tree fanout must be at least 2, got {fanout}")
+
+    leaves = [
+        {
+            "id": _hash(memory["id"], memory["text"]),
+            "memory": memory["id"],
+            "text": memory["text"],
+            "start": memory.get("position", 0),
+            "end": memory.get("end", memory.get("position", 0))
+        }
+        for memory in sorted(memories, key=lambda m: m.get("position", 0))
+        if memory.get("text")
+    ]
+    if not leaves:
+        return []
+
+    levels = [leaves]
+    while len(levels[-1]) > 1:
+        nodes = levels[-1]
+        groups, group = [], []
+        for node in nodes:
+            group.append(node)
+            if int(node["id"][:8], 16) % fanout == 0 or len(group) >= 2 * fanout:
+                groups.append(group)
+                group = []
+        if group:
+            groups.append(group)
+        if len(groups) == len(nodes):
+            # Every node picked as a boundary: fall back to fixed sections so the tree narrows
+            groups = [nodes[i:i + fanout] for i in range(0, len(nodes), fanout)]
+
+        level = len(levels)
+        levels.append([
+            {
+                "id": _hash(str(level), *(child["id"] for child in group)),
+                "level": level,
+                "children": [child["id"] for child in group],
+                "start": group[0]["start"],
+                "end": group[-1]["end"]
+            }
+            for group in groups
+        ])
+    return levels
+
+
+class SummaryTree:
+    """Per-topic summaries of a project's sections and of the whole story, built on its memories"""
+
+    def __init__(self, project_name, store: ProjectStore = None):
+        """Initialize the summary tree"""
+        self.project_name = project_name
+        self.store = store or get_default_store()
+
+        self.tree = {
+            "nodes": {},
+            "topics": {topic: {"summary": None, "frozen": False, "root": None, "updated_at": None}
+                       for topic in TOPICS},
+            "metadata": {
+                "project_name": project_name,
+                "created_at": datetime.now().isoformat(),
+                "last_updated": datetime.now().isoformat()
+            }
+        }
+
+        self.load()
+
+    def load(self):
+        """Load the tree from the store, keeping the empty one if nothing is stored"""
+        try:
+            tree = self.store.load_summary_tree(self.project_name)
+        except Exception as e:
+            print(f"Error loading summary tree: {e}")
+            return False
+
+        if tree is not None:
+            for topic, info in self.tree["topics"].items():
+                tree.setdefault("topics", {}).setdefault(topic, info)
+            tree.setdefault("nodes", {})
+            self.tree = tree
+        return True
+
+    def save(self, changed: Optional[Iterable[str]] = None, deleted: Optional[Iterable[str]] = None):
+        """
+        Save the tree to the store.
+
+        Args:
+            changed (list, optional): Ids of the nodes that were added or changed
+            deleted (list, optional): Ids of the nodes that were removed
+        """
+        try:
+            self.tree["metadata"]["last_updated"] = datetime.now().isoformat()
+            self.store.save_summary_tree(self.project_name, self.tree, changed=changed, deleted=deleted)
+            return True
+        except Exception as e:
+            print(f"Error saving summary tree: {e}")
+            return False
+
+    def get_topics(self) -> Dict[str, Dict[str, Any]]:
+        return self.tree["topics"]
+
+    def is_frozen(self, topic: str) -> bool:
+        return self.tree["topics"][topic]["frozen"]
+
+    def set_frozen(self, topic: str, frozen: bool) -> Dict[str, Any]:
+        """Lock or unlock a topic; a frozen topic keeps its summaries and is skipped by refreshes"""
+        self.tree["topics"][topic]["frozen"] = frozen
+        self.save(changed=[])
+        return self.tree["topics"][topic]
+
+    def summary(self, node_id: str, topic: str) -> Optional[str]:
+        """Summary of a stored section for a topic, or None if it has none yet"""
+        node = self.tree["nodes"].get(node_id)
+        return node["summaries"].get(topic) if node is not None else None
+
+    def apply(self, levels: List[List[Dict[str, Any]]], summaries: Dict[str, Dict[str, str]]):
+        """
+        Store new section summaries, point each topic at the new root and save once.
+
+        Sections no longer part of the tree are dropped. A topic whose root
+        lacks a summary (frozen, or its refresh failed) keeps its last one.
+
+        Args:
+            levels (list): The tree's levels, from build_levels
+            summaries (dict): New summaries by node id, then topic
+        """
+        nodes = self.tree["nodes"]
+        changed = []
+        current = set()
+        for level in levels[1:]:
+            for node in level:
+                current.add(node["id"])
+                new = summaries.get(node["id"])
+                if node["id"] not in nodes:
+                    nodes[node["id"]] = dict(node, summaries={})
+                    changed.append(node["id"])
+                if new:
+                    nodes[node["id"]]["summaries"].update(new)
+                    if node["id"] not in changed:
+                        changed.append(node["id"])
+
+        deleted = [node_id for node_id in nodes if node_id not in current]
+        for node_id in deleted:
+            del nodes[node_id]
+
+        root = levels[-1][0] if levels else None
+        timestamp = datetime.now().isoformat()
+        for topic, info in self.tree["topics"].items():
+            if root is None or info["frozen"]:
+                continue
+            text = root.get("text") if len(levels) == 1 else self.summary(root["id"], topic)
+            if text is not None and (info["root"] != root["id"] or info["summary"] != text):
+                info.update({"summary": text, "root": root["id"], "updated_at": timestamp})
+
+        self.save(changed=changed, deleted=deleted)
+
+    def size_bytes(self) -> int:
+        return sum(
+            len(text) for node in self.tree["nodes"].values() for text in node["summaries"].values()
+        )
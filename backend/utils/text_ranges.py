@@ -0,0 +1,63 @@
+"""
+Chapter detection and range resolution shared by documents and stores.
+"""
+import re
+from typing import List, Dict, Any, Optional
+
+HEADING_PATTERN = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t#]*$", re.MULTILINE)
+
+
+def find_chapters(text: str) -> List[Dict[str, Any]]:
+    """
+    Split a markdown manuscript into chapters.
+
+    Chapters start at the shallowest heading level used in the text (so a
+    manuscript using ``##`` for chapters works as well as one using ``#``).
+
+    Args:
+        text (str): The manuscript
+
+    Returns:
+        list: Chapters with ``title``, ``start`` and ``end`` character offsets
+    """
+    headings = [(len(m.group(1)), m.group(2), m.start()) for m in HEADING_PATTERN.finditer(text)]
+    if not headings:
+        return []
+
+    level = min(h[0] for h in headings)
+    starts = [(title, start) for depth, title, start in headings if depth == level]
+    chapters = []
+    for i, (title, start) in enumerate(starts):
+        end = starts[i + 1][1] if i + 1 < len(starts) else len(text)
+        chapters.append({"title": title, "start": start, "end": end})
+    return chapters
+
+
+def resolve_range(length: int, chapters: List[Dict[str, Any]], start: Optional[int] = None,
+                  end: Optional[int] = None, chapter: Optional[int] = None):
+    """
+    Turn range parameters into clamped character offsets.
+
+    A negative start or end counts from the end of the document, as in a
+    Python slice, so ``start=-1000`` selects the last 1000 characters.
+
+    Args:
+        length (int): Length of the document
+        chapters (list): Chapters as returned by find_chapters
+        start (int, optional): First character of the range
+        end (int, optional): Character after the end of the range
+        chapter (int, optional): Index of a chapter, used instead of start/end
+
+    Returns:
+        tuple: (start, end)
+
+    Raises:
+        ValueError: If the chapter does not exist
+    """
+    if chapter is not None:
+        if not 0 <= chapter < len(chapters):
+            raise ValueError(f"Chapter {chapter} does not exist ({len(chapters)} chapters)")
+        return chapters[chapter]["start"], chapters[chapter]["end"]
+
+    start, end, _ = slice(start, end).indices(length)
+    return start, max(start, end)
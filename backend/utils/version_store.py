@@ -0,0 +1,219 @@
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from .diff import compute_diff, invert_diff
+from .project_store import ProjectStore, get_default_store
+
+# Rough size of a version record without its delta text
+RECORD_OVERHEAD_BYTES = 256
+
+
+class VersionStore:
+    """Every committed version of a project's document, stored as reverse deltas and periodic snapshots"""
+
+    def __init__(self, project_name, store: ProjectStore = None, max_chain=100, max_versions=1000):
+        """
+        Open the version log.
+
+        Each committed version is recorded with the reverse delta that turns
+        it back into the previous version, so storage grows with the edited
+        bytes. A version is reconstructed by starting from the nearest newer
+        full text (a snapshot, or the current document) and applying reverse
+        deltas. A snapshot of the new version is written whenever the deltas
+        since the last snapshot reach ``max_chain`` versions or add up to the
+        document's length, which bounds the work of any reconstruction.
+
+        Only the ``max_versions`` most recent versions are kept: once a tenth
+        more have been recorded, the oldest records are dropped from memory
+        and the log is compacted. Logs drop records in whole segments, so
+        snapshots are deleted only below the oldest record the log still
+        holds, and every record read back from the log finds its snapshot.
+
+        Args:
+            project_name (str): Name of the project
+            store (ProjectStore, optional): Where versions are persisted. If None, uses the default store.
+            max_chain (int): Maximum number of reverse deltas applied to reconstruct a version
+            max_versions (int): Number of most recent versions to retain
+        """
+        self.project_name = project_name
+        self.store = store or get_default_store()
+        self.max_chain = max_chain
+        self.max_versions = max_versions
+
+        self.log = self.store.open_versions(project_name, max_versions)
+        # Records oldest first; deltas are small enough to keep in memory
+        self.records: List[Dict[str, Any]] = []
+        for record in self.log:
+            # A record that does not follow the previous ones replaces them: the
+            # newer record is the one the chain up to the current document uses
+            while self.records and self.records[-1]["version"] >= record["version"]:
+                self.records.pop()
+            self.records.append(record)
+        self.records = self.records[-max_versions:]
+        self._reindex()
+
+    def record(self, old_text: str, new_text: str, version: int, base_version: int, timestamp=None):
+        """
+        Record a committed version.
+
+        Args:
+            old_text (str): Text of base_version
+            new_text (str): Text of the new version
+            version (int): The new version
+            base_version (int): Version the change was made against
+            timestamp (str, optional): When the version was committed. If None, uses now.
+
+        Returns:
+            dict: The version's summary, or None if ``version`` is not newer than the last recorded one
+        """
+        if self.records and version <= self.records[-1]["version"]:
+            return None
+
+        ops = compute_diff(old_text, new_text)
+        delta = self._compact(invert_diff(ops))
+
+        chain, delta_bytes = 1, self._delta_bytes(delta)
+        for previous in reversed(self.records):
+            if previous["snapshot"]:
+                break
+            chain += 1
+            delta_bytes += self._delta_bytes(previous["delta"])
+        snapshot = chain >= self.max_chain or delta_bytes >= len(new_text)
+
+        if snapshot:
+            self.store.save_version_snapshot(self.project_name, version, new_text)
+
+        record = {
+            "version": version,
+            "base_version": base_version,
+            "timestamp": timestamp or datetime.now().isoformat(),
+            "length": len(new_text),
+            "inserted": sum(len(op["text"]) for op in ops if op["op"] == "insert"),
+            "deleted": sum(len(op["text"]) for op in ops if op["op"] == "delete"),
+            "snapshot": snapshot,
+            "delta": delta
+        }
+        self.log.append(record)
+        self._index[version] = len(self.records)
+        self._bases[base_version] = len(self.records)
+        self.records.append(record)
+        self._bytes += self._record_bytes(record)
+        if len(self.records) >= self.max_versions + max(1, self.max_versions // 10):
+            self.compact()
+        return self._summary(record)
+
+    def compact(self):
+        """Drop the versions older than the retained ones from memory, and what the log no longer holds from disk"""
+        if len(self.records) <= self.max_versions:
+            return
+        self.records = self.records[-self.max_versions:]
+        self._reindex()
+        self.log.compact()
+        oldest = next(iter(self.log), None)
+        if oldest is not None:
+            self.store.delete_version_snapshots(self.project_name, oldest["version"])
+
+    def list_versions(self, count=50) -> List[Dict[str, Any]]:
+        """
+        List the most recent versions, newest first.
+
+        Args:
+            count (int): Maximum number of versions to return
+
+        Returns:
+            list: Version summaries
+        """
+        return [self._summary(record) for record in reversed(self.records[-count:])] if count > 0 else []
+
+    def get_version(self, version: int, head_text: str, head_version: int) -> Optional[str]:
+        """
+        Reconstruct the text of a version.
+
+        Args:
+            version (int): The version to reconstruct
+            head_text (str): Text of the current document
+            head_version (int): Version of the current document
+
+        Returns:
+            str: The version's text, or None if the version is unknown or cannot be reconstructed
+        """
+        if version == head_version:
+            return head_text
+
+        if version in self._index:
+            target = self._index[version]
+        elif version in self._bases:
+            # A version only known as the base of the next record (e.g. the text the history started from)
+            target = self._bases[version] - 1
+        else:
+            return None
+
+        # Walk forward to the nearest anchor: a snapshot, or the current document
+        anchor = target + 1
+        while anchor < len(self.records) and not self.records[anchor]["snapshot"]:
+            anchor += 1
+
+        if anchor < len(self.records):
+            text = self.store.load_version_snapshot(self.project_name, self.records[anchor]["version"])
+        elif self.records[-1]["version"] == head_version:
+            anchor = len(self.records) - 1
+            text = head_text
+        else:
+            # The current document was saved without a matching version record
+            return None
+        if text is None:
+            return None
+
+        for i in range(anchor, target, -1):
+            # Each delta must lead to the version before it (the requested one, last); a version
+            # committed without a record breaks the chain and older deltas do not apply
+            expected = self.records[i - 1]["version"] if i - 1 > target else version
+            if self.records[i]["base_version"] != expected:
+                return None
+            text = self._apply(text, self.records[i]["delta"])
+        return text
+
+    def _reindex(self):
+        self._index = {record["version"]: i for i, record in enumerate(self.records)}
+        self._bases = {record["base_version"]: i for i, record in enumerate(self.records)}
+        self._bytes = sum(self._record_bytes(record) for record in self.records)
+
+    def size_bytes(self) -> int:
+        """Estimate the memory held by the loaded deltas"""
+        return self._bytes
+
+    @staticmethod
+    def _compact(ops: List[Dict[str, Any]]) -> List[list]:
+        """Fold diff ops into [offset, delete_len, insert_text] triples (deleted text is not needed to undo)"""
+        delta = []
+        for op in ops:
+            if delta and delta[-1][0] + delta[-1][1] == op["offset"] and op["op"] == "insert":
+                delta[-1][2] += op["text"]
+            elif op["op"] == "insert":
+                delta.append([op["offset"], 0, op["text"]])
+            else:
+                delta.append([op["offset"], len(op["text"]), ""])
+        return delta
+
+    @staticmethod
+    def _apply(text: str, delta: List[list]) -> str:
+        pieces = []
+        cursor = 0
+        for offset, delete_len, insert_text in delta:
+            pieces.append(text[cursor:offset])
+            pieces.append(insert_text)
+            cursor = offset + delete_len
+        pieces.append(text[cursor:])
+        return "".join(pieces)
+
+    @classmethod
+    def _record_bytes(cls, record: Dict[str, Any]) -> int:
+        return RECORD_OVERHEAD_BYTES + cls._delta_bytes(record["delta"])
+
+    @staticmethod
+    def _delta_bytes(delta: List[list]) -> int:
+        return sum(len(insert_text) + 16 for _, _, insert_text in delta)
+
+    @staticmethod
+    def _summary(record: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in record.items() if key != "delta"}
@@ -0,0 +1,155 @@
+import asyncio
+from typing import Dict, Any, Callable, Awaitable, Optional, Tuple
+
+
+class _PendingGroup:
+    """Saves of one project waiting to be committed together"""
+
+    def __init__(self, state, base_text: str, base_version: int):
+        self.state = state
+        self.base_text = base_text
+        self.base_version = base_version
+        self.location = {}
+        self.save_count = 0
+        self.waiters = []
+        self.timer = None
+
+
+class WriteCoalescer:
+    """Group commit for rapid saves of the same project"""
+
+    def __init__(self, commit: Callable[..., Awaitable[Any]], window=1.0):
+        """
+        Initialize the coalescer.
+
+        The first save of a project opens a group; every save of that project
+        arriving within ``window`` seconds joins it. When the window closes,
+        ``commit(state, base_text, base_version, location, save_count)`` is
+        awaited once for the whole group: it persists the latest state and
+        records a single history edit from ``base_text``. Every save in the
+        group is acknowledged when that commit completes.
+
+        Saves are added, and groups taken and committed, while holding the
+        project's ``state.lock``, so the text a commit persists is exactly the
+        text after the group's last save and a save can never end up in two
+        groups. Groups keep the ProjectState they were opened with, so a
+        commit never looks the project up again.
+
+        Args:
+            commit (callable): Coroutine function persisting a project
+            window (float): Seconds to wait for more saves before committing.
+                            0 commits every save on its own.
+        """
+        self.commit = commit
+        self.window = window
+        self._groups: Dict[str, _PendingGroup] = {}
+        # Base text and version of groups whose commit failed, carried into the next group
+        self._uncommitted_base: Dict[str, Tuple[str, int]] = {}
+        self.saves = 0
+        self.commits = 0
+        self.failed_commits = 0
+
+    def add(self, project_name: str, state, old_text: str, old_version: int,
+            location: Optional[Dict[str, Any]] = None) -> asyncio.Future:
+        """
+        Register a save that has just been applied in memory.
+
+        Must be called while holding ``state.lock``, in the same critical
+        section as the change to the document.
+
+        Args:
+            project_name (str): Name of the project
+            state (ProjectState): The project's state the save was applied to
+            old_text (str): Text before this save (only used by the first save of a group)
+            old_version (int): Document version before this save (likewise)
+            location (dict, optional): Information about the edit location
+
+        Returns:
+            Future: Resolved when the save's group is committed; pass it to ``wait``
+        """
+        self.saves += 1
+        group = self._groups.get(project_name)
+        if group is None:
+            base_text, base_version = self._uncommitted_base.pop(project_name, (old_text, old_version))
+            group = _PendingGroup(state, base_text, base_version)
+            self._groups[project_name] = group
+            if self.window > 0:
+                loop = asyncio.get_running_loop()
+                group.timer = loop.call_later(self.window, self._schedule_flush, project_name)
+
+        group.save_count += 1
+        group.location = location or {}
+        waiter = asyncio.get_running_loop().create_future()
+        group.waiters.append(waiter)
+        return waiter
+
+    async def wait(self, project_name: str, waiter: asyncio.Future):
+        """
+        Wait for a save registered with ``add`` to be committed (without holding the lock).
+
+        Raises:
+            Exception: Whatever the group's commit raised
+        """
+        if self.window <= 0:
+            await self.flush(project_name)
+        await waiter
+
+    async def flush(self, project_name: str):
+        """
+        Commit the pending group of a project now, if there is one.
+
+        Args:
+            project_name (str): Name of the project
+        """
+        group = self._groups.get(project_name)
+        if group is None:
+            return
+        async with group.state.lock:
+            await self.flush_locked(project_name)
+
+    async def flush_locked(self, project_name: str):
+        """
+        Commit the pending group of a project while the caller holds its ``state.lock``.
+
+        Args:
+            project_name (str): Name of the project
+        """
+        group = self._groups.pop(project_name, None)
+        if group is None:
+            return
+        if group.timer is not None:
+            group.timer.cancel()
+
+        try:
+            await self.commit(group.state, group.base_text, group.base_version, group.location, group.save_count)
+        except Exception as e:
+            self.failed_commits += 1
+            self._uncommitted_base.setdefault(project_name, (group.base_text, group.base_version))
+            for waiter in group.waiters:
+                if not waiter.done():
+                    waiter.set_exception(e)
+            return
+
+        self.commits += 1
+        for waiter in group.waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def flush_all(self):
+        """Commit every pending group"""
+        for project_name in list(self._groups):
+            await self.flush(project_name)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get save and commit counters"""
+        return {
+            "window_seconds": self.window,
+            "saves": self.saves,
+            "commits": self.commits,
+            "failed_commits": self.failed_commits,
+            "pending_groups": len(self._groups),
+            "saves_per_commit": self.saves / self.commits if self.commits else 0.0
+        }
+
+    def _schedule_flush(self, project_name: str):
+        asyncio.ensure_future(self.flush(project_name))
@@ -6,6 +6,7 @@ import { editor } from "monaco-editor";
 import ReactMarkdown from "react-markdown";
 import remarkGfm from "remark-gfm";
 import { marked } from "marked";
+import { EditOperation } from "@/types/api";
 
 // docx imports
 import {
@@ -25,6 +26,70 @@ interface EditorProps {
   onContentChange?: (content: string, cursorPosition: number) => void;
 }
 
+// Number of Unicode code points in a string (the backend indexes by code point)
+const codePointLength = (s: string) => {
+  let n = 0;
+  for (let i = 0; i < s.length; i++) {
+    const c = s.charCodeAt(i);
+    if (c < 0xd800 || c > 0xdbff) n++;
+  }
+  return n;
+};
+
+const isHighSurrogate = (c: number) => c >= 0xd800 && c <= 0xdbff;
+const isLowSurrogate = (c: number) => c >= 0xdc00 && c <= 0xdfff;
+
+// Express the change from oldText to newText as a single replace operation
+const computeEditOps = (oldText: string, newText: string): EditOperation[] => {
+  if (oldText === newText) return [];
+  const max = Math.min(oldText.length, newText.length);
+  let start = 0;
+  while (start < max && oldText.charCodeAt(start) === newText.charCodeAt(start)) start++;
+  // never split a surrogate pair
+  if (start > 0 && isHighSurrogate(oldText.charCodeAt(start - 1))) start--;
+  let end = 0;
+  while (
+    end < max - start &&
+    oldText.charCodeAt(oldText.length - 1 - end) === newText.charCodeAt(newText.length - 1 - end)
+  ) end++;
+  if (end > 0 && isLowSurrogate(oldText.charCodeAt(oldText.length - end))) end--;
+  const deleted = oldText.slice(start, oldText.length - end);
+  return [
+    {
+      offset: codePointLength(oldText.slice(0, start)),
+      delete_len: codePointLength(deleted),
+      insert_text: newText.slice(start, newText.length - end),
+    },
+  ];
+};
+
+// Read a text/event-stream body, calling onEvent for each message as it arrives
+const readServerSentEvents = async (
+  body: ReadableStream<Uint8Array>,
+  onEvent: (event: string, data: any) => void
+) => {
+  const reader = body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const message = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = "message";
+      let data = "";
+      for (const line of message.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      if (data) onEvent(event, JSON.parse(data));
+    }
+  }
+};
+
 // configure marked for GFM
 marked.setOptions({
   gfm: true,
@@ -53,9 +118,14 @@ const Editor: React.FC<EditorProps> = ({
 
   const editorRef = useRef<editor.IStandaloneCodeEditor | null>(null);
   const previousContentRef = useRef<string>(initialContent);
+  const versionRef = useRef<number | null>(null);
+  const saveChainRef = useRef<Promise<void>>(Promise.resolve());
   const idleTimerRef = useRef<NodeJS.Timeout | null>(null);
   const lastCursorPositionRef = useRef<editor.IPosition | null>(null);
   const currentSuggestionPositionRef = useRef<editor.IPosition | null>(null);
+  const autocompleteAbortRef = useRef<AbortController | null>(null);
+  const autocompleteSequenceRef = useRef<number>(0);
+  const sessionIdRef = useRef<string>(Math.random().toString(36).slice(2));
 
   // extract headers for outline
   useEffect(() => {
@@ -78,6 +148,7 @@ const Editor: React.FC<EditorProps> = ({
         if (data.success) {
           setContent(data.content || "");
           previousContentRef.current = data.content || "";
+          versionRef.current = typeof data.version === "number" ? data.version : null;
         } else {
           setError("Failed to load content");
         }
@@ -108,21 +179,50 @@ const Editor: React.FC<EditorProps> = ({
     onContentChange?.(txt, cursor);
   };
 
-  // save to server
-  const saveContent = async () => {
-    if (!projectName) return;
+  // save to server: send only the changed range, falling back to the full body.
+  // Saves are chained so each delta is based on the version acknowledged for the previous one.
+  const saveContent = () => {
+    if (!projectName) return Promise.resolve();
     const pos = editorRef.current?.getPosition();
     const cursor = pos ? pos.column + (pos.lineNumber - 1) : 0;
+    const saved = content;
+    saveChainRef.current = saveChainRef.current.then(() => persistContent(saved, cursor));
+    return saveChainRef.current;
+  };
+
+  const persistContent = async (saved: string, cursor: number) => {
     try {
+      if (versionRef.current !== null) {
+        const res = await fetch("http://localhost:8000/content/save/delta", {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({
+            project_name: projectName,
+            base_version: versionRef.current,
+            ops: computeEditOps(previousContentRef.current, saved),
+            cursor_position: cursor,
+          }),
+        });
+        const data = await res.json();
+        if (res.ok && data.success) {
+          previousContentRef.current = saved;
+          versionRef.current = data.version;
+          onSave?.(saved);
+          return;
+        }
+        // stale base or rejected ops: resync with a full save below
+      }
+
       const res = await fetch("http://localhost:8000/content/save", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ project_name: projectName, content, cursor_position: cursor }),
+        body: JSON.stringify({ project_name: projectName, content: saved, cursor_position: cursor }),
       });
       const data = await res.json();
       if (data.success) {
-        previousContentRef.current = content;
-        onSave?.(content);
+        previousContentRef.current = saved;
+        versionRef.current = typeof data.version === "number" ? data.version : null;
+        onSave?.(saved);
       } else {
         setError("Failed to save");
       }
@@ -338,9 +438,9 @@ blockquote{margin:.75em 0;padding-left:1em;border-left:3px solid #ccc}
   
   // Fetch autocomplete suggestion
   const fetchAutocompleteSuggestion = async () => {
-    // Don't fetch if already showing suggestions or processing a request
-    if (autocompleteInProgress || suggestionsVisible || !projectName) {
-      console.log("Skipping autocomplete: already in progress, visible, or missing project name");
+    // Don't fetch if already showing suggestions
+    if (suggestionsVisible || !projectName) {
+      console.log("Skipping autocomplete: suggestion visible or missing project name");
       return;
     }
     
@@ -353,39 +453,75 @@ blockquote{margin:.75em 0;padding-left:1em;border-left:3px solid #ccc}
     console.log("Fetching autocomplete suggestion");
     setAutocompleteInProgress(true);
     
+    // A newer request supersedes the one in flight; the server cancels its
+    // upstream call as well. Typing also aborts the stream (see the content
+    // change listener below).
+    autocompleteAbortRef.current?.abort();
+    const controller = new AbortController();
+    autocompleteAbortRef.current = controller;
+    autocompleteSequenceRef.current += 1;
+    
+    const model = editorRef.current?.getModel();
+    const cursorPosition = editorRef.current?.getPosition();
+    
     try {
-      const response = await fetch("http://localhost:8000/autocomplete", {
+      const response = await fetch("http://localhost:8000/autocomplete/stream", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
-          memory: "", // Will implement later
+          memory: "", // The server attaches the memories around cursor_position
           recent_edits: [], // Could fetch from history API
           previous_context: previous,
           current_snippet: current,
-          project_name: projectName
-        })
+          project_name: projectName,
+          session_id: sessionIdRef.current,
+          sequence: autocompleteSequenceRef.current,
+          // Monaco offsets count UTF-16 units; the backend indexes by code point
+          cursor_position: model && cursorPosition
+            ? codePointLength(model.getValueInRange({
+                startLineNumber: 1,
+                startColumn: 1,
+                endLineNumber: cursorPosition.lineNumber,
+                endColumn: cursorPosition.column,
+              }))
+            : undefined
+        }),
+        signal: controller.signal
       });
       
-      const data = await response.json();
-      
-      if (!response.ok) {
+      if (response.status === 409 || response.status === 429) {
+        // Superseded by a newer request, or shed while the server is busy: no suggestion this time
+        return;
+      }
+      if (!response.ok || !response.body) {
+        const data = await response.json().catch(() => ({}));
         console.error("Autocomplete API error:", data.detail || "Unknown error");
-        if (response.status === 500) {
-          console.error("Server stacktrace:", data.detail);
-        }
         return;
       }
       
-      if (data.completion) {
-        // Store the suggestion and current cursor position
-        setAutocompleteSuggestion(data.completion);
-        setSuggestionsVisible(true);
-        currentSuggestionPositionRef.current = editorRef.current?.getPosition() || null;
-      }
+      // Render the suggestion as soon as the first fragment arrives
+      currentSuggestionPositionRef.current = editorRef.current?.getPosition() || null;
+      let suggestion = "";
+      await readServerSentEvents(response.body, (event, data) => {
+        if (event === "superseded") {
+          return;
+        } else if (event === "error") {
+          console.error("Autocomplete error:", data.detail);
+        } else if (event === "message" && data.text) {
+          suggestion += data.text;
+          setAutocompleteSuggestion(suggestion.trimStart());
+          setSuggestionsVisible(true);
+        }
+      });
     } catch (err) {
-      console.error("Autocomplete error:", err);
+      if ((err as Error).name !== "AbortError") {
+        console.error("Autocomplete error:", err);
+      }
     } finally {
-      setAutocompleteInProgress(false);
+      if (autocompleteAbortRef.current === controller) {
+        autocompleteAbortRef.current = null;
+        setAutocompleteInProgress(false);
+      }
     }
   };
   
@@ -395,7 +531,10 @@ blockquote{margin:.75em 0;padding-left:1em;border-left:3px solid #ccc}
     
     // Listen for content changes (actual typing)
     const modelChangeDisposable = editorRef.current.onDidChangeModelContent(() => {
-      // User is typing - clear any existing suggestions
+      // User is typing - drop the suggestion being streamed for the old text
+      autocompleteAbortRef.current?.abort();
+      
+      // Clear any existing suggestions
       if (suggestionsVisible) {
         setSuggestionsVisible(false);
         setAutocompleteSuggestion(null);
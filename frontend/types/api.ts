@@ -13,10 +13,30 @@ export interface TextContent {
   cursor_position?: number;
 }
 
+export interface EditOperation {
+  offset: number;
+  delete_len: number;
+  insert_text: string;
+}
+
+export interface DeltaContent {
+  project_name: string;
+  base_version: number;
+  ops: EditOperation[];
+  cursor_position?: number;
+}
+
 export interface EditResponse {
   success: boolean;
   message: string;
   content?: string;
+  version?: number;
+}
+
+export interface DiffOp {
+  op: "insert" | "delete";
+  offset: number;
+  text: string;
 }
 
 export interface Edit {
@@ -25,6 +45,9 @@ export interface Edit {
   diff: {
     change_size: number;
     change_ratio: number;
+    inserted?: number;
+    deleted?: number;
+    ops?: DiffOp[];
   };
   location?: {
     cursor_position?: number;
@@ -59,10 +82,42 @@ export interface DeletionHistoryResponse {
   deletions: Deletion[];
 }
 
+export interface VersionInfo {
+  version: number;
+  base_version: number;
+  timestamp: string;
+  length: number;
+  inserted: number;
+  deleted: number;
+  snapshot: boolean;
+}
+
+export interface VersionListResponse {
+  success: boolean;
+  current_version: number;
+  versions: VersionInfo[];
+}
+
+export interface VersionContentResponse {
+  success: boolean;
+  version: number;
+  content: string;
+}
+
+export interface VersionRestoreRequest {
+  project_name: string;
+  version: number;
+}
+
 export interface ContentResponse {
   success: boolean;
   content: string;
+  version: number;
   last_updated: string;
+  // Set when a range was requested
+  start?: number;
+  end?: number;
+  length?: number;
 }
 
 export interface ApiError {